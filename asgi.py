@@ -0,0 +1,466 @@
+# asgi.py
+"""
+ASGI serving mode for the game, e.g. `uvicorn asgi:application`, with WebSocket sessions at /play/<state_id>.
+
+Serves the same routes as game.py with async handlers. Database work is short and runs on a
+small pool of threads, each with a Flask app context; narrative generation is awaited outside
+any transaction, so thousands of requests can wait on the AI provider without holding a
+thread or a database lock. At most MAX_CONCURRENT_GENERATIONS API calls are in flight.
+"""
+
+import asyncio
+import json
+import logging
+import re
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import parse_qs
+import game
+from narrative_engine.ai_generator import generate_dynamic_narrative_async, admission_stats
+from narrative_engine.admission import narrating_for
+from narrative_engine.commands import MoveCommand, TakeCommand, parse_command
+from narrative_engine.events import EventContext
+from narrative_engine.game_state import DECISION_PAGE_SIZE, ConcurrentUpdateError
+from narrative_engine.graph import load_graph_from_dict
+from narrative_engine.narrative_memory import NarrativeMemory
+from narrative_engine.session_store import HotSession
+from narrative_engine.event_store import replay_unapplied_events
+from models import db
+
+logger = logging.getLogger(__name__)
+
+# The Flask app and the threads running database work, created in each worker process when the
+# server starts (see start); requests waiting on the AI provider do not hold a thread
+server = {'app': None, 'db_executor': None}
+
+# Games played over a WebSocket connection in this process, by ID. The connection holds the
+# game in memory, so other connections and HTTP commands for it are refused until it closes
+resident_games = {}
+
+def start(config=None, instance_path=None):
+    """Create this process's app and database threads, if they have not been created yet."""
+    if server['app'] is None:
+        app = game.create_app(config, instance_path)
+        server['db_executor'] = ThreadPoolExecutor(max_workers=app.config['ASGI_DB_WORKERS'], thread_name_prefix='game-db')
+        server['app'] = app
+    return server['app']
+
+async def run_db(function, *args):
+    """Run a blocking function on the database threads, inside a Flask app context."""
+    app = start()
+    def call():
+        with app.app_context():
+            return function(*args)
+    return await asyncio.get_running_loop().run_in_executor(server['db_executor'], call)
+
+class PendingNarrative:
+    """Stands in for a narrative in a result until NarrativeRequests.resolve has generated it."""
+
+    def __init__(self, location_type, tone, required_elements, events):
+        self.args = (location_type, tone, required_elements)
+        self.events = events
+
+class NarrativeRequests:
+    """
+    A narrator for the game's operations that records the narratives they ask for instead of
+    generating them, so they can be awaited once the operation has committed.
+    """
+
+    def __init__(self):
+        self.pending = []
+
+    def __call__(self, location_type, tone, required_elements, memory=None):
+        # The prompt includes the memory as it is at this point of the operation
+        pending = PendingNarrative(location_type, tone, required_elements, list(memory.events) if memory else [])
+        self.pending.append(pending)
+        return pending
+
+    async def resolve(self, result, state_id=None):
+        """
+        Generate the recorded narratives concurrently and put them in place in the result.
+        :param result: The result returned by the operation, containing PendingNarrative values.
+        :param state_id: The game to append the narratives to, as the synchronous routes do when
+                         they save a command's narrative memory; None for read-only requests.
+        """
+        if not self.pending:
+            return result
+        narratives = await asyncio.gather(*(self._generate(pending) for pending in self.pending))
+        generated = {id(pending): narrative for pending, narrative in zip(self.pending, narratives)}
+        if state_id is not None:
+            await run_db(game.run_game_operation, state_id, game.remember_narratives(narratives))
+        return _fill(result, generated)
+
+    async def _generate(self, pending):
+        memory = NarrativeMemory()
+        for event in pending.events:
+            memory.add_event(event)
+        return await generate_dynamic_narrative_async(*pending.args, memory, run_sync=run_db)
+
+def _fill(value, generated):
+    if isinstance(value, PendingNarrative):
+        return generated[id(value)]
+    if isinstance(value, dict):
+        return {key: _fill(item, generated) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_fill(item, generated) for item in value]
+    return value
+
+async def index(request):
+    memory = NarrativeMemory()
+    intro_narrative = await generate_dynamic_narrative_async(
+        "cave entrance",
+        "mysterious",
+        "darkness, breeze, stone walls",
+        memory,
+        run_sync=run_db
+    )
+    return await run_db(game.create_game, memory, intro_narrative), 200
+
+async def show_state(request, state_id):
+    # As game.show_state: unchanged games are answered from their ETag or the response cache
+    etag, cached = await run_db(_current_state, state_id)
+    if etag is None:
+        return {"error": "Game state not found"}, 404
+    if _matches(request['headers'].get('if-none-match'), etag):
+        return None, 304, _state_headers(etag)
+    if cached is not None:
+        return cached, 200, _state_headers(etag)
+    narrator = NarrativeRequests()
+    result, status = await run_db(game.read_game, state_id, lambda game_state: game.describe_game(game_state, narrator))
+    if status != 200:
+        return result, status
+    result = await narrator.resolve(result)
+    etag = await run_db(game.cache_state, state_id, result)
+    return result, 200, _state_headers(etag)
+
+def _current_state(state_id):
+    etag = game.state_etag(state_id)
+    return etag, game.state_responses().get(state_id, etag) if etag else None
+
+def _state_headers(etag):
+    return [(b'etag', f'"{etag}"'.encode()), (b'cache-control', b'no-cache')]
+
+def _matches(if_none_match, etag):
+    """Return True if an If-None-Match header lists the ETag (compared weakly) or is *."""
+    if not if_none_match:
+        return False
+    tags = [tag.strip() for tag in if_none_match.split(',')]
+    return '*' in tags or any(tag.removeprefix('W/') == f'"{etag}"' for tag in tags)
+
+async def show_history(request, state_id):
+    after_turn = _int_arg(request, 'after', 0)
+    limit = _int_arg(request, 'limit', DECISION_PAGE_SIZE)
+    return await run_db(game.history_page, state_id, after_turn, limit)
+
+def _resident_conflict(state_id):
+    """Return the response refusing a change to a game played over a WebSocket connection, or None."""
+    if state_id in resident_games:
+        return {"error": f"Game {state_id} is being played over a WebSocket connection"}, 409
+    return None
+
+async def run_command(state_id, command_obj=None, command_text=None):
+    conflict = _resident_conflict(state_id)
+    if conflict:
+        return conflict
+    narrator = NarrativeRequests()
+    result, status = await run_db(
+        game.run_game_operation, state_id, game.command_operation(command_obj, command_text, narrator)
+    )
+    if status != 200:
+        return result, status
+    return await narrator.resolve(result, state_id), status
+
+async def process_command(request, state_id):
+    body = request['json']
+    if not body or 'command' not in body:
+        return {"error": "Missing command parameter"}, 400
+    return await run_command(state_id, command_text=body['command'])
+
+async def process_commands(request, state_id):
+    commands, narrative_mode, error = game.parse_batch_request(request['json'])
+    if error:
+        return {"error": error}, 400
+    conflict = _resident_conflict(state_id)
+    if conflict:
+        return conflict
+    narrator = NarrativeRequests()
+    result, status = await run_db(
+        game.run_game_operation, state_id, game.batch_operation(commands, narrative_mode, narrator)
+    )
+    # Like /commands, only the narratives of the commands themselves are kept in the game's memory
+    return await narrator.resolve(result, state_id if narrative_mode == 'each' else None), status
+
+async def show_metrics(request):
+    return {"narrative_admission": admission_stats()}, 200
+
+async def move(request, state_id, direction):
+    return await run_command(state_id, MoveCommand(direction))
+
+async def pickup_item(request, state_id, item):
+    return await run_command(state_id, TakeCommand(item))
+
+# (method, path pattern, handler); path parameters are passed to the handler in order
+ROUTES = [
+    ('GET', re.compile(r'^/$'), index),
+    ('GET', re.compile(r'^/state/(\d+)$'), show_state),
+    ('GET', re.compile(r'^/history/(\d+)$'), show_history),
+    ('POST', re.compile(r'^/command/(\d+)$'), process_command),
+    ('POST', re.compile(r'^/commands/(\d+)$'), process_commands),
+    ('GET', re.compile(r'^/metrics$'), show_metrics),
+    ('GET', re.compile(r'^/move/(\d+)/([^/]+)$'), move),
+    ('POST', re.compile(r'^/pickup/(\d+)/([^/]+)$'), pickup_item),
+]
+
+class ResidentGame:
+    """
+    A game kept in memory for the length of a WebSocket connection: its GameState, with the
+    NarrativeGraph and NarrativeMemory parsed once, so a command only runs the game logic.
+    Like the hot session store, each turn appends its events to the game's event log, and the
+    row itself is written every checkpoint_turns changed turns and when the connection closes.
+    A turn that fails part way discards the game instead, as the hot session store does.
+    """
+
+    def __init__(self, engine, state_id, checkpoint_turns):
+        # Write any turns this process's hot session store holds for the game, so the resident
+        # copy starts from them; HTTP commands are refused while the game is resident
+        hot_store = game.hot_session_store()
+        if hot_store:
+            hot_store.flush(state_id)
+        self.engine = engine
+        self.session = HotSession(engine, state_id)
+        self.checkpoint_turns = checkpoint_turns
+        game_state = self.session.game_state
+        self.context = None
+        if game_state is not None:
+            self.context = EventContext(game_state, load_graph_from_dict(game_state.narrative_graph), game.load_memory(game_state))
+
+    @property
+    def game_state(self):
+        return self.context.game_state
+
+    def describe(self):
+        """Return the game's location, exits, items and inventory."""
+        node = self.context.graph.nodes.get(self.game_state.current_location)
+        return {
+            "game_id": self.game_state.id,
+            "location": self.game_state.current_location,
+            "exits": node.exits if node else {},
+            "items": node.items if node else [],
+            "inventory": self.game_state.inventory,
+            "turn": self.game_state.decision_count
+        }
+
+    def run(self, command_text, narrator):
+        """
+        Parse and execute a command against the resident game, as the /command route does.
+        :return: The command's result, with an "error" key if it failed.
+        """
+        node = self.context.graph.nodes.get(self.game_state.current_location)
+        if node is None:
+            return {"error": "Invalid location in game state"}
+        command = parse_command(command_text, node, self.game_state.inventory)
+        if not command:
+            return {"error": f"I don't understand '{command_text}'"}
+        with self.session.lock:
+            try:
+                result = game.execute_command(self.game_state, command, self.context.graph, self.context, narrator=narrator)
+                self.context.stage()
+                self._end_turn()
+            except Exception:
+                self.discard()
+                raise
+        return result
+
+    def checkpoint(self):
+        """Write the game, including narratives added since its last turn, to the database."""
+        with self.session.lock:
+            self.context.stage()
+            if self.session.unflushed_turns or self.session.has_changes():
+                self.session.flush()
+
+    def close(self):
+        """Checkpoint the game and release its session, unless it was discarded."""
+        if self.session.closed:
+            return
+        try:
+            if self.context is not None:
+                self.checkpoint()
+        finally:
+            self.session.close()
+
+    def discard(self):
+        """
+        Drop the game without writing it, after a turn failed part way. The row is rebuilt
+        from the events of the turns that completed.
+        """
+        self.session.close()
+        with self.engine.begin() as connection:
+            replay_unapplied_events(connection, [self.session.state_id])
+
+    def _end_turn(self):
+        if self.session.changed_since_last_turn():
+            self.session.unflushed_turns += 1
+        if self.session.unflushed_turns >= self.checkpoint_turns or self.session.holds_connection:
+            self.session.flush()
+        elif self.session.unflushed_turns:
+            self.session.write_events()
+
+async def play(receive, send, state_id):
+    """
+    Play a game over a WebSocket connection, e.g. ws://localhost:5000/play/1.
+    The client sends {"command": "go forward"}; the server answers with a "result" message, then
+    streams each narrative as "narrative" messages holding the next piece ("delta"), ending with a
+    "narrative_end" message holding the whole narrative. A connection to a game that is already
+    being played is closed with code 4409.
+    """
+    app = start()
+    if state_id in resident_games:
+        await send({'type': 'websocket.close', 'code': 4409})
+        return
+    # Claimed before the game is loaded, so a second connection cannot load it too
+    resident_games[state_id] = None
+    try:
+        await _play_resident(app, receive, send, state_id)
+    finally:
+        resident_games.pop(state_id, None)
+
+async def _play_resident(app, receive, send, state_id):
+    resident = await run_db(lambda: ResidentGame(db.engine, state_id, app.config['WEBSOCKET_CHECKPOINT_TURNS']))
+    if resident.context is None:
+        await run_db(resident.close)
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    resident_games[state_id] = resident
+
+    async def send_json(message):
+        await send({'type': 'websocket.send', 'text': json.dumps(message, sort_keys=True)})
+
+    await send({'type': 'websocket.accept'})
+    try:
+        await send_json(dict(resident.describe(), type="connected"))
+        while True:
+            message = await receive()
+            if message['type'] == 'websocket.disconnect':
+                break
+            try:
+                command_text = json.loads(message.get('text') or message.get('bytes') or b'').get('command')
+            except (ValueError, AttributeError):
+                command_text = None
+            if not isinstance(command_text, str) or not command_text:
+                await send_json({"type": "error", "error": "Missing command parameter"})
+                continue
+
+            narrator = NarrativeRequests()
+            result = await run_db(resident.run, command_text, narrator)
+            # The narratives follow the result as they are generated
+            result = {key: value for key, value in result.items() if not isinstance(value, PendingNarrative)}
+            await send_json(dict(result, type="result", command=command_text))
+            for pending in narrator.pending:
+                async def send_delta(delta):
+                    await send_json({"type": "narrative", "delta": delta})
+                # Generated from the resident memory, which keeps the narrative for the next prompt
+                narrative = await generate_dynamic_narrative_async(
+                    *pending.args, resident.context.memory, run_sync=run_db, on_delta=send_delta
+                )
+                await send_json({"type": "narrative_end", "narrative": narrative})
+    except ConcurrentUpdateError as error:
+        await send_json({"type": "error", "error": str(error)})
+        await send({'type': 'websocket.close', 'code': 1011})
+    finally:
+        try:
+            await run_db(resident.close)
+        except ConcurrentUpdateError as error:
+            logger.error("Could not checkpoint game %s: %s", state_id, error)
+
+async def application(scope, receive, send):
+    """The ASGI application."""
+    if scope['type'] == 'lifespan':
+        await _lifespan(receive, send)
+        return
+    if scope['type'] == 'websocket':
+        await _websocket(scope, receive, send)
+        return
+    if scope['type'] != 'http':
+        return
+
+    body = b''
+    while True:
+        message = await receive()
+        body += message.get('body', b'')
+        if not message.get('more_body'):
+            break
+
+    try:
+        # Handlers return (result, status) or (result, status, headers)
+        result, status, *headers = await _dispatch(scope, body)
+    except Exception:
+        start().logger.exception("Error handling %s %s", scope['method'], scope['path'])
+        result, status, headers = {"error": "Internal server error"}, 500, []
+
+    payload = json.dumps(result, sort_keys=True).encode('utf-8') if result is not None else b''
+    await send({
+        'type': 'http.response.start',
+        'status': status,
+        'headers': [
+            (b'content-type', b'application/json'),
+            (b'content-length', str(len(payload)).encode()),
+            *(headers[0] if headers else [])
+        ]
+    })
+    await send({'type': 'http.response.body', 'body': payload})
+
+async def _dispatch(scope, body):
+    path = scope['path']
+    allowed = False
+    for method, pattern, handler in ROUTES:
+        match = pattern.match(path)
+        if not match:
+            continue
+        allowed = True
+        if method != scope['method']:
+            continue
+        try:
+            payload = json.loads(body) if body else None
+        except ValueError:
+            return {"error": "Request body is not valid JSON"}, 400
+        request = {
+            'json': payload,
+            'args': parse_qs(scope.get('query_string', b'').decode('latin-1')),
+            'headers': {name.decode('latin-1').lower(): value.decode('latin-1') for name, value in scope.get('headers', [])}
+        }
+        args = [int(value) if value.isdigit() and index == 0 else value for index, value in enumerate(match.groups())]
+        # Narratives generated for the request are queued with the game's other requests
+        with narrating_for(args[0] if args else None):
+            return await handler(request, *args)
+    if allowed:
+        return {"error": "Method not allowed"}, 405
+    return {"error": "Not found"}, 404
+
+async def _websocket(scope, receive, send):
+    message = await receive()
+    if message['type'] != 'websocket.connect':
+        return
+    match = re.match(r'^/play/(\d+)$', scope['path'])
+    if not match:
+        await send({'type': 'websocket.close', 'code': 4404})
+        return
+    with narrating_for(int(match.group(1))):
+        await play(receive, send, int(match.group(1)))
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message['type'] == 'lifespan.startup':
+            # Connect the database and start the background services before the first request
+            await run_db(game.init_services, start())
+            await send({'type': 'lifespan.startup.complete'})
+        elif message['type'] == 'lifespan.shutdown':
+            if server['db_executor']:
+                server['db_executor'].shutdown(wait=True)
+            await send({'type': 'lifespan.shutdown.complete'})
+            return
+
+def _int_arg(request, name, default):
+    try:
+        return int(request['args'][name][0])
+    except (KeyError, IndexError, ValueError):
+        return default
@@ -1,47 +1,266 @@
 # app.py
 
-from flask import Flask, jsonify, request, render_template
-from narrative_engine.game_state import init_app, GameState
-from narrative_engine.graph import NarrativeGraph, Node, load_graph_from_json, graph_to_json
-from narrative_engine.commands import Command, MoveCommand, parse_command, COMMAND_MAPPINGS
-from narrative_engine.events import Event, EventHandler, open_door_event
-from narrative_engine.ai_generator import init_app as init_ai, generate_dynamic_narrative
+from flask import Flask, Blueprint, current_app, jsonify, request, render_template, appcontext_pushed
+from narrative_engine.game_state import (
+    init_app, GameState, unit_of_work, deferred_saves, run_with_retry, ConcurrentUpdateError, DECISION_PAGE_SIZE
+)
+from narrative_engine.graph import NarrativeGraph, Node, load_graph_from_dict, graph_to_dict
+from narrative_engine.commands import (
+    Command, MoveCommand, TakeCommand, ActionCommand, UseCommand, parse_command, COMMAND_MAPPINGS
+)
+from narrative_engine.events import Event, EventHandler, EventContext, open_door_event
+from narrative_engine.action_events import ActionEventCache, init_app as init_action_events, current_version as action_version
+from narrative_engine.scheduler import Scheduler, torch_lit_condition, torch_lit_action, torch_burns_out
+from narrative_engine.ai_generator import init_app as init_ai, generate_dynamic_narrative, admission_stats
+from narrative_engine.admission import narrating_for
 from narrative_engine.narrative_memory import NarrativeMemory
-import json
+from narrative_engine.session_store import init_app as init_hot_sessions
+from narrative_engine.world import init_app as init_world
+from narrative_engine.world_import import import_world_command
+from narrative_engine.archive import init_app as init_archive, archive_games_command
+from narrative_engine.response_cache import ResponseCache
+from narrative_engine.jobs import init_app as init_narrative_jobs, NarrativeJobs, generate_job_narrative, PENDING, DONE
 import datetime
 import os
+import threading
 from dotenv import load_dotenv
 
 # Load environment variables from .env file
 load_dotenv()
 
-app = Flask(__name__)
+# The game's routes, registered on the app by create_app
+game_routes = Blueprint('game', __name__)
 
-# Ensure instance directory exists
-instance_path = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'instance')
-if not os.path.exists(instance_path):
-    os.makedirs(instance_path)
-    print(f"Created instance directory at: {instance_path}")
+# Held while a process sets up its services; reentrant because setting up pushes app contexts itself
+_services_lock = threading.RLock()
 
-# Use absolute path for database URI
-app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(instance_path, "game_state.db")}'
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+def create_app(config=None, instance_path=None):
+    """
+    Create and configure the game's Flask app, e.g. `flask --app game run` or one app per worker process.
+    Nothing is connected or started here, so the app can be created before a server forks its workers:
+    the database schema, hot session store and archive job are set up by init_services when the first
+    app context is pushed in each process, and the OpenAI and Redis clients are created on first use.
+    
+    :param config: Optional configuration overriding the defaults and environment variables.
+    :param instance_path: The directory holding the database and archive; defaults to ./instance.
+    """
+    app = Flask(__name__, instance_path=instance_path)
+    
+    # Use absolute path for database URI
+    app.config['SQLALCHEMY_DATABASE_URI'] = f'sqlite:///{os.path.join(app.instance_path, "game_state.db")}'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    
+    # AI Generator Module Configuration
+    app.config['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY', 'fake-key-for-development')
+    app.config['REDIS_URL'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
+    app.config['REDIS_CACHING_ENABLED'] = False  # Disable Redis caching as requested
+    
+    # Narrative admission control: API calls in flight, calls started per second (unlimited when unset)
+    # and in a burst, and when waiting requests are shed to fallback narratives
+    app.config['MAX_CONCURRENT_GENERATIONS'] = int(os.environ.get('MAX_CONCURRENT_GENERATIONS', 64))
+    app.config['NARRATIVE_RATE_LIMIT'] = float(os.environ['NARRATIVE_RATE_LIMIT']) if os.environ.get('NARRATIVE_RATE_LIMIT') else None
+    app.config['NARRATIVE_BURST'] = float(os.environ['NARRATIVE_BURST']) if os.environ.get('NARRATIVE_BURST') else None
+    app.config['NARRATIVE_QUEUE_SIZE'] = int(os.environ.get('NARRATIVE_QUEUE_SIZE', 256))
+    app.config['NARRATIVE_QUEUE_PER_GAME'] = int(os.environ.get('NARRATIVE_QUEUE_PER_GAME', 4))
+    app.config['NARRATIVE_MAX_WAIT'] = float(os.environ.get('NARRATIVE_MAX_WAIT', 10))
+    
+    # Narrative jobs: routes return the IDs of narratives generated in the background, fetched from /narrative
+    app.config['NARRATIVE_JOBS_ENABLED'] = os.environ.get('NARRATIVE_JOBS_ENABLED', 'false').lower() == 'true'
+    app.config['NARRATIVE_JOB_BACKEND'] = os.environ.get('NARRATIVE_JOB_BACKEND', 'local')
+    app.config['NARRATIVE_JOB_WORKERS'] = int(os.environ.get('NARRATIVE_JOB_WORKERS', 4))
+    app.config['NARRATIVE_JOB_RETENTION'] = int(os.environ.get('NARRATIVE_JOB_RETENTION', 10000))
+    app.config['NARRATIVE_JOB_TTL'] = float(os.environ.get('NARRATIVE_JOB_TTL', 3600))
+    app.config['NARRATIVE_JOB_MAX_WAIT'] = float(os.environ.get('NARRATIVE_JOB_MAX_WAIT', 30))
+    
+    # ASGI serving mode (asgi.py): threads running database work
+    app.config['ASGI_DB_WORKERS'] = int(os.environ.get('ASGI_DB_WORKERS', 8))
+    # WebSocket sessions (/play in asgi.py) write the resident game to its row every this many changed turns
+    app.config['WEBSOCKET_CHECKPOINT_TURNS'] = int(os.environ.get('WEBSOCKET_CHECKPOINT_TURNS', 10))
+    
+    # Number of games whose latest /state response is cached until the game changes
+    app.config['STATE_CACHE_SIZE'] = int(os.environ.get('STATE_CACHE_SIZE', 1024))
+    
+    # Hot session store: keep active games in memory and write them back periodically
+    app.config['HOT_SESSIONS_ENABLED'] = os.environ.get('HOT_SESSIONS_ENABLED', 'false').lower() == 'true'
+    app.config['HOT_SESSION_FLUSH_TURNS'] = int(os.environ.get('HOT_SESSION_FLUSH_TURNS', 10))
+    app.config['HOT_SESSION_FLUSH_INTERVAL'] = float(os.environ.get('HOT_SESSION_FLUSH_INTERVAL', 30))
+    app.config['HOT_SESSION_IDLE_TIMEOUT'] = float(os.environ.get('HOT_SESSION_IDLE_TIMEOUT', 600))
+    
+    # Archive job: move games idle for longer than the TTL to a compressed archive file
+    app.config['ARCHIVE_ENABLED'] = os.environ.get('ARCHIVE_ENABLED', 'false').lower() == 'true'
+    app.config['ARCHIVE_PATH'] = os.path.join(app.instance_path, "archive.jsonl.gz")
+    app.config['ARCHIVE_TTL'] = float(os.environ.get('ARCHIVE_TTL', 7 * 24 * 3600))
+    app.config['ARCHIVE_INTERVAL'] = float(os.environ.get('ARCHIVE_INTERVAL', 3600))
+    
+    # Example timed event: picking up the torch lights it and it burns out some turns later
+    app.config['TORCH_EXAMPLE_ENABLED'] = os.environ.get('TORCH_EXAMPLE_ENABLED', 'false').lower() == 'true'
+    
+    if config:
+        app.config.update(config)
+    
+    # Initialize the AI generator module (the SDKs are imported when the first narrative is generated)
+    init_ai(app)
+    
+    # The CLI commands are available before the services are set up; running one sets them up
+    app.cli.add_command(import_world_command)
+    app.cli.add_command(archive_games_command)
+    
+    app.register_blueprint(game_routes)
+    app.extensions['state_responses'] = ResponseCache(app.config['STATE_CACHE_SIZE'])
+    appcontext_pushed.connect(_set_up_services, app)
+    return app
+
+def _set_up_services(app, **kwargs):
+    init_services(app)
+
+def init_services(app):
+    """
+    Connect the database and start the background services, once per process.
+    Called when an app context is first pushed (a request, a CLI command or the ASGI server's
+    database threads); later calls return immediately.
+    
+    :return: A dict with the hot session store, the archive job and the narrative job queue
+             (each None when disabled).
+    """
+    services = app.extensions.get('game_services')
+    if services is not None and services['ready']:
+        return services
+    with _services_lock:
+        services = app.extensions.get('game_services')
+        if services is not None:
+            # Ready, or being set up by this thread, which pushes app contexts while it does
+            return services
+        services = app.extensions['game_services'] = {
+            'ready': False, 'hot_store': None, 'archive_job': None, 'narrative_jobs': None
+        }
+        try:
+            # Ensure instance directory exists
+            if not os.path.exists(app.instance_path):
+                os.makedirs(app.instance_path, exist_ok=True)
+                print(f"Created instance directory at: {app.instance_path}")
+            
+            # Initialize the game state module with the Flask app
+            init_app(app)
+            
+            # Create the relational world tables (locations, items, actions, exits) and their indexes
+            init_world(app)
+            
+            # Count changes to the actions table, so the compiled action events follow them in every process
+            init_action_events(app)
+            
+            # Initialize the hot session store (None when disabled)
+            services['hot_store'] = init_hot_sessions(app)
+            
+            # Start the archive job (None when disabled)
+            services['archive_job'] = init_archive(app)
+            
+            # Start the narrative job workers (None when disabled)
+            services['narrative_jobs'] = init_narrative_jobs(app, generate_narrative_for_job, finish_narrative_job)
+        except Exception:
+            # Try again on the next app context
+            del app.extensions['game_services']
+            raise
+        
+        services['ready'] = True
+        return services
+
+def hot_session_store():
+    """Return the current app's hot session store, or None when hot sessions are disabled."""
+    return init_services(current_app)['hot_store']
+
+def narrative_job_queue():
+    """Return the current app's narrative job queue, or None when narrative jobs are disabled."""
+    return init_services(current_app)['narrative_jobs']
+
+def request_narrator():
+    """Return the narrator for a request's operation: one recording jobs when narrative jobs are enabled."""
+    return NarrativeJobs() if narrative_job_queue() else generate_dynamic_narrative
+
+class ReplayingNarrator:
+    """
+    A narrator for an operation that run_with_retry may run more than once. Narratives are
+    generated on the first attempt that asks for them and replayed, in order, by later attempts
+    asking for the same ones, so a version conflict does not call the provider again.
+    """
+
+    def __init__(self, narrator):
+        self.narrator = narrator
+        # (arguments, narrative, memory events added) of each call, in the order they were made
+        self.calls = []
+        self.position = 0
+
+    def new_attempt(self):
+        """Start replaying from the first narrative; called at the start of each attempt."""
+        self.position = 0
+
+    def __call__(self, location_type, tone, required_elements, memory=None):
+        arguments = (location_type, tone, required_elements)
+        if self.position < len(self.calls) and self.calls[self.position][0] == arguments:
+            _, narrative, added_events = self.calls[self.position]
+            if memory is not None:
+                for event in added_events:
+                    memory.add_event(event)
+        else:
+            # The attempt went differently from the earlier ones; forget what they asked for next
+            del self.calls[self.position:]
+            known_events = len(memory.events) if memory is not None else 0
+            narrative = self.narrator(location_type, tone, required_elements, memory)
+            added_events = list(memory.events[known_events:]) if memory is not None else []
+            self.calls.append((arguments, narrative, added_events))
+        self.position += 1
+        return narrative
+
+def queue_narratives(narrator, result, game_id, remember=True):
+    """
+    Queue the jobs of the narratives a request_narrator recorded in an operation's result,
+    replacing them with their job IDs; results of other narrators are returned unchanged.
+    """
+    if isinstance(narrator, NarrativeJobs):
+        return narrator.submit(narrative_job_queue(), result, game_id, remember)
+    return result
+
+def command_status(narrator, status):
+    """
+    Return the status of a command's response: 202 Accepted for a saved command whose
+    narratives were queued as jobs, since they are still being generated.
+    """
+    if status == 200 and isinstance(narrator, NarrativeJobs) and narrator.queued:
+        return 202
+    return status
+
+def generate_narrative_for_job(payload):
+    """Generate a queued narrative in a job worker, shared by the jobs queued with the same prompt."""
+    with narrating_for(payload["game_id"]):
+        return generate_job_narrative(payload)
 
-# AI Generator Module Configuration
-app.config['OPENAI_API_KEY'] = os.environ.get('OPENAI_API_KEY', 'fake-key-for-development')
-app.config['REDIS_URL'] = os.environ.get('REDIS_URL', 'redis://localhost:6379/0')
-app.config['REDIS_CACHING_ENABLED'] = False  # Disable Redis caching as requested
+def finish_narrative_job(payload, narrative):
+    """Append a job's narrative to its game's memory if the job's request asked for it."""
+    if payload["remember"]:
+        run_game_operation(payload["game_id"], remember_narratives([narrative]))
 
-# Initialize the game state module with the Flask app
-init_app(app)
+# Number of recent decisions included in the /state response; older ones are served by /history
+RECENT_HISTORY_SIZE = 10
 
-# Initialize the AI generator module
-init_ai(app)
+# Maximum number of commands accepted by one request to /commands
+MAX_BATCH_COMMANDS = 100
+
+# How /commands generates narratives: for each command, once for the final location, or not at all
+BATCH_NARRATIVE_MODES = ('each', 'final', 'none')
+
+# The torch example only lights the torch in apps configured with TORCH_EXAMPLE_ENABLED
+def example_torch_condition(game_state):
+    return current_app.config.get('TORCH_EXAMPLE_ENABLED', False) and torch_lit_condition(game_state)
+
+example_torch_event = Event("Light Torch", example_torch_condition, torch_lit_action, items=('torch',))
 
 # Create and configure the event handler
-event_handler = EventHandler()
-# Register the open door event
-event_handler.register_event(open_door_event)
+# The open door event is registered alongside the events compiled from the Action table,
+# which are compiled on first use and again when actions change
+event_handler = ActionEventCache(static_events=[open_door_event, example_torch_event])
+
+# Timed events: games store what is scheduled, the scheduler holds the actions by name
+scheduler = Scheduler()
+scheduler.register('torch_burns_out', torch_burns_out)
 
 # Create a sample hallway-door event to demonstrate event system
 def create_hallway_node():
@@ -93,77 +312,132 @@ def create_sample_graph():
     return graph
 
 
-@app.route('/')
+@game_routes.route('/')
 def index():
-    # Create a sample narrative graph
-    game_graph = create_sample_graph()
-    
-    # Serialize the graph for storage
-    graph_json = graph_to_json(game_graph)
-    
     # Create narrative memory for the game
     memory = NarrativeMemory()
     
     # Generate dynamic introduction narrative
-    intro_narrative = generate_dynamic_narrative(
+    narrator = request_narrator()
+    intro_narrative = narrator(
         "cave entrance", 
         "mysterious", 
         "darkness, breeze, stone walls",
         memory
     )
     
-    # Create or update game state with the graph
-    game_state = GameState(
-        player_progress="Level 1", 
-        current_location="entrance",
-        inventory=["map"],
-        decision_history=[{"action": "start_game", "timestamp": "2025-04-07T12:00:00"}]
-    )
+    result = create_game(memory, intro_narrative)
+    return jsonify(queue_narratives(narrator, result, result["game_id"]))
+
+# Create a new game with the sample graph and the introduction in its memory
+def create_game(memory, intro_narrative):
+    # Create a sample narrative graph
+    game_graph = create_sample_graph()
+    
+    # Convert the graph to a dictionary for storage
+    graph_data = graph_to_dict(game_graph)
     
-    # Store the narrative graph and memory in custom fields
-    game_state.narrative_graph = graph_json
-    game_state.narrative_memory = json.dumps([event for event in memory.events])
-    game_state.save()
+    # Create the game state with the graph and commit it in a single transaction
+    with unit_of_work():
+        game_state = GameState(
+            player_progress="Level 1", 
+            current_location="entrance",
+            inventory=["map"],
+            decision_history=[{"action": "start_game", "timestamp": "2025-04-07T12:00:00"}]
+        )
+        
+        # Store the narrative graph and memory in custom fields
+        game_state.narrative_graph = graph_data
+        game_state.narrative_memory = list(memory.events)
+        game_state.save()
     
-    return jsonify({
+    return {
         "game_id": game_state.id,
         "intro_narrative": intro_narrative,
         "message": f"Game initialized with ID: {game_state.id}"
-    })
+    }
 
-@app.route('/state/<int:state_id>')
+@game_routes.route('/state/<int:state_id>')
 def show_state(state_id):
-    # Load game state
-    game_state = GameState.load(state_id)
-    if not game_state:
+    """
+    Describe a game's current location, inventory and recent history.
+    The response's ETag changes whenever the game does. Clients polling with If-None-Match get
+    304 Not Modified while it is unchanged, and the description of an unchanged game is served
+    from a cache, so neither loads the game or generates a narrative.
+    """
+    etag = state_etag(state_id)
+    if etag is None:
         return jsonify({"error": "Game state not found"}), 404
+    if request.if_none_match.contains_weak(etag):
+        response = current_app.response_class(status=304)
+    else:
+        result = state_responses().get(state_id, etag)
+        if result is None:
+            narrator = request_narrator()
+            result, status = read_game(state_id, lambda game_state: describe_game(game_state, narrator))
+            if status != 200:
+                return jsonify(result), status
+            result = queue_narratives(narrator, result, state_id, remember=False)
+            etag = cache_state(state_id, result)
+        response = jsonify(result)
+    response.set_etag(etag)
+    # Clients may keep the response, but must check it is current before using it
+    response.cache_control.no_cache = True
+    return response
+
+def state_responses():
+    """Return the current app's cache of /state responses."""
+    return current_app.extensions['state_responses']
+
+def state_etag(state_id, version=None):
+    """
+    Return the ETag of a game's /state response, or None if the game does not exist.
+    Without a version only the game's event sequence is read, from memory for resident hot games.
+    
+    :param version: The event sequence the response describes, if known
+    """
+    if version is None:
+        hot_store = hot_session_store()
+        version = hot_store.resident_sequence(state_id) if hot_store else None
+        if version is None:
+            version = GameState.load_sequence(state_id)
+        if version is None:
+            return None
+    # Potential events also depend on the actions in the world tables
+    return f"{state_id}-{version}-{action_version()}"
+
+def cache_state(state_id, result):
+    """Cache a /state response under the version of the game it describes and return its ETag."""
+    etag = state_etag(state_id, result["version"])
+    state_responses().put(state_id, etag, result)
+    return etag
+
+# Describe a game's current location, inventory and recent history
+def describe_game(game_state, narrator=generate_dynamic_narrative):
+    """
+    :param game_state: The GameState, or None if it was not found
+    :param narrator: The function generating narratives, called like generate_dynamic_narrative
+    :return: A (result, status) tuple
+    """
+    if not game_state:
+        return {"error": "Game state not found"}, 404
     
     # Load the narrative graph
-    graph = load_graph_from_json(game_state.narrative_graph)
+    graph = load_graph_from_dict(game_state.narrative_graph)
     
     # Get current location data
     current_node = graph.nodes.get(game_state.current_location)
     if not current_node:
-        return jsonify({"error": "Invalid location in game state"}), 500
+        return {"error": "Invalid location in game state"}, 500
     
     # Check for potential events that could trigger in this state
-    potential_events = []
-    for event in event_handler.events:
-        if event.condition(game_state):
-            potential_events.append(event.name)
+    potential_events = event_handler.potential_events(game_state)
     
     # Load narrative memory
-    memory = NarrativeMemory()
-    if hasattr(game_state, 'narrative_memory') and game_state.narrative_memory:
-        try:
-            memory_events = json.loads(game_state.narrative_memory)
-            for event in memory_events:
-                memory.add_event(event)
-        except json.JSONDecodeError:
-            app.logger.error("Failed to parse narrative memory from game state")
+    memory = load_memory(game_state)
     
     # Generate dynamic description for current location
-    location_narrative = generate_dynamic_narrative(
+    location_narrative = narrator(
         current_node.node_id,
         "descriptive",
         ", ".join(current_node.items) if current_node.items else "ambient details",
@@ -171,7 +445,7 @@ def show_state(state_id):
     )
     
     # Return the game state information with enhanced narrative
-    return jsonify({
+    return {
         "game_id": game_state.id,
         "progress": game_state.player_progress,
         "location": {
@@ -182,35 +456,119 @@ def show_state(state_id):
             "items": current_node.items
         },
         "inventory": game_state.inventory,
-        "history": game_state.decision_history,
+        "history": [decision.details for decision in game_state.get_recent_decisions(RECENT_HISTORY_SIZE)],
+        "turn": game_state.decision_count,
+        "version": game_state.event_sequence,
         "potential_events": potential_events
-    })
+    }, 200
+
+@game_routes.route('/history/<int:state_id>')
+def show_history(state_id):
+    """
+    Page through a game's decision history in turn order.
+    Pass the returned next_after value as ?after= to fetch the following page.
+    """
+    after_turn = request.args.get('after', 0, type=int)
+    limit = request.args.get('limit', DECISION_PAGE_SIZE, type=int)
+    result, status = history_page(state_id, after_turn, limit)
+    return jsonify(result), status
+
+# Load one page of a game's decision history
+def history_page(state_id, after_turn=0, limit=DECISION_PAGE_SIZE):
+    # Make sure turns buffered in memory are in the database before paging through it
+    hot_store = hot_session_store()
+    if hot_store:
+        hot_store.flush(state_id)
+    
+    game_state = GameState.load(state_id)
+    if not game_state:
+        return {"error": "Game state not found"}, 404
+    
+    # At least one decision per page, so next_after always moves forward
+    limit = max(1, min(limit, DECISION_PAGE_SIZE))
+    decisions = game_state.get_decisions(after_turn=after_turn, limit=limit)
+    
+    return {
+        "game_id": game_state.id,
+        "decisions": [decision.to_dict() for decision in decisions],
+        "next_after": decisions[-1].turn if len(decisions) == limit else None
+    }, 200
+
+# Rebuild the narrative memory stored with a game state
+def load_memory(game_state):
+    memory = NarrativeMemory()
+    for event in game_state.narrative_memory or []:
+        memory.add_event(event)
+    return memory
+
+# Read a stored game without changing it
+def read_game(state_id, operation):
+    """
+    Applies a read-only operation to a game's state, reading through the hot session
+    store when it is enabled so unflushed turns are included.
+    
+    :param state_id: The ID of the game state
+    :param operation: A function taking the GameState (or None) and returning a (result, status) tuple
+    :return: The (result, status) tuple returned by the operation
+    """
+    hot_store = hot_session_store()
+    with narrating_for(state_id):
+        if hot_store:
+            return hot_store.run(state_id, operation)
+        return operation(GameState.load(state_id))
+
+# Apply an operation to a stored game and commit its changes
+def run_game_operation(state_id, operation):
+    """
+    Applies an operation to a game's state. With hot sessions enabled the game is
+    changed in memory and written back later; otherwise the change is committed
+    immediately and retried if another command changed the game concurrently.
+    
+    :param state_id: The ID of the game state
+    :param operation: A function taking the GameState (or None) and returning a (result, status) tuple
+    :return: The (result, status) tuple returned by the operation
+    """
+    try:
+        hot_store = hot_session_store()
+        with narrating_for(state_id):
+            if hot_store:
+                return hot_store.run(state_id, operation)
+            return run_with_retry(state_id, operation)
+    except ConcurrentUpdateError as error:
+        return {"error": str(error)}, 409
+
+# The flag events wait for when an item is used
+def use_flag(item, target=None):
+    """The story flag set by using an item, optionally on a target, e.g. used_key_on_door."""
+    name = f"used_{item}_on_{target}" if target else f"used_{item}"
+    return "_".join(name.split())
 
 # Command execution handler
-def execute_command(game_state, command_obj, graph):
+def execute_command(game_state, command_obj, graph, context=None, narrator=generate_dynamic_narrative):
     """
     Executes a command and updates the game state accordingly
     
     :param game_state: The current GameState object
     :param command_obj: A Command object to execute
     :param graph: The narrative graph for the current game
+    :param context: An EventContext shared by several commands; its changes are left for
+                    the caller to stage. Defaults to a new context staged by this command
+    :param narrator: The function generating the command's narrative, called like
+                     generate_dynamic_narrative, or None for no narrative
     :return: dict with result information
     """
     command_result = {}
     
-    # Load or initialize narrative memory
-    memory = NarrativeMemory()
-    if hasattr(game_state, 'narrative_memory') and game_state.narrative_memory:
-        try:
-            memory_events = json.loads(game_state.narrative_memory)
-            for event in memory_events:
-                memory.add_event(event)
-        except json.JSONDecodeError:
-            app.logger.error("Failed to parse narrative memory from game state")
+    # Events triggered by the command share the graph and memory parsed for this request
+    owns_context = context is None
+    if owns_context:
+        context = EventContext(game_state, graph, load_memory(game_state))
+    memory = context.memory
+    
+    current_node = graph.nodes.get(game_state.current_location)
     
     if isinstance(command_obj, MoveCommand):
         direction = command_obj.direction
-        current_node = graph.nodes.get(game_state.current_location)
         
         # Check if the direction is valid
         if direction not in current_node.exits:
@@ -218,182 +576,381 @@ def execute_command(game_state, command_obj, graph):
         
         # Get the new location
         new_location = current_node.exits[direction]
+        new_node = graph.nodes.get(new_location)
+        
+        # Add to narrative memory
+        memory.add_event(f"You moved {direction} to the {new_location}.")
+        
+        command_result = {
+            "success": True,
+            "message": f"Moved {direction} to {new_location}",
+            "new_location": new_location
+        }
+        
+        # Generate dynamic transition narrative before any change is flushed, so the
+        # database is not locked for writing while the provider is called
+        if narrator:
+            command_result["narrative"] = narrator(
+                new_location,
+                "atmospheric",
+                ", ".join(new_node.items) if new_node.items else "ambient details",
+                memory
+            )
         
         # Update the game state
+        game_state.record_event('command_executed', {'command': 'move', 'direction': direction})
         game_state.update_location(new_location)
         game_state.add_decision({
             "action": f"move_{direction}", 
             "timestamp": datetime.datetime.now().isoformat()
         })
+    elif isinstance(command_obj, TakeCommand):
+        item = command_obj.item
         
-        # Add to narrative memory
-        memory.add_event(f"You moved {direction} to the {new_location}.")
+        # Check if the item is in the current location
+        if item not in current_node.items:
+            return {"error": f"There is no {item} here to pick up"}
         
-        # Get the new location node
-        new_node = graph.nodes.get(new_location)
+        # Add to narrative memory
+        memory.add_event(f"You picked up the {item}.")
         
-        # Generate dynamic transition narrative
-        transition_narrative = generate_dynamic_narrative(
-            new_location,
-            "atmospheric",
-            ", ".join(new_node.items) if new_node.items else "ambient details",
+        # Generate dynamic item narrative before the pickup is flushed
+        item_narrative = narrator(
+            item,
+            "intriguing",
+            f"{item}, texture, details",
             memory
-        )
+        ) if narrator else None
+        
+        # Add item to inventory
+        game_state.record_event('command_executed', {'command': 'pickup', 'item': item})
+        game_state.add_item(item)
+        
+        # Remove item from the location
+        items = current_node.items.copy()
+        items.remove(item)
+        graph.update_node(current_node.node_id, items=items)
+        context.mark_graph_changed()
         
         command_result = {
             "success": True,
-            "message": f"Moved {direction} to {new_location}",
-            "narrative": transition_narrative,
-            "new_location": new_location
+            "message": f"You picked up the {item}",
+            "inventory": game_state.inventory
         }
+        if narrator:
+            command_result["narrative"] = item_narrative
+    elif isinstance(command_obj, ActionCommand):
+        action = command_obj.action
+        
+        # Check if the action can be performed here
+        if action not in current_node.actions:
+            return {"error": f"You can't {action} here", "valid_actions": list(current_node.actions)}
+        
+        # Add the action's outcome to narrative memory
+        outcome = current_node.actions[action]
+        memory.add_event(outcome)
+        
+        command_result = {
+            "success": True,
+            "message": outcome
+        }
+        
+        # Generate dynamic narrative for the action before the decision is flushed
+        if narrator:
+            command_result["narrative"] = narrator(
+                action,
+                "descriptive",
+                outcome,
+                memory
+            )
+        
+        # Update the game state
+        game_state.record_event('command_executed', {'command': 'action', 'action': action})
+        game_state.add_decision({
+            "action": action.replace(" ", "_"),
+            "timestamp": datetime.datetime.now().isoformat()
+        })
+    elif isinstance(command_obj, UseCommand):
+        item, target = command_obj.item, command_obj.target
+        
+        # Check the item is held and the target is here
+        if item not in game_state.inventory:
+            return {"error": f"You don't have the {item}"}
+        if target and target not in (*current_node.items, *game_state.inventory, *current_node.exits):
+            return {"error": f"There is no {target} here"}
+        
+        # Add to narrative memory
+        message = f"You used the {item} on the {target}" if target else f"You used the {item}"
+        memory.add_event(f"{message}.")
+        
+        command_result = {
+            "success": True,
+            "message": message
+        }
+        
+        # Generate dynamic narrative for the use before the flag is flushed
+        if narrator:
+            command_result["narrative"] = narrator(
+                target or item,
+                "descriptive",
+                f"{item}, {target}" if target else item,
+                memory
+            )
+        
+        # Using an item has its effect through the events waiting for its flag,
+        # e.g. used_key_on_door, which fire below
+        flag = use_flag(item, target)
+        game_state.record_event('command_executed', {'command': 'use', 'item': item, 'target': target})
+        game_state.set_flag(flag)
+        game_state.add_decision({
+            "action": flag,
+            "timestamp": datetime.datetime.now().isoformat()
+        })
     else:
         # Handle other command types as they are added
         return {"error": "Command type not supported yet"}
     
-    # Save updated narrative memory to game state
-    game_state.narrative_memory = json.dumps([event for event in memory.events])
-    
-    # Process events after command execution
-    triggered_events = event_handler.process_events(game_state)
+    # Fire timed events that are due this turn, then the events their changes trigger
+    triggered_events = scheduler.run_due(context)
+    triggered_events += event_handler.process_events(game_state, context)
     if triggered_events:
+        game_state.record_event('events_triggered', {'events': triggered_events})
         command_result["triggered_events"] = triggered_events
     
+    # Stage the updated narrative memory and any graph changes made by events
+    if owns_context:
+        context.stage()
+    
     return command_result
 
-@app.route('/command/<int:state_id>', methods=['POST'])
+# Load a game, run a command against it and commit the result
+def run_command(state_id, command_obj=None, command_text=None):
+    """
+    Executes a command against a stored game and saves the updated state
+    through run_game_operation.
+    
+    :param state_id: The ID of the game state to run the command against
+    :param command_obj: A Command object to execute
+    :param command_text: The player's command, parsed against the game's current location
+                         when no Command object is given
+    :return: A Flask response tuple
+    """
+    narrator = request_narrator()
+    result, status = run_game_operation(state_id, command_operation(command_obj, command_text, narrator))
+    result = queue_narratives(narrator, result, state_id, remember=status == 200)
+    return jsonify(result), command_status(narrator, status)
+
+def command_operation(command_obj=None, command_text=None, narrator=generate_dynamic_narrative):
+    """
+    Build the operation run_game_operation applies to run one command, as used by run_command.
+    :param narrator: The function generating the command's narrative, called like generate_dynamic_narrative
+    :return: A function taking the GameState (or None) and returning a (result, status) tuple
+    """
+    narrator = ReplayingNarrator(narrator)
+    
+    def apply(game_state):
+        narrator.new_attempt()
+        if not game_state:
+            return {"error": "Game state not found"}, 404
+        
+        # Load the narrative graph
+        graph = load_graph_from_dict(game_state.narrative_graph)
+        
+        # Get current location data
+        current_node = graph.nodes.get(game_state.current_location)
+        if not current_node:
+            return {"error": "Invalid location in game state"}, 500
+        
+        # Parse the command with the words of the current location and inventory
+        command = command_obj
+        if command is None:
+            command = parse_command(command_text, current_node, game_state.inventory)
+            if not command:
+                return {"error": f"I don't understand '{command_text}'"}, 400
+        
+        # Execute the command; its changes are written together by the save below
+        with deferred_saves():
+            result = execute_command(game_state, command, graph, narrator=narrator)
+        
+        # Check for errors
+        if "error" in result:
+            return result, 400
+            
+        # Stage the updated game state
+        game_state.save()
+        return result, 200
+    
+    return apply
+
+@game_routes.route('/command/<int:state_id>', methods=['POST'])
 def process_command(state_id):
     """
-    Process a natural language command from the player
+    Process a natural language command from the player, e.g. "go forward",
+    "take key", "open chest" or "use key on door"
     """
     # Check for command in request
     if not request.json or 'command' not in request.json:
         return jsonify({"error": "Missing command parameter"}), 400
     
-    command_text = request.json['command']
-    
-    # Parse the command
-    command_obj = parse_command(command_text)
-    if not command_obj:
-        return jsonify({"error": f"I don't understand '{command_text}'"}), 400
-        
-    # Load game state
-    game_state = GameState.load(state_id)
-    if not game_state:
-        return jsonify({"error": "Game state not found"}), 404
-    
-    # Load the narrative graph
-    graph = load_graph_from_json(game_state.narrative_graph)
+    # The command is parsed once the game's location and inventory are loaded
+    return run_command(state_id, command_text=request.json['command'])
+
+@game_routes.route('/commands/<int:state_id>', methods=['POST'])
+def process_commands(state_id):
+    """
+    Run a list of commands in order against one loaded game and commit them together,
+    for scripted clients and bots. The game, its graph and its memory are loaded once
+    and written once. Stops at the first command that fails and responds 400, as /command
+    does; the commands before it are kept and counted in "completed".
     
-    # Execute the command
-    result = execute_command(game_state, command_obj, graph)
+    Request body: {"commands": ["go forward", ...], "narrative": "each" | "final" | "none"}
+    With "final" (the default) one narrative is generated for the location the batch ends in.
+    """
+    commands, narrative_mode, error = parse_batch_request(request.json)
+    if error:
+        return jsonify({"error": error}), 400
+    
+    narrator = request_narrator()
+    result, status = run_game_operation(state_id, batch_operation(commands, narrative_mode, narrator))
+    # A batch that stopped at a failed command still saved the commands before it
+    saved = status == 200 or "results" in result
+    result = queue_narratives(narrator, result, state_id, remember=saved)
+    return jsonify(result), command_status(narrator, status)
+
+def parse_batch_request(body):
+    """
+    Validate the body of a /commands request.
+    :return: A tuple of the commands, the narrative mode and an error message (None if valid)
+    """
+    body = body or {}
+    commands = body.get('commands')
+    narrative_mode = body.get('narrative', 'final')
+    if not isinstance(commands, list) or not commands or not all(isinstance(text, str) for text in commands):
+        return None, None, "Missing commands parameter; expected a list of commands"
+    if len(commands) > MAX_BATCH_COMMANDS:
+        return None, None, f"At most {MAX_BATCH_COMMANDS} commands can be sent at once"
+    if narrative_mode not in BATCH_NARRATIVE_MODES:
+        return None, None, f"narrative must be one of {', '.join(BATCH_NARRATIVE_MODES)}"
+    return commands, narrative_mode, None
+
+def batch_operation(commands, narrative_mode, narrator=generate_dynamic_narrative):
+    """
+    Build the operation run_game_operation applies to run a batch of commands, as used by /commands.
+    :param narrator: The function generating narratives, called like generate_dynamic_narrative
+    :return: A function taking the GameState (or None) and returning a (result, status) tuple
+    """
+    narrator = ReplayingNarrator(narrator)
     
-    # Check for errors
-    if "error" in result:
-        return jsonify(result), 400
+    def apply(game_state):
+        narrator.new_attempt()
+        if not game_state:
+            return {"error": "Game state not found"}, 404
+        
+        # Load the narrative graph and memory once for the whole batch
+        graph = load_graph_from_dict(game_state.narrative_graph)
+        if game_state.current_location not in graph.nodes:
+            return {"error": "Invalid location in game state"}, 500
+        context = EventContext(game_state, graph, load_memory(game_state))
+        
+        results = []
+        with deferred_saves():
+            for command_text in commands:
+                current_node = graph.nodes.get(game_state.current_location)
+                command = parse_command(command_text, current_node, game_state.inventory)
+                if command:
+                    result = execute_command(
+                        game_state, command, graph, context,
+                        narrator=narrator if narrative_mode == 'each' else None
+                    )
+                else:
+                    result = {"error": f"I don't understand '{command_text}'"}
+                results.append(dict(result, command=command_text))
+                if "error" in result:
+                    break
+            
+            # Nothing has been written yet, so the final narrative does not hold the database's write lock
+            final_narrative = None
+            if narrative_mode == 'final':
+                final_node = graph.nodes.get(game_state.current_location)
+                final_narrative = narrator(
+                    final_node.node_id,
+                    "descriptive",
+                    ", ".join(final_node.items) if final_node.items else "ambient details",
+                    context.memory
+                )
+        
+        # Stage the graph and memory changed by the batch and save everything once
+        context.stage()
+        game_state.save()
         
-    # Save the updated game state
-    game_state.save()
+        response = {
+            "game_id": game_state.id,
+            "results": results,
+            "completed": sum(1 for result in results if "error" not in result),
+            "location": game_state.current_location,
+            "inventory": game_state.inventory
+        }
+        if narrative_mode == 'final':
+            response["narrative"] = final_narrative
+        return response, 400 if "error" in results[-1] else 200
     
-    return jsonify(result)
+    return apply
+
+def remember_narratives(narratives):
+    """
+    Build an operation appending narratives generated after a command was saved to the
+    game's narrative memory, as the ASGI server does once it has awaited them.
+    This is a second, short write after the command's own: the narratives are generated after
+    the command committed, so no transaction or database thread waits on the provider.
+    """
+    def apply(game_state):
+        if not game_state:
+            return {"error": "Game state not found"}, 404
+        game_state.narrative_memory = list(game_state.narrative_memory or []) + list(narratives)
+        game_state.save()
+        return {}, 200
+    
+    return apply
+
+@game_routes.route('/narrative/<job_id>')
+def show_narrative(job_id):
+    """
+    Report a narrative generated in the background while narrative jobs are enabled, by the job ID
+    returned in place of the narrative (e.g. "narrative_job"). Pass ?wait=<seconds> to wait for a
+    pending job, up to NARRATIVE_JOB_MAX_WAIT seconds.
+    Responds 200 with the narrative once it is done, and 202 while it is still pending.
+    """
+    queue = narrative_job_queue()
+    if queue is None:
+        return jsonify({"error": "Narrative jobs are disabled"}), 404
+    wait = min(max(request.args.get('wait', 0.0, type=float), 0.0), current_app.config['NARRATIVE_JOB_MAX_WAIT'])
+    job = queue.result(job_id, wait)
+    if job is None:
+        return jsonify({"error": "Narrative job not found"}), 404
+    status = {PENDING: 202, DONE: 200}.get(job["status"], 500)
+    return jsonify(dict(job, job_id=job_id)), status
+
+@game_routes.route('/metrics')
+def show_metrics():
+    """
+    Report narrative admission in this process: API calls in flight, requests waiting and for how
+    many games, requests shed to fallback narratives, and how long admitted requests waited.
+    """
+    return jsonify({"narrative_admission": admission_stats()})
 
-@app.route('/move/<int:state_id>/<direction>')
+@game_routes.route('/move/<int:state_id>/<direction>')
 def move(state_id, direction):
     """Legacy endpoint that now uses the command pattern internally"""
-    # Load game state
-    game_state = GameState.load(state_id)
-    if not game_state:
-        return jsonify({"error": "Game state not found"}), 404
-    
     # Create and execute a move command
-    command = MoveCommand(direction)
-    
-    # Load the narrative graph
-    graph = load_graph_from_json(game_state.narrative_graph)
-    
-    # Execute the command
-    result = execute_command(game_state, command, graph)
-    
-    # Check for errors
-    if "error" in result:
-        return jsonify(result), 400
-        
-    # Save the updated game state
-    game_state.save()
-    
-    return jsonify(result)
+    return run_command(state_id, MoveCommand(direction))
 
-@app.route('/pickup/<int:state_id>/<item>', methods=['POST'])
+@game_routes.route('/pickup/<int:state_id>/<item>', methods=['POST'])
 def pickup_item(state_id, item):
     """
     Route to handle picking up an item in the current location
     """
-    # Load game state
-    game_state = GameState.load(state_id)
-    if not game_state:
-        return jsonify({"error": "Game state not found"}), 404
-    
-    # Load the narrative graph
-    graph = load_graph_from_json(game_state.narrative_graph)
-    
-    # Get current location data
-    current_node = graph.nodes.get(game_state.current_location)
-    if not current_node:
-        return jsonify({"error": "Invalid location in game state"}), 500
-    
-    # Check if the item is in the current location
-    if item not in current_node.items:
-        return jsonify({"error": f"There is no {item} here to pick up"}), 400
-    
-    # Add item to inventory
-    game_state.add_item(item)
-    
-    # Load or initialize narrative memory
-    memory = NarrativeMemory()
-    if hasattr(game_state, 'narrative_memory') and game_state.narrative_memory:
-        try:
-            memory_events = json.loads(game_state.narrative_memory)
-            for event in memory_events:
-                memory.add_event(event)
-        except json.JSONDecodeError:
-            app.logger.error("Failed to parse narrative memory from game state")
-    
-    # Add to narrative memory
-    memory.add_event(f"You picked up the {item}.")
-    
-    # Generate dynamic item narrative
-    item_narrative = generate_dynamic_narrative(
-        item,
-        "intriguing",
-        f"{item}, texture, details",
-        memory
-    )
-    
-    # Save updated narrative memory to game state
-    game_state.narrative_memory = json.dumps([event for event in memory.events])
-    
-    # Remove item from the location
-    items = current_node.items.copy()
-    items.remove(item)
-    graph.update_node(current_node.node_id, items=items)
-    
-    # Update the narrative graph in the game state
-    game_state.narrative_graph = graph_to_json(graph)
-    game_state.save()
-    
-    # Process events after picking up the item
-    triggered_events = event_handler.process_events(game_state)
-    
-    result = {
-        "success": True,
-        "message": f"You picked up the {item}",
-        "narrative": item_narrative,
-        "inventory": game_state.inventory
-    }
-    
-    if triggered_events:
-        result["triggered_events"] = triggered_events
-    
-    return jsonify(result)
+    # Create and execute a take command
+    return run_command(state_id, TakeCommand(item))
 
 if __name__ == '__main__':
-    app.run(debug=True)
+    create_app().run(debug=True)
\ No newline at end of file
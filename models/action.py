@@ -7,7 +7,7 @@ class Action(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text)
-    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
     
     # Next location or action to trigger
     next_location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
@@ -0,0 +1,27 @@
+from models import db
+
+class Exit(db.Model):
+    __tablename__ = 'exits'
+    
+    id = db.Column(db.Integer, primary_key=True)
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    direction = db.Column(db.String(50), nullable=False)
+    destination_id = db.Column(db.Integer, db.ForeignKey('locations.id'), nullable=False)
+    
+    # Relationships
+    destination = db.relationship('Location', foreign_keys=[destination_id])
+    
+    # One exit per direction; also serves lookups of every exit from a location
+    __table_args__ = (db.Index('ix_exits_location_direction', 'location_id', 'direction', unique=True),)
+    
+    def __repr__(self):
+        return f"<Exit {self.direction} from {self.location_id} to {self.destination_id}>"
+    
+    def to_dict(self):
+        """Convert exit object to dictionary"""
+        return {
+            'id': self.id,
+            'location_id': self.location_id,
+            'direction': self.direction,
+            'destination_id': self.destination_id
+        }
@@ -6,8 +6,8 @@ class Item(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     name = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
-    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'))
-    player_id = db.Column(db.Integer, db.ForeignKey('players.id'))  # If item is in player inventory
+    location_id = db.Column(db.Integer, db.ForeignKey('locations.id'), index=True)
+    player_id = db.Column(db.Integer, db.ForeignKey('players.id'), index=True)  # If item is in player inventory
     
     portable = db.Column(db.Boolean, default=True)
     visible = db.Column(db.Boolean, default=True)
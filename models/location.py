@@ -1,15 +1,21 @@
 from models import db
+from models.exit import Exit
+# Imported so the relationships below resolve wherever Location is used
+from models.item import Item  # noqa: F401
+from models.action import Action  # noqa: F401
 import json
 
 class Location(db.Model):
     __tablename__ = 'locations'
     
     id = db.Column(db.Integer, primary_key=True)
-    name = db.Column(db.String(100), nullable=False)
+    # Indexed because the narrative engine looks locations up by name (its node ID)
+    name = db.Column(db.String(100), nullable=False, index=True)
     description = db.Column(db.Text, nullable=False)
     location_type = db.Column(db.String(50))  # e.g., indoor, outdoor, dungeon
     
-    # JSON string storing exit directions and their destination location IDs
+    # Legacy JSON string storing exit directions and their destination location IDs;
+    # exits are now stored as rows in the exits table
     exits = db.Column(db.Text, default='{}')  
     
     # AI generation properties
@@ -20,20 +26,38 @@ class Location(db.Model):
     
     # Relationships
     items = db.relationship('Item', backref='location', lazy=True)
-    actions = db.relationship('Action', backref='location', lazy=True)
+    actions = db.relationship('Action', backref='location', lazy=True, foreign_keys='Action.location_id')
+    exit_links = db.relationship('Exit', lazy=True, foreign_keys='Exit.location_id', cascade='all, delete-orphan')
     
     def __repr__(self):
         return f"<Location {self.name}>"
     
     def get_exits(self):
-        """Get exits as dictionary"""
-        return json.loads(self.exits)
+        """Get exits as dictionary, including legacy JSON exits not yet moved into rows"""
+        exits = json.loads(self.exits or '{}')
+        exits.update({exit_link.direction: exit_link.destination_id for exit_link in self.exit_links})
+        return exits
     
     def set_exit(self, direction, location_id):
         """Set an exit direction"""
-        exits_dict = self.get_exits()
-        exits_dict[direction] = location_id
-        self.exits = json.dumps(exits_dict)
+        # The first write moves the legacy JSON exits into rows, so none of them are lost
+        self.migrate_legacy_exits()
+        for exit_link in self.exit_links:
+            if exit_link.direction == direction:
+                exit_link.destination_id = location_id
+                return
+        self.exit_links.append(Exit(direction=direction, destination_id=location_id))
+    
+    def migrate_legacy_exits(self):
+        """Move exits still stored in the legacy JSON column into rows; rows win over JSON for the same direction"""
+        legacy_exits = json.loads(self.exits or '{}')
+        if not legacy_exits:
+            return
+        directions = {exit_link.direction for exit_link in self.exit_links}
+        for direction, destination_id in legacy_exits.items():
+            if direction not in directions:
+                self.exit_links.append(Exit(direction=direction, destination_id=destination_id))
+        self.exits = '{}'
     
     def get_ai_constraints(self):
         """Get AI constraints as list"""
@@ -15,7 +15,8 @@ class Player(db.Model):
     experience = db.Column(db.Integer, default=0)
     
     # Relationships
-    game_states = db.relationship('GameState', backref='player', lazy=True)
+    # Qualified by module, since the narrative engine maps a GameState class of its own
+    game_states = db.relationship('models.game_state.GameState', backref='player', lazy=True)
     
     def __repr__(self):
         return f"<Player {self.username}>"
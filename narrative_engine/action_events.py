@@ -0,0 +1,186 @@
+# narrative_engine/action_events.py
+
+import json
+import threading
+from flask import g, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import aliased
+from models import db
+from .events import Event, EventHandler, EventContext
+# Taken from the world module, which maps every table the world models refer to
+from .world import Location, Action
+
+# One row counting changes to the actions table, so every process, the import-world command
+# and raw SQL writes all tell the caches in each process to recompile
+action_version = db.Table(
+    'action_version',
+    db.Column('id', db.Integer, primary_key=True),
+    db.Column('version', db.Integer, nullable=False, default=0)
+)
+
+# On SQLite the counter is kept by triggers, which see every write to the actions table
+VERSION_TRIGGER_DDL = (
+    "CREATE TRIGGER IF NOT EXISTS actions_{name}_version AFTER {event} ON actions "
+    "BEGIN UPDATE action_version SET version = version + 1 WHERE id = 1; END"
+)
+
+def invalidate_action_events(executor=None):
+    """
+    Mark compiled action events as out of date in every process, e.g. after writing Action rows
+    with Core statements to a database without the version triggers.
+    :param executor: The connection or session that wrote the rows; defaults to db.session.
+    """
+    (executor or db.session).execute(
+        action_version.update().where(action_version.c.id == 1).values(version=action_version.c.version + 1)
+    )
+    forget_version()
+
+def current_version():
+    """
+    Return the stored number that changes whenever Action rows change, in any process.
+    It is read once per app context, so once per request, and kept on flask.g; changes to
+    the actions in other processes are seen from the next request on.
+    """
+    version = g.get('_action_version')
+    if version is None:
+        version = db.session.execute(db.select(action_version.c.version).where(action_version.c.id == 1)).scalar() or 0
+        g._action_version = version
+    return version
+
+def forget_version():
+    """Drop the action version read by this app context, so the next current_version reads it again."""
+    if has_app_context():
+        g.pop('_action_version', None)
+
+def _count_orm_change(mapper, connection, target):
+    # SQLite's triggers already counted it
+    if connection.dialect.name != 'sqlite':
+        invalidate_action_events(connection)
+    else:
+        forget_version()
+
+for mapper_event in ('after_insert', 'after_update', 'after_delete'):
+    event.listen(Action, mapper_event, _count_orm_change)
+
+def compile_action(name, location, description, next_location, requires_items, requires_flags, grants_items, sets_flags):
+    """
+    Compile the columns of an Action row into an Event.
+    The JSON columns are decoded here, once; the returned condition and action only do set and
+    dictionary lookups. An action triggers when the player is at its location with its requirements
+    met, and only while it would still change something, so it fires once rather than every turn.
+
+    :return: An Event keyed on the action's location, required items and required flags, or None
+             for an action that grants, sets and moves nothing, which would never trigger.
+    """
+    granted_items = tuple(json.loads(grants_items) if grants_items else [])
+    flags_to_set = json.loads(sets_flags) if sets_flags else {}
+    if not granted_items and not flags_to_set and next_location is None:
+        return None
+    required_items = frozenset(json.loads(requires_items) if requires_items else [])
+    required_flags = json.loads(requires_flags) if requires_flags else {}
+    flag_requirements = tuple(required_flags.items())
+    flag_effects = tuple(flags_to_set.items())
+
+    def condition(game_state):
+        inventory = game_state.inventory
+        flags = game_state.flags
+        if not required_items.issubset(inventory):
+            return False
+        if any(flags.get(flag) != value for flag, value in flag_requirements):
+            return False
+        return (
+            any(item not in inventory for item in granted_items)
+            or any(flags.get(flag) != value for flag, value in flag_effects)
+            or (next_location is not None and game_state.current_location != next_location)
+        )
+
+    def action(game_state):
+        missing_items = [item for item in granted_items if item not in game_state.inventory]
+        if missing_items:
+            game_state.inventory = game_state.inventory + missing_items
+        if flag_effects:
+            game_state.flags = dict(game_state.flags, **flags_to_set)
+        if next_location is not None:
+            game_state.current_location = next_location
+        if description:
+            if isinstance(game_state, EventContext):
+                game_state.memory.add_event(description)
+            else:
+                game_state.narrative_memory = list(game_state.narrative_memory or []) + [description]
+        game_state.save()
+
+    return Event(
+        name, condition, action,
+        location=location,
+        items=sorted(required_items),
+        flags=[flag for flag, value in flag_requirements if value]
+    )
+
+def load_action_events():
+    """
+    Compile every Action row into an Event, reading the actions and their location names in one query.
+    Actions without effects, such as the flavour actions imported from node actions, are left out.
+    :return: A list of Events.
+    """
+    location = aliased(Location)
+    next_location = aliased(Location)
+    rows = db.session.execute(
+        db.select(
+            Action.name, location.name, Action.description, next_location.name,
+            Action.requires_items, Action.requires_flags, Action.grants_items, Action.sets_flags
+        )
+        .join(location, Action.location_id == location.id)
+        .outerjoin(next_location, Action.next_location_id == next_location.id)
+        .order_by(Action.id)
+    ).all()
+    compiled_events = (compile_action(*row) for row in rows)
+    return [compiled for compiled in compiled_events if compiled is not None]
+
+class ActionEventCache:
+    """
+    Holds the events compiled from the Action table, indexed in an EventHandler.
+    They are compiled on first use and again once the stored action version has changed.
+    """
+
+    def __init__(self, static_events=()):
+        """
+        :param static_events: Events written in Python, registered ahead of the compiled ones so
+                              that both kinds trigger each other in one cascade.
+        """
+        self.static_events = list(static_events)
+        self._handler = None
+        self._version = None
+        self._lock = threading.Lock()
+
+    def handler(self):
+        """Return an EventHandler with the current compiled events, recompiling if the actions changed."""
+        version = current_version()
+        with self._lock:
+            if self._handler is None or self._version != version:
+                handler = EventHandler()
+                for compiled_event in self.static_events + load_action_events():
+                    handler.register_event(compiled_event)
+                self._handler, self._version = handler, version
+            return self._handler
+
+    def process_events(self, game_state, context=None):
+        """Trigger the compiled events whose conditions are met, as EventHandler.process_events."""
+        return self.handler().process_events(game_state, context)
+
+    def potential_events(self, game_state):
+        """Return the names of the compiled events whose conditions are met, as EventHandler.potential_events."""
+        return self.handler().potential_events(game_state)
+
+def init_app(app):
+    """
+    Create the action version counter, and on SQLite the triggers keeping it.
+    Expects the world tables to exist already.
+    """
+    with app.app_context():
+        with db.engine.begin() as connection:
+            action_version.create(connection, checkfirst=True)
+            if not connection.execute(db.select(action_version.c.id).where(action_version.c.id == 1)).first():
+                connection.execute(action_version.insert().values(id=1, version=0))
+            if connection.dialect.name == 'sqlite':
+                for trigger_event in ('INSERT', 'UPDATE', 'DELETE'):
+                    connection.exec_driver_sql(VERSION_TRIGGER_DDL.format(name=trigger_event.lower(), event=trigger_event))
@@ -0,0 +1,246 @@
+# narrative_engine/admission.py
+
+import asyncio
+import threading
+import time
+from collections import OrderedDict, deque
+from contextlib import asynccontextmanager, contextmanager
+from contextvars import ContextVar
+
+# The game a narrative is generated for, used to queue each game's requests separately
+current_game = ContextVar('current_game', default=None)
+
+@contextmanager
+def narrating_for(game_id):
+    """Attribute the narratives generated in this block (and the tasks it starts) to a game."""
+    token = current_game.set(game_id)
+    try:
+        yield
+    finally:
+        current_game.reset(token)
+
+class TokenBucket:
+    """
+    Allows rate calls per second on average, and bursts of up to burst calls.
+    A rate of None allows every call.
+    """
+
+    def __init__(self, rate=None, burst=None, clock=time.monotonic):
+        self.rate = rate
+        self.burst = burst if burst is not None else max(1.0, rate or 1.0)
+        self.clock = clock
+        self.tokens = self.burst
+        self.updated = clock()
+
+    def _refill(self):
+        now = self.clock()
+        self.tokens = min(self.burst, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def take(self):
+        """Take a token if one is available. Not thread-safe; callers hold their own lock."""
+        if self.rate is None:
+            return True
+        self._refill()
+        if self.tokens < 1:
+            return False
+        self.tokens -= 1
+        return True
+
+    def wait_time(self):
+        """Return the number of seconds until a token is available."""
+        if self.rate is None:
+            return 0.0
+        self._refill()
+        return max(0.0, (1 - self.tokens) / self.rate) if self.rate > 0 else float('inf')
+
+class _Waiter:
+    __slots__ = ('key', 'wake', 'enqueued_at', 'granted')
+
+    def __init__(self, key, wake, enqueued_at):
+        self.key = key
+        self.wake = wake
+        self.enqueued_at = enqueued_at
+        self.granted = False
+
+class AdmissionController:
+    """
+    Decides when a narrative request may call the AI provider.
+    At most max_concurrent calls are in flight, and calls start at the token bucket's rate.
+    Requests that cannot start wait in a queue per game, served round-robin so one busy game
+    cannot starve the others. A request is shed, and should use a fallback narrative instead,
+    when the queues are full or it has waited max_wait seconds.
+    Threads wait with admit() and asyncio tasks with admit_async(); both share the same limits.
+    """
+
+    def __init__(self, max_concurrent=64, rate=None, burst=None, max_queue=256, max_queue_per_game=4,
+                 max_wait=10.0, clock=time.monotonic):
+        """
+        :param max_concurrent: Most calls in flight at once.
+        :param rate: Calls started per second on average, or None for no rate limit.
+        :param burst: Calls that can start at once after a quiet period; defaults to the rate.
+        :param max_queue: Most requests waiting in all queues together.
+        :param max_queue_per_game: Most requests waiting for one game.
+        :param max_wait: Seconds a request waits before it is shed.
+        """
+        self.max_concurrent = max_concurrent
+        self.max_queue = max_queue
+        self.max_queue_per_game = max_queue_per_game
+        self.max_wait = max_wait
+        self.clock = clock
+        self._bucket = TokenBucket(rate, burst, clock)
+        self._lock = threading.Lock()
+        # Game → its waiting requests, in the order the games are served
+        self._queues = OrderedDict()
+        self._queued = 0
+        self._active = 0
+        self._admitted = 0
+        self._shed = 0
+        self._total_wait = 0.0
+        self._longest_wait = 0.0
+
+    @contextmanager
+    def admit(self, key=None):
+        """
+        Wait in a thread until the request may call the provider.
+        Yields True if it may, or False if it was shed.
+        """
+        event = threading.Event()
+        waiter = self._enqueue(key, event.set)
+        admitted = waiter is not None and self._wait(waiter, lambda timeout: event.wait(timeout))
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._release()
+
+    @asynccontextmanager
+    async def admit_async(self, key=None):
+        """Async counterpart of admit, for coroutines running in an event loop."""
+        loop = asyncio.get_running_loop()
+        woken = asyncio.Event()
+        waiter = self._enqueue(key, lambda: loop.call_soon_threadsafe(woken.set))
+        admitted = False
+        if waiter is not None:
+            try:
+                admitted = await self._wait_async(waiter, woken)
+            except BaseException:
+                # Cancelled while waiting; give back a slot granted in the meantime
+                if self._withdraw(waiter):
+                    self._release()
+                raise
+        try:
+            yield admitted
+        finally:
+            if admitted:
+                self._release()
+
+    def stats(self):
+        """Return the current queue depth, calls in flight and wait times, for monitoring."""
+        with self._lock:
+            now = self.clock()
+            oldest = min((waiters[0].enqueued_at for waiters in self._queues.values()), default=now)
+            return {
+                "active": self._active,
+                "max_concurrent": self.max_concurrent,
+                "queued": self._queued,
+                "queued_games": len(self._queues),
+                "oldest_wait": now - oldest,
+                "admitted": self._admitted,
+                "shed": self._shed,
+                "average_wait": self._total_wait / self._admitted if self._admitted else 0.0,
+                "longest_wait": self._longest_wait
+            }
+
+    def _enqueue(self, key, wake):
+        # Requests for no particular game (e.g. a new game's introduction) are each queued on their own
+        key = key if key is not None else object()
+        now = self.clock()
+        waiter = _Waiter(key, wake, now)
+        with self._lock:
+            if not self._queues and self._active < self.max_concurrent and self._bucket.take():
+                self._grant(waiter, now)
+                return waiter
+            waiters = self._queues.get(key)
+            if self._queued >= self.max_queue or (waiters and len(waiters) >= self.max_queue_per_game):
+                self._shed += 1
+                return None
+            if waiters is None:
+                waiters = self._queues[key] = deque()
+            waiters.append(waiter)
+            self._queued += 1
+            return waiter
+
+    def _wait(self, waiter, sleep):
+        while True:
+            timeout = self._next_check(waiter)
+            if timeout is None:
+                return waiter.granted
+            sleep(timeout)
+
+    async def _wait_async(self, waiter, woken):
+        while True:
+            timeout = self._next_check(waiter)
+            if timeout is None:
+                return waiter.granted
+            try:
+                await asyncio.wait_for(woken.wait(), timeout)
+            except asyncio.TimeoutError:
+                pass
+
+    def _next_check(self, waiter):
+        """
+        Serve the queues, then return None if the waiter is done waiting (granted or timed out),
+        or the seconds to sleep before checking again.
+        """
+        with self._lock:
+            # Tokens may have been added since the last call finished
+            self._dispatch()
+            if waiter.granted:
+                return None
+            remaining = waiter.enqueued_at + self.max_wait - self.clock()
+            if remaining <= 0:
+                self._remove(waiter)
+                self._shed += 1
+                return None
+            refill = self._bucket.wait_time() if self._active < self.max_concurrent else 0.0
+            return min(remaining, refill) if refill > 0 else remaining
+
+    def _dispatch(self):
+        while self._queues and self._active < self.max_concurrent and self._bucket.take():
+            key, waiters = self._queues.popitem(last=False)
+            waiter = waiters.popleft()
+            if waiters:
+                # The game goes to the back of the line
+                self._queues[key] = waiters
+            self._queued -= 1
+            self._grant(waiter, self.clock())
+            waiter.wake()
+
+    def _grant(self, waiter, now):
+        waiter.granted = True
+        self._active += 1
+        self._admitted += 1
+        wait = now - waiter.enqueued_at
+        self._total_wait += wait
+        self._longest_wait = max(self._longest_wait, wait)
+
+    def _remove(self, waiter):
+        waiters = self._queues.get(waiter.key)
+        if waiters and waiter in waiters:
+            waiters.remove(waiter)
+            self._queued -= 1
+            if not waiters:
+                del self._queues[waiter.key]
+
+    def _withdraw(self, waiter):
+        """Stop waiting; return True if the waiter had been granted a slot."""
+        with self._lock:
+            if not waiter.granted:
+                self._remove(waiter)
+            return waiter.granted
+
+    def _release(self):
+        with self._lock:
+            self._active -= 1
+            self._dispatch()
@@ -1,11 +1,12 @@
 # narrative_engine/ai_generator.py
 
+import asyncio
 import os
-import redis
-from openai import OpenAI  # Updated import from the latest SDK
 import logging
 import hashlib
+from flask import current_app, has_app_context
 from .narrative_memory import NarrativeMemory  # Import the memory module
+from .admission import AdmissionController, current_game
 from models.narrative_prompt import NarrativePrompt
 
 # Module-level variables to hold configuration settings
@@ -14,9 +15,39 @@ REDIS_URL = None
 redis_client = None
 CACHING_ENABLED = True  # Default to enabled; can be configured via app settings
 
+# Maximum number of API calls in flight at once
+MAX_CONCURRENT_GENERATIONS = 64
+
+# Decides when each narrative request may call the API, shedding requests to fallback narratives
+# under overload. Each app gets its own from init_app, used inside its app contexts; this one is
+# used outside any app context and is replaced by the latest app's
+admission = AdmissionController(max_concurrent=MAX_CONCURRENT_GENERATIONS)
+
+# The async client belongs to the event loop that created it
+_async_resources = {"loop": None, "client": None}
+
 # Set up a logger for this module
 logger = logging.getLogger(__name__)
 
+def __getattr__(name):
+    """
+    Import the OpenAI and Redis SDKs on first use (the OpenAI, AsyncOpenAI and redis attributes):
+    importing them takes most of the game's start-up time, and a worker may never need them.
+    """
+    if name in ('OpenAI', 'AsyncOpenAI'):
+        import openai
+        value = getattr(openai, name)
+    elif name == 'redis':
+        import redis as value
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+def _sdk(name):
+    # Module globals are looked up without __getattr__, so functions fetch the SDKs through here
+    return globals()[name] if name in globals() else __getattr__(name)
+
 def init_app(app):
     """
     Initialize the AI generator module with settings from a Flask app.
@@ -24,12 +55,24 @@ def init_app(app):
       - OPENAI_API_KEY
       - REDIS_URL
       - REDIS_CACHING_ENABLED (optional, defaults to True)
+      - MAX_CONCURRENT_GENERATIONS (optional, limits API calls in flight)
+      - NARRATIVE_RATE_LIMIT, NARRATIVE_BURST (optional, API calls started per second and in a burst)
+      - NARRATIVE_QUEUE_SIZE, NARRATIVE_QUEUE_PER_GAME, NARRATIVE_MAX_WAIT (optional, when waiting
+        requests are shed to fallback narratives)
     """
-    global OPENAI_API_KEY, REDIS_URL, redis_client, CACHING_ENABLED
+    global OPENAI_API_KEY, REDIS_URL, redis_client, CACHING_ENABLED, admission
 
     OPENAI_API_KEY = app.config.get('OPENAI_API_KEY', os.environ.get('OPENAI_API_KEY'))
     REDIS_URL = app.config.get('REDIS_URL', os.environ.get('REDIS_URL'))
     CACHING_ENABLED = app.config.get('REDIS_CACHING_ENABLED', True)
+    admission = app.extensions['narrative_admission'] = AdmissionController(
+        max_concurrent=app.config.get('MAX_CONCURRENT_GENERATIONS', MAX_CONCURRENT_GENERATIONS),
+        rate=app.config.get('NARRATIVE_RATE_LIMIT'),
+        burst=app.config.get('NARRATIVE_BURST'),
+        max_queue=app.config.get('NARRATIVE_QUEUE_SIZE', 256),
+        max_queue_per_game=app.config.get('NARRATIVE_QUEUE_PER_GAME', 4),
+        max_wait=app.config.get('NARRATIVE_MAX_WAIT', 10.0)
+    )
     
     if not OPENAI_API_KEY:
         raise ValueError("OpenAI API key is not set. Please define it in your config or set the OPENAI_API_KEY environment variable.")
@@ -37,12 +80,15 @@ def init_app(app):
         raise ValueError("Redis URL is not set. Please define it in your config or set the REDIS_URL environment variable.")
     
     # No need to set openai.api_key as we're using the new client-based approach
-    # which takes the API key directly in the client constructor
-    try:
-        redis_client = redis.Redis.from_url(REDIS_URL)
-    except Exception as e:
-        logger.error("Failed to connect to Redis: %s", e)
-        raise
+    # which takes the API key directly in the client constructor.
+    # The Redis client only connects when first used, and is only needed for caching
+    redis_client = None
+    if CACHING_ENABLED:
+        try:
+            redis_client = _sdk('redis').Redis.from_url(REDIS_URL)
+        except Exception as e:
+            logger.error("Failed to connect to Redis: %s", e)
+            raise
     
     app.logger.info("AI Generator module initialized with OpenAI API and Redis (Caching Enabled: %s).", CACHING_ENABLED)
 
@@ -56,7 +102,7 @@ def generate_narrative(prompt):
     """
     try:
         # Initialize the OpenAI client using the module-level OPENAI_API_KEY.
-        client = OpenAI(api_key=OPENAI_API_KEY)
+        client = _sdk('OpenAI')(api_key=OPENAI_API_KEY)
         
         # Use the client to generate narrative content
         response = client.chat.completions.create(
@@ -131,6 +177,44 @@ def generate_dynamic_narrative(location_type, tone, required_elements, memory: N
     """
     Generate narrative content dynamically using a prompt template from the database.
     """
+    prompt, prompt_meta, cache_key = prepare_prompt(location_type, tone, required_elements, memory, prompt_name)
+
+    narrative = get_cached_narrative(cache_key)
+    if narrative is None:
+        narrative = generate_narrative_with_params(prompt, prompt_meta)
+
+    return finish_narrative(narrative, location_type, tone, required_elements, memory, cache_key)
+
+async def generate_dynamic_narrative_async(location_type, tone, required_elements, memory: NarrativeMemory = None,
+                                           prompt_name="location_description", run_sync=None, on_delta=None):
+    """
+    Async counterpart of generate_dynamic_narrative for the ASGI server.
+    The API call is awaited, so many generations can wait on the provider at once; at most
+    MAX_CONCURRENT_GENERATIONS are in flight. The template lookup and the cache are blocking
+    and run through run_sync.
+
+    :param run_sync: An async function running a blocking function with its arguments, e.g. on a
+                     thread with an app context. Defaults to asyncio.to_thread.
+    :param on_delta: An async function called with each piece of the narrative as the API streams
+                     it (a cached narrative comes in one piece). The returned narrative is the one
+                     to keep: it replaces the streamed text if that failed validation.
+    """
+    run_sync = run_sync or asyncio.to_thread
+    prompt, prompt_meta, cache_key = await run_sync(prepare_prompt, location_type, tone, required_elements, memory, prompt_name)
+
+    narrative = await run_sync(get_cached_narrative, cache_key)
+    if narrative is None:
+        narrative = await generate_narrative_with_params_async(prompt, prompt_meta, on_delta)
+    elif on_delta:
+        await on_delta(narrative)
+
+    return await run_sync(finish_narrative, narrative, location_type, tone, required_elements, memory, cache_key)
+
+def prepare_prompt(location_type, tone, required_elements, memory=None, prompt_name="location_description"):
+    """
+    Build the prompt for a narrative from its template and the narrative memory.
+    :return: A tuple of the prompt, the template's metadata and the prompt's cache key.
+    """
     # Fetch template and metadata
     try:
         template_str, prompt_meta = get_prompt_template(prompt_name)
@@ -155,17 +239,19 @@ def generate_dynamic_narrative(location_type, tone, required_elements, memory: N
     )
 
     cache_key = hashlib.sha256(prompt.encode('utf-8')).hexdigest()
+    return prompt, prompt_meta, cache_key
 
+def get_cached_narrative(cache_key):
+    """Return the cached narrative for a prompt's cache key, or None."""
     if CACHING_ENABLED and redis_client:
         cached_narrative = redis_client.get(cache_key)
         if cached_narrative:
-            logger.info("Using cached narrative for prompt: %s", prompt)
-            narrative = cached_narrative.decode('utf-8')
-        else:
-            narrative = generate_narrative_with_params(prompt, prompt_meta)
-    else:
-        narrative = generate_narrative_with_params(prompt, prompt_meta)
+            logger.info("Using cached narrative for key: %s", cache_key)
+            return cached_narrative.decode('utf-8')
+    return None
 
+def finish_narrative(narrative, location_type, tone, required_elements, memory, cache_key):
+    """Validate a generated narrative, cache it and add it to the narrative memory."""
     if not validate_narrative(narrative, required_elements):
         logger.warning("Generated narrative failed validation. Using fallback narrative.")
         narrative = fallback_narrative(location_type, tone, required_elements)
@@ -184,19 +270,75 @@ def generate_dynamic_narrative(location_type, tone, required_elements, memory: N
 def generate_narrative_with_params(prompt, prompt_meta):
     """
     Generate narrative using OpenAI API with parameters from prompt metadata.
+    Waits for admission first; a request shed under overload gets the fallback narrative.
     """
-    try:
-        client = OpenAI(api_key=OPENAI_API_KEY)
-        response = client.chat.completions.create(
-            model="gpt-4o",
-            messages=[
-                {"role": "system", "content": "You are a creative narrative generator for a text-based adventure game."},
-                {"role": "user", "content": prompt}
-            ],
-            max_tokens=prompt_meta.get("max_tokens", 500),
-            temperature=prompt_meta.get("temperature", 0.7)
-        )
-        return response.choices[0].message.content.strip()
-    except Exception as error:
-        logger.error("Error during API call: %s", error)
-        return fallback_narrative("unknown", "neutral", "unspecified")
+    with current_admission().admit(current_game.get()) as admitted:
+        if not admitted:
+            return _shed_narrative()
+        try:
+            client = _sdk('OpenAI')(api_key=OPENAI_API_KEY)
+            response = client.chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are a creative narrative generator for a text-based adventure game."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=prompt_meta.get("max_tokens", 500),
+                temperature=prompt_meta.get("temperature", 0.7)
+            )
+            return response.choices[0].message.content.strip()
+        except Exception as error:
+            logger.error("Error during API call: %s", error)
+            return fallback_narrative("unknown", "neutral", "unspecified")
+
+async def generate_narrative_with_params_async(prompt, prompt_meta, on_delta=None):
+    """
+    Generate narrative using the async OpenAI client, waiting for admission first.
+    With on_delta, the response is streamed and each piece passed to it as it arrives.
+    """
+    async with current_admission().admit_async(current_game.get()) as admitted:
+        if not admitted:
+            return _shed_narrative()
+        try:
+            response = await _get_async_client().chat.completions.create(
+                model="gpt-4o",
+                messages=[
+                    {"role": "system", "content": "You are a creative narrative generator for a text-based adventure game."},
+                    {"role": "user", "content": prompt}
+                ],
+                max_tokens=prompt_meta.get("max_tokens", 500),
+                temperature=prompt_meta.get("temperature", 0.7),
+                stream=on_delta is not None
+            )
+            if on_delta is None:
+                return response.choices[0].message.content.strip()
+            pieces = []
+            async for chunk in response:
+                delta = chunk.choices[0].delta.content if chunk.choices else None
+                if delta:
+                    pieces.append(delta)
+                    await on_delta(delta)
+            return "".join(pieces).strip()
+        except Exception as error:
+            logger.error("Error during API call: %s", error)
+            return fallback_narrative("unknown", "neutral", "unspecified")
+
+def current_admission():
+    """Return the current app's admission controller, or the module's outside an app context."""
+    if has_app_context():
+        return current_app.extensions.get('narrative_admission', admission)
+    return admission
+
+def admission_stats():
+    """Return the narrative admission metrics: calls in flight, queue depth, requests shed and wait times."""
+    return current_admission().stats()
+
+def _shed_narrative():
+    logger.warning("Narrative request shed under load; using fallback narrative.")
+    return fallback_narrative("unknown", "neutral", "unspecified")
+
+def _get_async_client():
+    loop = asyncio.get_running_loop()
+    if _async_resources["loop"] is not loop:
+        _async_resources.update(loop=loop, client=_sdk('AsyncOpenAI')(api_key=OPENAI_API_KEY))
+    return _async_resources["client"]
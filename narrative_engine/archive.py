@@ -0,0 +1,227 @@
+# narrative_engine/archive.py
+
+import atexit
+import datetime
+import gzip
+import json
+import logging
+import os
+import threading
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from models import db
+from .game_state import GameState, Decision, GameEvent, GameSnapshot
+
+# Games not written to for this many seconds are archived
+DEFAULT_ARCHIVE_TTL = 7 * 24 * 3600
+
+# Games archived per transaction; small batches keep the write lock short
+ARCHIVE_BATCH_SIZE = 100
+
+# Free pages released per incremental vacuum step
+VACUUM_PAGES_PER_STEP = 1000
+
+# Tables holding a game's rows, children first so they can be deleted in this order
+GAME_CHILD_TABLES = (Decision.__table__, GameEvent.__table__, GameSnapshot.__table__)
+
+logger = logging.getLogger(__name__)
+
+def archive_idle_games(engine, archive_path, ttl=DEFAULT_ARCHIVE_TTL, batch_size=ARCHIVE_BATCH_SIZE, now=None, pause=None):
+    """
+    Move games not written to within the TTL into a gzip-compressed JSON Lines archive and
+    delete them from the database. Each batch is read, archived and deleted in its own short
+    transaction, so live requests only wait for one batch at a time.
+
+    :param engine: The SQLAlchemy engine of the game database.
+    :param archive_path: The archive file; batches are appended as gzip members.
+    :param ttl: Seconds without a write after which a game counts as abandoned.
+    :param batch_size: Games archived per transaction.
+    :param now: The current UTC time; defaults to datetime.datetime.utcnow().
+    :param pause: Optional threading.Event; archiving stops early once it is set.
+    :return: The number of games archived.
+    """
+    cutoff = (now or datetime.datetime.utcnow()) - datetime.timedelta(seconds=ttl)
+    game_state_table = GameState.__table__
+    archived = 0
+    while pause is None or not pause.is_set():
+        with engine.begin() as connection:
+            rows = connection.execute(
+                game_state_table.select()
+                .where(game_state_table.c.updated_at < cutoff)
+                .order_by(game_state_table.c.updated_at)
+                .limit(batch_size)
+            ).mappings().all()
+            if not rows:
+                break
+            records = {row['id']: {'game_state': dict(row)} for row in rows}
+            for table in GAME_CHILD_TABLES:
+                for child in connection.execute(table.select().where(table.c.game_state_id.in_(records))).mappings():
+                    records[child['game_state_id']].setdefault(table.name, []).append(dict(child))
+
+            # Games written to since they were read are no longer idle; the first delete takes the
+            # write lock, so the condition cannot change between the statements below
+            still_idle = (
+                db.select(game_state_table.c.id)
+                .where(game_state_table.c.id.in_(records), game_state_table.c.updated_at < cutoff)
+            )
+            for table in GAME_CHILD_TABLES:
+                connection.execute(table.delete().where(table.c.game_state_id.in_(still_idle)))
+            state_ids = connection.execute(still_idle).scalars().all()
+            connection.execute(game_state_table.delete().where(game_state_table.c.id.in_(state_ids)))
+
+            # Written before the delete commits, so a failure can only duplicate games in the archive, never lose them
+            _append_archive(archive_path, [records[state_id] for state_id in state_ids])
+        archived += len(state_ids)
+        logger.info("Archived %d idle game(s).", len(state_ids))
+    return archived
+
+def read_archive(archive_path):
+    """Yield the archived games in an archive file, oldest first."""
+    with gzip.open(archive_path, 'rt', encoding='utf-8') as archive:
+        for line in archive:
+            yield json.loads(line)
+
+def compact_database(engine, max_steps=None, pause=None):
+    """
+    Return free pages to the file system a few at a time with SQLite's incremental vacuum,
+    so no single step holds the database for long.
+
+    :param engine: The SQLAlchemy engine of the game database.
+    :param max_steps: Maximum number of vacuum steps; defaults to as many as needed.
+    :param pause: Optional threading.Event; compaction stops early once it is set.
+    :return: The number of bytes reclaimed.
+    """
+    if engine.dialect.name != 'sqlite':
+        return 0
+    with engine.connect() as connection:
+        if connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() != 2:
+            logger.info("Incremental vacuum is not enabled for this database; run enable_incremental_vacuum once.")
+            return 0
+        page_size = connection.exec_driver_sql("PRAGMA page_size").scalar()
+        start_pages = connection.exec_driver_sql("PRAGMA page_count").scalar()
+        steps = 0
+        while connection.exec_driver_sql("PRAGMA freelist_count").scalar() > 0:
+            if (max_steps is not None and steps >= max_steps) or (pause is not None and pause.is_set()):
+                break
+            connection.exec_driver_sql(f"PRAGMA incremental_vacuum({VACUUM_PAGES_PER_STEP})")
+            connection.commit()
+            steps += 1
+        reclaimed = (start_pages - connection.exec_driver_sql("PRAGMA page_count").scalar()) * page_size
+    logger.info("Reclaimed %d bytes.", reclaimed)
+    return reclaimed
+
+def enable_incremental_vacuum(engine):
+    """
+    Switch an existing SQLite database to incremental vacuum. This rewrites the whole file
+    once, blocking other writers while it runs, so do it during maintenance.
+    """
+    with engine.connect() as connection:
+        connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        connection.execution_options(isolation_level="AUTOCOMMIT").exec_driver_sql("VACUUM")
+
+def _append_archive(archive_path, records):
+    lines = "".join(json.dumps(record, default=str, separators=(',', ':')) + "\n" for record in records)
+    with open(archive_path, 'ab') as archive_file:
+        # Each batch is a complete gzip member; gzip readers treat the members as one stream
+        with gzip.GzipFile(fileobj=archive_file, mode='ab') as archive:
+            archive.write(lines.encode('utf-8'))
+        archive_file.flush()
+        os.fsync(archive_file.fileno())
+
+class ArchiveJob:
+    """
+    Periodically archives abandoned games and compacts the database on a background thread.
+    """
+
+    def __init__(self, engine, archive_path, ttl=DEFAULT_ARCHIVE_TTL, interval=3600.0, batch_size=ARCHIVE_BATCH_SIZE):
+        """
+        :param engine: The SQLAlchemy engine of the game database.
+        :param archive_path: The archive file games are moved to.
+        :param ttl: Seconds without a write after which a game counts as abandoned.
+        :param interval: Seconds between runs.
+        :param batch_size: Games archived per transaction.
+        """
+        self.engine = engine
+        self.archive_path = archive_path
+        self.ttl = ttl
+        self.interval = interval
+        self.batch_size = batch_size
+        self._stop = threading.Event()
+        self._worker = None
+
+    def run_once(self):
+        """
+        Archive abandoned games, then compact the database.
+        :return: A dictionary with the number of games archived and the bytes reclaimed.
+        """
+        archived = archive_idle_games(self.engine, self.archive_path, self.ttl, self.batch_size, pause=self._stop)
+        reclaimed = compact_database(self.engine, pause=self._stop) if archived else 0
+        return {'archived': archived, 'reclaimed_bytes': reclaimed}
+
+    def start(self):
+        """Start the background thread."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._run, name="archive-job", daemon=True)
+        self._worker.start()
+
+    def close(self):
+        """Stop the background thread, letting the current batch finish."""
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                result = self.run_once()
+                if result['archived']:
+                    logger.info("Archived %(archived)d game(s), reclaimed %(reclaimed_bytes)d bytes.", result)
+            except Exception as error:
+                logger.error("Archive job failed: %s", error)
+
+@click.command('archive-games')
+@click.option('--ttl', type=float, default=None, help='Seconds without a write after which a game is archived.')
+@click.option('--enable-incremental-vacuum', 'switch_vacuum_mode', is_flag=True,
+              help='Switch the database to incremental vacuum first (rewrites the file).')
+@with_appcontext
+def archive_games_command(ttl, switch_vacuum_mode):
+    """Archive abandoned games and compact the database."""
+    if switch_vacuum_mode:
+        enable_incremental_vacuum(db.engine)
+    job = ArchiveJob(
+        db.engine,
+        current_app.config['ARCHIVE_PATH'],
+        ttl=ttl if ttl is not None else current_app.config.get('ARCHIVE_TTL', DEFAULT_ARCHIVE_TTL)
+    )
+    result = job.run_once()
+    click.echo(f"Archived {result['archived']} game(s), reclaimed {result['reclaimed_bytes']} bytes")
+
+def init_app(app):
+    """
+    Register the archive-games CLI command and start the archive job from the Flask app configuration.
+    Expected configuration keys:
+      - ARCHIVE_PATH (required for archiving)
+      - ARCHIVE_ENABLED (defaults to False)
+      - ARCHIVE_TTL
+      - ARCHIVE_INTERVAL
+
+    :return: The started job, or None if the background job is disabled.
+    """
+    app.cli.add_command(archive_games_command)
+    with app.app_context():
+        engine = db.engine
+    if not app.config.get('ARCHIVE_ENABLED', False):
+        return None
+    job = ArchiveJob(
+        engine,
+        app.config['ARCHIVE_PATH'],
+        ttl=app.config.get('ARCHIVE_TTL', DEFAULT_ARCHIVE_TTL),
+        interval=app.config.get('ARCHIVE_INTERVAL', 3600.0)
+    )
+    job.start()
+    atexit.register(job.close)
+    app.logger.info("Archive job enabled (TTL %d seconds).", job.ttl)
+    return job
@@ -1,4 +1,5 @@
-from difflib import get_close_matches
+from functools import lru_cache
+from .vocabulary import Vocabulary
 
 # Base Command class using the command pattern
 class Command:
@@ -13,12 +14,38 @@ class MoveCommand(Command):
     def execute(self):
         return f"Moving {self.direction}"
 
+# Concrete command for picking up an item at the current location
+class TakeCommand(Command):
+    def __init__(self, item):
+        self.item = item
+
+    def execute(self):
+        return f"Taking {self.item}"
+
+# Concrete command for performing one of the current location's actions, e.g. "open chest"
+class ActionCommand(Command):
+    def __init__(self, action):
+        self.action = action
+
+    def execute(self):
+        return f"Performing {self.action}"
+
+# Concrete command for using an item, optionally on something else
+class UseCommand(Command):
+    def __init__(self, item, target=None):
+        self.item = item
+        self.target = target
+
+    def execute(self):
+        return f"Using {self.item} on {self.target}" if self.target else f"Using {self.item}"
+
 # Factory function for creating move commands
 def create_move_command(direction):
     return MoveCommand(direction)
 
-# Mapping of command strings (including abbreviations) to command factory lambdas
-COMMAND_MAPPINGS = {
+# Mapping of command strings (including abbreviations) to command factory lambdas.
+# Lookups go through an index over its keys, which is rebuilt when entries are added or removed.
+COMMAND_MAPPINGS = Vocabulary({
     'north': lambda: create_move_command('north'),
     'n': lambda: create_move_command('north'),
     'south': lambda: create_move_command('south'),
@@ -27,25 +54,132 @@ COMMAND_MAPPINGS = {
     'e': lambda: create_move_command('east'),
     'west': lambda: create_move_command('west'),
     'w': lambda: create_move_command('west')
-}
+})
+
+# Verbs (including synonyms) and the kind of command they start
+VERBS = Vocabulary({
+    'go': 'move', 'walk': 'move', 'move': 'move', 'head': 'move', 'run': 'move', 'enter': 'move',
+    'take': 'take', 'get': 'take', 'grab': 'take', 'pick up': 'take', 'collect': 'take',
+    'use': 'use'
+})
+
+# Words that separate a verb's object from a second object, as in "use key on door"
+PREPOSITIONS = frozenset(('on', 'with', 'in', 'into', 'at', 'to', 'from'))
+
+# Words dropped from commands before parsing
+ARTICLES = frozenset(('the', 'a', 'an'))
+
+# Number of compiled grammars kept; one per location and inventory in use
+GRAMMAR_CACHE_SIZE = 1024
+
+class CommandGrammar:
+    """
+    The words a player can use at one location: its exits, items and actions, plus the
+    items they carry. Commands are a verb, an object, and optionally a preposition and a
+    second object; a location's actions and exits can also be named on their own.
+    """
+
+    def __init__(self, exits=(), items=(), actions=(), inventory=()):
+        """
+        :param exits: The names of the location's exits.
+        :param items: The items at the location.
+        :param actions: The names of the location's actions.
+        :param inventory: The items the player holds.
+        """
+        self.exits = Vocabulary((exit_name, exit_name) for exit_name in exits)
+        self.items = Vocabulary((item, item) for item in items)
+        self.actions = Vocabulary((action, action) for action in actions)
+        self.held_items = Vocabulary((item, item) for item in (*inventory, *items))
+        self.targets = Vocabulary((target, target) for target in (*items, *inventory, *exits))
+
+    def parse(self, normalized):
+        """
+        Parse a normalized command.
+        Objects that match nothing here are passed through as typed, so the command can
+        explain what is missing, e.g. "There is no lamp here to pick up".
+
+        :return: A Command object, or None if the command has no verb this grammar knows.
+        """
+        words = [word for word in normalized.split() if word not in ARTICLES]
+        if not words:
+            return None
+        phrase = " ".join(words)
+
+        # A location's actions and exits can be named on their own, e.g. "open chest" or "forward"
+        action = self.actions.match(phrase)
+        if action:
+            return ActionCommand(action)
+        exit_name = self.exits.match(phrase)
+        if exit_name:
+            return MoveCommand(exit_name)
+
+        # Otherwise: verb, object, preposition, object
+        if len(words) > 1 and " ".join(words[:2]) in VERBS:
+            verb, rest = VERBS[" ".join(words[:2])], words[2:]
+        else:
+            verb, rest = VERBS.match(words[0]), words[1:]
+        if rest and rest[0] in PREPOSITIONS:
+            # "go to hallway"
+            rest = rest[1:]
+        if verb is None or not rest:
+            return None
+        split = next((i for i, word in enumerate(rest) if word in PREPOSITIONS), len(rest))
+        direct = " ".join(rest[:split])
+        indirect = " ".join(rest[split + 1:]) or None
+
+        if verb == 'move':
+            exit_name = self.exits.match(direct)
+            if exit_name:
+                return MoveCommand(exit_name)
+            factory = COMMAND_MAPPINGS.match(direct)
+            return factory() if factory else MoveCommand(direct)
+        if verb == 'take':
+            return TakeCommand(self.items.match(direct) or direct)
+        return UseCommand(
+            self.held_items.match(direct) or direct,
+            (self.targets.match(indirect) or indirect) if indirect else None
+        )
+
+@lru_cache(maxsize=GRAMMAR_CACHE_SIZE)
+def _compile_grammar(exits, items, actions, inventory):
+    return CommandGrammar(exits, items, actions, inventory)
+
+def grammar_for(node=None, inventory=()):
+    """
+    Return the grammar for a location and inventory, compiling it on first use.
+    Grammars are cached by the location's exits, items and actions, which together act as the
+    node's version: changing the node compiles a new grammar, and an unchanged node reuses its own.
+
+    :param node: The graph Node of the player's location, or None for no location.
+    :param inventory: The items the player holds.
+    """
+    if node is None:
+        return _compile_grammar((), (), (), tuple(inventory))
+    return _compile_grammar(tuple(node.exits), tuple(node.items), tuple(node.actions), tuple(inventory))
 
-def parse_command(input_command):
+def parse_command(input_command, node=None, inventory=()):
     """
     Parses a natural language command, supports abbreviations and fuzzy matching.
+    With a location, its exits, items and actions and the player's inventory are understood,
+    e.g. "go forward", "take key", "open chest" or "use key on door". Unambiguous prefixes of a
+    command are completed, and misspellings are matched by edit distance through the vocabulary
+    index, without scanning every command.
     
     :param input_command: String input from the player.
+    :param node: The graph Node of the player's location.
+    :param inventory: The items the player holds.
     :return: A Command object or None if the command is not recognized.
     """
-    normalized = input_command.lower().strip()
+    normalized = " ".join(input_command.lower().split())
     
-    # Check for exact match first
-    if normalized in COMMAND_MAPPINGS:
-        return COMMAND_MAPPINGS[normalized]()
+    command = grammar_for(node, inventory).parse(normalized)
+    if command:
+        return command
     
-    # Use fuzzy matching if no exact match is found
-    possible_matches = get_close_matches(normalized, COMMAND_MAPPINGS.keys(), n=1, cutoff=0.7)
-    if possible_matches:
-        return COMMAND_MAPPINGS[possible_matches[0]]()
+    # Check for an exact match first, then an abbreviation, then the closest misspelling
+    factory = COMMAND_MAPPINGS.match(normalized, cutoff=0.7)
+    if factory:
+        return factory()
     
     # If no match is found, return None or handle as needed
     return None
@@ -0,0 +1,151 @@
+# narrative_engine/event_store.py
+
+import copy
+import logging
+from models import db
+from .game_state import GameState, GameEvent, GameSnapshot, Decision, TRACKED_COLUMNS
+
+logger = logging.getLogger(__name__)
+
+def change_events(column, old_value, new_value):
+    """
+    Describe a change to a tracked GameState column as a list of (kind, data) events.
+    Graph changes are recorded per node and memory changes as appended entries,
+    so a turn's events stay small however large the game grows.
+
+    :param column: The name of the changed column.
+    :param old_value: The value before the change.
+    :param new_value: The value after the change.
+    :return: A list of (kind, data) tuples; empty if nothing changed.
+    """
+    if old_value == new_value:
+        return []
+    if column == 'narrative_graph' and isinstance(old_value, dict) and isinstance(new_value, dict):
+        old_nodes = old_value.get("nodes", {})
+        new_nodes = new_value.get("nodes", {})
+        events = [
+            ('node_set', {'node_id': node_id, 'node': node})
+            for node_id, node in new_nodes.items() if old_nodes.get(node_id) != node
+        ]
+        events += [('node_removed', {'node_id': node_id}) for node_id in old_nodes if node_id not in new_nodes]
+        return events
+    if (
+        column == 'narrative_memory' and isinstance(old_value, list) and isinstance(new_value, list)
+        and new_value[:len(old_value)] == old_value
+    ):
+        return [('memory_appended', {'entries': new_value[len(old_value):]})]
+    return [('column_set', {'column': column, 'value': new_value})]
+
+def apply_event(values, kind, data):
+    """
+    Apply one recorded event to a dictionary of game state values, in place.
+    Events that only describe what happened (commands, triggered events) change nothing.
+
+    :param values: A dictionary shaped like GameState.snapshot_values().
+    :param kind: The kind of the event.
+    :param data: The event data.
+    """
+    if kind == 'column_set':
+        values[data['column']] = copy.deepcopy(data['value'])
+    elif kind == 'node_set':
+        graph = values.get('narrative_graph') or {"nodes": {}}
+        graph.setdefault("nodes", {})[data['node_id']] = copy.deepcopy(data['node'])
+        values['narrative_graph'] = graph
+    elif kind == 'node_removed':
+        values['narrative_graph']["nodes"].pop(data['node_id'], None)
+    elif kind == 'memory_appended':
+        values['narrative_memory'] = (values.get('narrative_memory') or []) + data['entries']
+    elif kind == 'decision_recorded':
+        values['decision_count'] = data['turn']
+
+def rebuild_state(state_id, sequence=None):
+    """
+    Reconstruct a game's state as of an event sequence number by loading the nearest
+    earlier snapshot and replaying the events after it.
+
+    :param state_id: The ID of the game state.
+    :param sequence: The event sequence to rebuild up to; defaults to the latest event.
+    :return: A dictionary shaped like GameState.snapshot_values(), or None if the game has no snapshot.
+    """
+    snapshots = GameSnapshot.query.filter(GameSnapshot.game_state_id == state_id)
+    if sequence is not None:
+        snapshots = snapshots.filter(GameSnapshot.sequence <= sequence)
+    snapshot = snapshots.order_by(GameSnapshot.sequence.desc()).first()
+    if snapshot is None:
+        return None
+
+    events = GameEvent.query.filter(GameEvent.game_state_id == state_id, GameEvent.sequence > snapshot.sequence)
+    if sequence is not None:
+        events = events.filter(GameEvent.sequence <= sequence)
+
+    values = copy.deepcopy(snapshot.state)
+    for game_event in events.order_by(GameEvent.sequence):
+        apply_event(values, game_event.kind, game_event.data)
+    return values
+
+def get_events(state_id, after_sequence=0, limit=100):
+    """Return a page of a game's events in sequence order, e.g. for auditing."""
+    return (
+        GameEvent.query
+        .filter(GameEvent.game_state_id == state_id, GameEvent.sequence > after_sequence)
+        .order_by(GameEvent.sequence)
+        .limit(limit)
+        .all()
+    )
+
+def replay_unapplied_events(connection, state_ids=None):
+    """
+    Bring game_state rows up to date with events recorded after their event_sequence.
+    This happens when a session store appended a game's events but never flushed its row.
+
+    :param connection: A SQLAlchemy connection inside a transaction.
+    :param state_ids: The games to check; defaults to every game.
+    :return: The number of games updated.
+    """
+    game_state_table = GameState.__table__
+    game_event_table = GameEvent.__table__
+
+    latest = (
+        db.select(game_event_table.c.game_state_id, db.func.max(game_event_table.c.sequence).label('sequence'))
+        .group_by(game_event_table.c.game_state_id)
+        .subquery()
+    )
+    query = (
+        db.select(game_state_table)
+        .join(latest, latest.c.game_state_id == game_state_table.c.id)
+        .where(latest.c.sequence > game_state_table.c.event_sequence)
+    )
+    if state_ids is not None:
+        query = query.where(game_state_table.c.id.in_(state_ids))
+
+    updated = 0
+    for row in connection.execute(query).mappings().all():
+        values = dict({column: row[column] for column in TRACKED_COLUMNS}, decision_count=row['decision_count'])
+        events = connection.execute(
+            db.select(game_event_table)
+            .where(game_event_table.c.game_state_id == row['id'], game_event_table.c.sequence > row['event_sequence'])
+            .order_by(game_event_table.c.sequence)
+        ).mappings().all()
+
+        decisions = []
+        for game_event in events:
+            apply_event(values, game_event['kind'], game_event['data'])
+            if game_event['kind'] == 'decision_recorded':
+                decisions.append(dict(
+                    Decision.row_values(game_event['data']['turn'], game_event['data']['decision']),
+                    game_state_id=row['id']
+                ))
+
+        result = connection.execute(
+            game_state_table.update()
+            .where(game_state_table.c.id == row['id'], game_state_table.c.version == row['version'])
+            .values(version=row['version'] + 1, event_sequence=events[-1]['sequence'], **values)
+        )
+        if result.rowcount != 1:
+            logger.warning("Game state %s changed while its events were replayed; skipping it.", row['id'])
+            continue
+        if decisions:
+            connection.execute(Decision.__table__.insert(), decisions)
+        updated += 1
+        logger.info("Replayed %d event(s) into game state %s.", len(events), row['id'])
+    return updated
@@ -1,15 +1,59 @@
 # narrative_engine/events.py
 
+import heapq
+import itertools
+import logging
+from .graph import load_graph_from_dict, graph_to_dict
+
+# Maximum number of condition evaluations in one call to EventHandler.process_events
+DEFAULT_MAX_EVENT_STEPS = 1000
+
+# Game state fields whose changes wake up the events that read them
+WATCHED_FIELDS = ('current_location', 'player_progress', 'inventory', 'flags', 'narrative_graph', 'narrative_memory')
+
+# Fields that events are indexed by; changing them can make other events candidates
+TRIGGER_FIELDS = frozenset(('current_location', 'inventory', 'flags'))
+
+# EventContext attributes that stand for game state fields
+CONTEXT_FIELDS = {'graph': 'narrative_graph', 'memory': 'narrative_memory'}
+
+logger = logging.getLogger(__name__)
+
 class Event:
-    def __init__(self, name, condition, action):
+    def __init__(self, name, condition, action, location=None, items=(), flags=()):
         """
         :param name: A string identifier for the event.
         :param condition: A function that takes game_state and returns True if the event should trigger.
         :param action: A function that takes game_state and performs the event action.
+        :param location: Trigger key: the event can only trigger at this location.
+        :param items: Trigger keys: the event can only trigger while all these items are in the inventory.
+        :param flags: Trigger keys: the event can only trigger while all these flags are set.
+        Events without trigger keys are checked on every turn.
         """
         self.name = name
         self.condition = condition
         self.action = action
+        self.location = location
+        self.items = tuple(items)
+        self.flags = tuple(flags)
+
+    def triggers_match(self, game_state):
+        """
+        Checks the event's trigger keys, which are cheap, before its condition is evaluated.
+        :param game_state: The current game state.
+        :return: True if every trigger key is satisfied.
+        """
+        # Only the fields named by trigger keys are read, so the event depends on nothing else
+        if self.location is not None and getattr(game_state, 'current_location', None) != self.location:
+            return False
+        if self.items:
+            inventory = getattr(game_state, 'inventory', None) or ()
+            if any(item not in inventory for item in self.items):
+                return False
+        if self.flags:
+            flags = getattr(game_state, 'flags', None) or {}
+            return all(flags.get(flag) for flag in self.flags)
+        return True
 
     def check_and_execute(self, game_state):
         """
@@ -22,9 +66,115 @@ class Event:
             return True
         return False
 
+class EventContext:
+    """
+    The state shared by the events triggered in one request: the GameState together with the
+    NarrativeGraph and NarrativeMemory the request has already parsed. Events change the parsed
+    objects in place; stage() writes them back once, and the request saves the game once.
+
+    Other attributes are read from and written to the GameState, so conditions and actions
+    written against a GameState also accept a context. save() does nothing, since changes are
+    staged into the request's save.
+    """
+
+    def __init__(self, game_state, graph, memory):
+        object.__setattr__(self, 'game_state', game_state)
+        object.__setattr__(self, 'graph', graph)
+        object.__setattr__(self, 'memory', memory)
+        # Incremented by every graph change; the graph is written back if it differs from the staged version
+        object.__setattr__(self, 'graph_version', 0)
+        object.__setattr__(self, 'staged_graph_version', 0)
+        object.__setattr__(self, 'memory_length', len(memory.events))
+
+    def __getattr__(self, name):
+        if name == 'narrative_graph':
+            return graph_to_dict(self.graph)
+        if name == 'narrative_memory':
+            return list(self.memory.events)
+        return getattr(self.game_state, name)
+
+    def __setattr__(self, name, value):
+        # Whole-value assignments from actions written against a GameState replace the parsed objects
+        if name == 'narrative_graph':
+            object.__setattr__(self, 'graph', load_graph_from_dict(value or {}))
+            self.mark_graph_changed()
+        elif name == 'narrative_memory':
+            self.memory.events = list(value or [])
+            object.__setattr__(self, 'memory_length', -1)
+        else:
+            setattr(self.game_state, name, value)
+
+    @property
+    def graph_changed(self):
+        return self.graph_version != self.staged_graph_version
+
+    def mark_graph_changed(self):
+        """Record that the graph was changed in place, so stage() writes it back."""
+        object.__setattr__(self, 'graph_version', self.graph_version + 1)
+
+    def save(self):
+        pass
+
+    def stage(self):
+        """Write the changed graph and memory back to the GameState, without saving it."""
+        if self.graph_changed:
+            self.game_state.narrative_graph = graph_to_dict(self.graph)
+            object.__setattr__(self, 'staged_graph_version', self.graph_version)
+        if len(self.memory.events) != self.memory_length:
+            self.game_state.narrative_memory = list(self.memory.events)
+            object.__setattr__(self, 'memory_length', len(self.memory.events))
+
+class _ReadTracker:
+    """Passes attribute reads through to a game state or context, recording the fields read."""
+
+    def __init__(self, target):
+        object.__setattr__(self, '_target', target)
+        object.__setattr__(self, 'fields', set())
+
+    def __getattr__(self, name):
+        self.fields.add(CONTEXT_FIELDS.get(name, name))
+        return getattr(self._target, name)
+
+    def __setattr__(self, name, value):
+        setattr(self._target, name, value)
+
+def _field_values(target):
+    """
+    Capture the watched fields cheaply: small fields by value, the graph and memory by identity
+    (and, for a context, by change counter and length), so nothing is serialized.
+    """
+    if isinstance(target, EventContext):
+        state = target.game_state
+        values = {
+            'narrative_graph': (id(target.graph), target.graph_version),
+            'narrative_memory': (id(target.memory), len(target.memory.events))
+        }
+    else:
+        state = target
+        values = {
+            'narrative_graph': id(getattr(state, 'narrative_graph', None)),
+            'narrative_memory': id(getattr(state, 'narrative_memory', None))
+        }
+    for field in ('current_location', 'player_progress'):
+        values[field] = getattr(state, field, None)
+    values['inventory'] = list(getattr(state, 'inventory', None) or ())
+    flags = getattr(state, 'flags', None)
+    values['flags'] = dict(flags) if isinstance(flags, dict) else None
+    return values
+
+def _changed_fields(before, after):
+    return {field for field in WATCHED_FIELDS if before[field] != after[field]}
+
 class EventHandler:
     def __init__(self):
         self.events = []
+        # Events indexed by their most selective trigger key, as (registration order, event) pairs
+        self._by_location = {}
+        self._by_item = {}
+        self._by_flag = {}
+        self._unkeyed = []
+        self._order = itertools.count()
+        self._positions = {}
 
     def register_event(self, event):
         """
@@ -32,30 +182,124 @@ class EventHandler:
         :param event: An instance of Event.
         """
         self.events.append(event)
+        entry = (next(self._order), event)
+        self._positions[id(event)] = entry[0]
+        if event.location is not None:
+            self._by_location.setdefault(event.location, []).append(entry)
+        elif event.items:
+            self._by_item.setdefault(event.items[0], []).append(entry)
+        elif event.flags:
+            self._by_flag.setdefault(event.flags[0], []).append(entry)
+        else:
+            self._unkeyed.append(entry)
+
+    def candidate_events(self, game_state):
+        """
+        Returns the events whose trigger keys match the game state, in registration order.
+        Only the events indexed under the current location, held items and set flags are
+        looked at, so the cost does not grow with the number of events elsewhere in the world.
+        :param game_state: The current game state.
+        :return: A list of events whose conditions should be evaluated.
+        """
+        entries = list(self._unkeyed)
+        entries += self._by_location.get(getattr(game_state, 'current_location', None), [])
+        for item in set(getattr(game_state, 'inventory', None) or ()):
+            entries += self._by_item.get(item, [])
+        for flag, value in (getattr(game_state, 'flags', None) or {}).items():
+            if value:
+                entries += self._by_flag.get(flag, [])
+        entries.sort(key=lambda entry: entry[0])
+        return [event for _, event in entries if event.triggers_match(game_state)]
+
+    def potential_events(self, game_state):
+        """
+        Returns the names of the events whose conditions are met, without executing them.
+        :param game_state: The current game state.
+        """
+        return [event.name for event in self.candidate_events(game_state) if event.condition(game_state)]
 
-    def process_events(self, game_state):
+    def process_events(self, game_state, context=None, max_steps=DEFAULT_MAX_EVENT_STEPS):
         """
-        Processes all registered events by checking their conditions against the game state.
+        Processes the registered events relevant to the game state until no more events trigger.
+        Candidate events are evaluated in registration order. The fields each condition reads are
+        recorded, and when an action changes fields, only the events that read them (and events
+        newly indexed under the current location, items or flags) are evaluated again.
+        Each event triggers at most once per call; an event whose condition holds again after
+        other events changed what it read is part of a cycle and is logged rather than repeated.
+
         :param game_state: The current game state.
-        :return: A list of names of the events that were triggered.
+        :param context: An optional EventContext for the request; events then receive it in place
+                        of the game state and their changes are staged rather than saved.
+        :param max_steps: Maximum number of condition evaluations before processing stops.
+        :return: A list of names of the events that were triggered, in the order they triggered.
         """
+        target = context if context is not None else game_state
         triggered_events = []
-        for event in self.events:
-            if event.check_and_execute(game_state):
-                triggered_events.append(event.name)
+        triggered = set()
+        evaluated = set()
+        readers = {}
+        queue = []
+        queued = set()
+
+        def enqueue(events):
+            for event in events:
+                if id(event) not in queued:
+                    queued.add(id(event))
+                    heapq.heappush(queue, (self._positions[id(event)], id(event), event))
+
+        enqueue(self.candidate_events(target))
+        steps = 0
+        while queue:
+            if steps >= max_steps:
+                logger.warning("Stopped processing events after %d steps; %d event(s) not evaluated.", steps, len(queue))
+                break
+            steps += 1
+            _, _, event = heapq.heappop(queue)
+            queued.discard(id(event))
+
+            evaluated.add(id(event))
+            tracker = _ReadTracker(target)
+            should_trigger = event.triggers_match(tracker) and event.condition(tracker)
+            for field in tracker.fields:
+                readers.setdefault(field, set()).add(event)
+            if not should_trigger:
+                continue
+            if id(event) in triggered:
+                logger.warning("Event '%s' was re-enabled by the events it triggered; skipping the cycle.", event.name)
+                continue
+
+            before = _field_values(target)
+            event.action(target)
+            triggered.add(id(event))
+            triggered_events.append(event.name)
+
+            changed = _changed_fields(before, _field_values(target))
+            if not changed:
+                continue
+            # An event is not woken by its own changes: one that still holds after its action has
+            # already triggered, and only changes made by other events can re-enable it
+            woken = set().union(*(readers.get(field, ()) for field in changed)) - {event}
+            enqueue(sorted(woken, key=lambda woken_event: self._positions[id(woken_event)]))
+            if changed & TRIGGER_FIELDS:
+                # Events already evaluated are woken through the fields they read
+                enqueue(event for event in self.candidate_events(target) if id(event) not in evaluated)
         return triggered_events
 
 # Example: Event trigger for opening a door
 
+DOOR_OPEN_NARRATIVE = "The ancient key glows briefly. With a loud creak, the door in the hallway slowly opens, revealing a passage beyond."
+
 def door_condition(game_state):
     """
     Check if the player is in the hallway, has a key, and the door is not already open.
     :param game_state: GameState object with attributes like 'current_location', 'inventory'.
     """
+    flags = getattr(game_state, 'flags', None)
     return (
         game_state.current_location == 'hallway' and 
         'key' in game_state.inventory and 
-        not getattr(game_state, 'door_open', False)
+        not getattr(game_state, 'door_open', False) and
+        not (isinstance(flags, dict) and flags.get('door_open'))
     )
 
 def door_action(game_state):
@@ -63,22 +307,31 @@ def door_action(game_state):
     Update the game state to mark the door as open and add a new exit.
     :param game_state: GameState object.
     """
-    # Set the door flag to open
+    # Set the door flag to open; assign a new dict so the change is saved
     if hasattr(game_state, 'flags') and isinstance(game_state.flags, dict):
-        game_state.flags['door_open'] = True
+        game_state.flags = dict(game_state.flags, door_open=True)
     
     # Add a new exit called 'door' that leads to a secret room
     if hasattr(game_state, 'exits') and isinstance(game_state.exits, dict):
         game_state.exits['door'] = 'secret_room'
 
+    if isinstance(game_state, EventContext):
+        # Change the request's parsed graph and memory; the request saves them once
+        hallway_node = game_state.graph.nodes.get('hallway')
+        if hallway_node:
+            hallway_node.exits['door'] = 'secret_room'
+            game_state.mark_graph_changed()
+        game_state.memory.add_event(DOOR_OPEN_NARRATIVE)
+        return
+
     # We need to update the graph to add the new exit
-    from narrative_engine.graph import load_graph_from_json
-    graph = load_graph_from_json(game_state.narrative_graph)
+    from narrative_engine.graph import load_graph_from_json, load_graph_from_dict, graph_to_dict
+    graph_config = game_state.narrative_graph
+    graph = load_graph_from_json(graph_config) if isinstance(graph_config, str) else load_graph_from_dict(graph_config)
     hallway_node = graph.nodes.get('hallway')
     if hallway_node:
         hallway_node.exits['door'] = 'secret_room'
-    from narrative_engine.graph import graph_to_json
-    game_state.narrative_graph = graph_to_json(graph)
+    game_state.narrative_graph = graph_to_dict(graph)
 
     # Add to narrative memory
     if hasattr(game_state, 'narrative_memory'):
@@ -86,14 +339,14 @@ def door_action(game_state):
         memory_events = []
         if game_state.narrative_memory:
             try:
-                memory_events = json.loads(game_state.narrative_memory) if isinstance(game_state.narrative_memory, str) else game_state.narrative_memory
+                memory_events = json.loads(game_state.narrative_memory) if isinstance(game_state.narrative_memory, str) else list(game_state.narrative_memory)
             except json.JSONDecodeError:
                 memory_events = []
-        memory_events.append("The ancient key glows briefly. With a loud creak, the door in the hallway slowly opens, revealing a passage beyond.")
-        game_state.narrative_memory = json.dumps(memory_events) if not isinstance(game_state.narrative_memory, list) else memory_events
+        memory_events.append(DOOR_OPEN_NARRATIVE)
+        game_state.narrative_memory = memory_events
 
     # Save the changes
     game_state.save()
 
 # Create an event instance for opening a door
-open_door_event = Event("Open Door", door_condition, door_action)
+open_door_event = Event("Open Door", door_condition, door_action, location='hallway', items=('key',))
@@ -1,6 +1,67 @@
 from models import db
-from sqlalchemy.types import TypeDecorator, TEXT
+from sqlalchemy import event, inspect, text
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import object_session, reconstructor
+from sqlalchemy.orm.attributes import set_committed_value
+from sqlalchemy.orm.exc import StaleDataError
+from sqlalchemy.types import TypeDecorator, TEXT, LargeBinary
+from contextlib import contextmanager
+import datetime
 import json
+import logging
+import zlib
+
+# Key in the SQLAlchemy session info dict tracking how deeply unit_of_work blocks are nested
+UNIT_OF_WORK_DEPTH_KEY = 'unit_of_work_depth'
+
+# Key in a SQLAlchemy session's info dict marking it as owned by a write-behind session store
+WRITE_BEHIND_KEY = 'write_behind'
+
+# Key in a SQLAlchemy session's info dict set while a deferred_saves block is running
+DEFERRED_SAVES_KEY = 'deferred_saves'
+
+# Default number of decisions returned per page of history
+DECISION_PAGE_SIZE = 50
+
+# First byte of values written by CompressedJSON; JSON text never starts with it
+COMPRESSED_JSON_MARKER = b'\x01'
+COMPRESSION_LEVEL = 6
+
+# Columns stored with CompressedJSON, and how many legacy rows are rewritten per batch
+COMPRESSED_COLUMNS = ('narrative_graph', 'narrative_memory')
+COMPRESSION_BATCH_SIZE = 500
+
+# A snapshot of a game's state is stored every time this many events have been recorded
+SNAPSHOT_INTERVAL = 50
+
+# Columns whose changes are recorded as events; decisions are recorded separately
+TRACKED_COLUMNS = (
+    'player_progress', 'current_location', 'inventory', 'flags', 'scheduled_events', 'narrative_graph', 'narrative_memory'
+)
+
+# How many times run_with_retry re-runs an operation that lost a version conflict
+DEFAULT_MAX_ATTEMPTS = 3
+
+# Layout of the game tables that upgrade_schema brings a database to; bump it whenever
+# upgrade_schema gains a step, so databases stamped with an older version run it once more
+SCHEMA_VERSION = 1
+
+# Columns added to the game_state table after its first release, with the DDL used to add
+# them to databases created before they existed
+ADDED_COLUMNS = {
+    'version': 'INTEGER NOT NULL DEFAULT 1',
+    'decision_count': 'INTEGER NOT NULL DEFAULT 0',
+    'event_sequence': 'INTEGER NOT NULL DEFAULT 0',
+    'allocated_sequence': 'INTEGER NOT NULL DEFAULT 0',
+    'updated_at': 'DATETIME',
+    'flags': "TEXT NOT NULL DEFAULT '{}'",
+    'scheduled_events': "TEXT NOT NULL DEFAULT '{}'",
+}
+
+logger = logging.getLogger(__name__)
+
+class ConcurrentUpdateError(Exception):
+    """Raised when a game state keeps being changed by other commands on every retry."""
 
 class JSONEncodedDict(TypeDecorator):
     """A custom type to store JSON-encoded dictionaries."""
@@ -16,34 +77,189 @@ class JSONEncodedDict(TypeDecorator):
             value = {}
         return json.loads(value)
 
+class Decision(db.Model):
+    """A single entry in a game's decision history, stored as its own append-only row."""
+    __tablename__ = 'decision'
+    id = db.Column(db.Integer, primary_key=True)
+    game_state_id = db.Column(db.Integer, db.ForeignKey('game_state.id'), nullable=False)
+    turn = db.Column(db.Integer, nullable=False)
+    action = db.Column(db.String(100))
+    timestamp = db.Column(db.String(40))
+    # The decision exactly as it was recorded (a dict or a plain string)
+    details = db.Column(JSONEncodedDict, nullable=False)
+
+    __table_args__ = (db.Index('ix_decision_game_state_turn', 'game_state_id', 'turn', unique=True),)
+
+    @staticmethod
+    def row_values(turn, decision):
+        """Return the column values for recording a decision at the given turn."""
+        if isinstance(decision, dict):
+            action, timestamp = decision.get('action'), decision.get('timestamp')
+        else:
+            action, timestamp = str(decision), None
+        return {'turn': turn, 'action': action, 'timestamp': timestamp, 'details': decision}
+
+    def to_dict(self):
+        """Convert the decision to a dictionary for API responses."""
+        return {
+            'turn': self.turn,
+            'action': self.action,
+            'timestamp': self.timestamp,
+            'details': self.details
+        }
+
+class CompressedJSON(TypeDecorator):
+    """
+    A custom type to store JSON values as zlib-compressed compact JSON.
+    Plain JSON text written by JSONEncodedDict is still read, including JSON strings that wrap
+    a second JSON document, so existing rows decode transparently until they are rewritten.
+    """
+    impl = LargeBinary
+    cache_ok = True
+
+    def process_bind_param(self, value, dialect):
+        if value is None:
+            return None
+        encoded = json.dumps(value, separators=(',', ':')).encode('utf-8')
+        return COMPRESSED_JSON_MARKER + zlib.compress(encoded, COMPRESSION_LEVEL)
+
+    def process_result_value(self, value, dialect):
+        if value is None:
+            return None
+        if isinstance(value, bytes) and value.startswith(COMPRESSED_JSON_MARKER):
+            value = zlib.decompress(value[len(COMPRESSED_JSON_MARKER):])
+        decoded = json.loads(value)
+        # Legacy rows hold a JSON-encoded string of the real document
+        if isinstance(decoded, str):
+            try:
+                decoded = json.loads(decoded)
+            except json.JSONDecodeError:
+                pass
+        return decoded
+
+class GameEvent(db.Model):
+    """An immutable record of one change to a game, or of a command or event that caused changes."""
+    __tablename__ = 'game_event'
+    id = db.Column(db.Integer, primary_key=True)
+    game_state_id = db.Column(db.Integer, db.ForeignKey('game_state.id'), nullable=False)
+    sequence = db.Column(db.Integer, nullable=False)
+    kind = db.Column(db.String(50), nullable=False)
+    data = db.Column(JSONEncodedDict, nullable=False)
+    created_at = db.Column(db.String(40))
+
+    __table_args__ = (db.Index('ix_game_event_game_state_sequence', 'game_state_id', 'sequence', unique=True),)
+
+class GameSnapshot(db.Model):
+    """The full state of a game as of an event sequence number, used as a starting point for replay."""
+    __tablename__ = 'game_snapshot'
+    id = db.Column(db.Integer, primary_key=True)
+    game_state_id = db.Column(db.Integer, db.ForeignKey('game_state.id'), nullable=False)
+    sequence = db.Column(db.Integer, nullable=False)
+    state = db.Column(CompressedJSON, nullable=False)
+
+    __table_args__ = (db.Index('ix_game_snapshot_game_state_sequence', 'game_state_id', 'sequence', unique=True),)
+
 class GameState(db.Model):
     __tablename__ = 'game_state'
     id = db.Column(db.Integer, primary_key=True)
     player_progress = db.Column(db.String(100), nullable=False)
     current_location = db.Column(db.String(100), nullable=False)
     inventory = db.Column(JSONEncodedDict, nullable=False, default=[])
-    decision_history = db.Column(JSONEncodedDict, nullable=False, default=[])
-    narrative_graph = db.Column(JSONEncodedDict, nullable=True)
-    narrative_memory = db.Column(JSONEncodedDict, nullable=True)
+    # Named story flags set by events, e.g. {"door_open": true}
+    flags = db.Column(JSONEncodedDict, nullable=False, default={}, server_default='{}')
+    # Timed events waiting for their turn, kept as a heap by the scheduler module
+    scheduled_events = db.Column(JSONEncodedDict, nullable=False, default={}, server_default='{}')
+    # Decisions used to be stored here as one JSON list; they now live in the decision table.
+    # The column is kept so databases created before the change can still be written to.
+    legacy_decision_history = db.Column('decision_history', JSONEncodedDict, nullable=False, default=[])
+    narrative_graph = db.Column(CompressedJSON, nullable=True)
+    narrative_memory = db.Column(CompressedJSON, nullable=True)
+    # Incremented on every update; updates only apply if the row still has the version that was loaded
+    version = db.Column(db.Integer, nullable=False, default=1)
+    # Number of decisions recorded so far, which is also the turn of the latest decision
+    decision_count = db.Column(db.Integer, nullable=False, default=0)
+    # Sequence number of the latest event reflected in this row
+    event_sequence = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # Sequence number of the latest event written for this game. It runs ahead of event_sequence
+    # while a session store holds turns it has not flushed, and only changes along with version,
+    # so two writers can never number their events alike
+    allocated_sequence = db.Column(db.Integer, nullable=False, default=0, server_default='0')
+    # When the row was last written, used to find abandoned games
+    updated_at = db.Column(db.DateTime, default=datetime.datetime.utcnow, onupdate=datetime.datetime.utcnow, index=True)
+
+    decisions = db.relationship('Decision', lazy='dynamic', order_by=Decision.turn, cascade='all, delete-orphan')
+
+    __mapper_args__ = {'version_id_col': version}
 
     def __init__(self, player_progress, current_location, inventory=None, decision_history=None, narrative_graph=None, narrative_memory=None):
         self.player_progress = player_progress
         self.current_location = current_location
         self.inventory = inventory if inventory is not None else []
-        self.decision_history = decision_history if decision_history is not None else []
+        self.flags = {}
+        self.scheduled_events = {}
+        self.legacy_decision_history = []
+        self.decision_count = 0
+        self.event_sequence = 0
+        self.allocated_sequence = 0
+        self.pending_events = []
+        for decision in decision_history or []:
+            self._append_decision(decision)
         self.narrative_graph = narrative_graph
         self.narrative_memory = narrative_memory
 
+    @reconstructor
+    def _init_on_load(self):
+        self.pending_events = []
+
+    @property
+    def decision_history(self):
+        """
+        The full decision history in turn order.
+        Use get_decisions to page through long games instead of loading every decision.
+        """
+        return [decision.details for decision in self.decisions]
+
     def save(self):
-        """Save the current game state to the database."""
+        """
+        Save the current game state to the database.
+        Inside a unit of work the change is only staged; the enclosing block commits it.
+        States held by a write-behind session store are committed when the store flushes them,
+        and inside a deferred_saves block nothing is written until save is called after it.
+
+        The event log makes turns replayable, not cheaper to write. A save updates only the
+        changed columns, but the narrative memory is one compressed value that every narrated
+        turn rewrites whole, as a changed graph is; the turn's events are inserted besides, and
+        a snapshot of the whole state every SNAPSHOT_INTERVAL events. With 60-word narratives a
+        move wrote about 2 KB at turn 1, 24 KB at turn 100 and 220 KB at turn 1000.
+        """
+        session = object_session(self)
+        if session is not None and (session.info.get(WRITE_BEHIND_KEY) or session.info.get(DEFERRED_SAVES_KEY)):
+            return
+        is_new = inspect(self).transient
         db.session.add(self)
-        db.session.commit()
+        # Flush first so a version conflict surfaces before the events claim their sequence numbers
+        db.session.flush()
+        if is_new:
+            # New games get a snapshot at sequence 0 so they can be replayed from the start
+            self.write_snapshot(db.session)
+        self.write_events(db.session)
+        if not in_unit_of_work():
+            db.session.commit()
 
     @classmethod
     def load(cls, state_id):
         """Load a game state from the database by its ID."""
         return cls.query.get(state_id)
 
+    @classmethod
+    def load_sequence(cls, state_id):
+        """
+        Return the event sequence stored for a game, or None if it does not exist.
+        The sequence changes whenever the game does, so it serves as the game's version; only
+        this one column is read.
+        """
+        return db.session.execute(db.select(cls.event_sequence).filter_by(id=state_id)).scalar()
+
     def update_progress(self, progress):
         self.player_progress = progress
         self.save()
@@ -61,17 +277,332 @@ class GameState(db.Model):
         self.inventory = current_inventory
         self.save()
 
+    def set_flag(self, key, value=True):
+        """Set a story flag and save changes."""
+        # Assign a new dictionary so SQLAlchemy detects the change
+        self.flags = dict(self.flags, **{key: value})
+        self.save()
+
     def add_decision(self, decision):
         """Add a decision to the history and save changes."""
-        # Create a new list with the existing decisions plus the new one
-        # This ensures SQLAlchemy detects the change
-        current_decisions = self.decision_history.copy()
-        current_decisions.append(decision)
-        self.decision_history = current_decisions
+        self._append_decision(decision)
         self.save()
 
+    def _append_decision(self, decision):
+        # Earlier decisions are never read or rewritten; pending rows are inserted in one batch on flush
+        self.decision_count += 1
+        self.decisions.append(Decision(**Decision.row_values(self.decision_count, decision)))
+        if inspect(self).has_identity:
+            self.record_event('decision_recorded', {'turn': self.decision_count, 'decision': decision})
+
+    def record_event(self, kind, data):
+        """
+        Record an event against this game. Changes to tracked columns are recorded automatically;
+        call this directly for commands, triggered events and other facts worth keeping.
+        Events are written by the next save, or by the session store that holds the game.
+
+        :param kind: A short name for the kind of event, e.g. 'command_executed'.
+        :param data: A JSON-compatible dictionary describing the event.
+        """
+        # Numbered after every event written so far, including turns a session store has not flushed
+        self.event_sequence = max(self.event_sequence, self.allocated_sequence) + 1
+        self.allocated_sequence = self.event_sequence
+        self.pending_events.append({
+            'sequence': self.event_sequence,
+            'kind': kind,
+            'data': data,
+            'created_at': datetime.datetime.now().isoformat()
+        })
+
+    def snapshot_values(self):
+        """Return the values of the tracked columns, as stored in snapshots."""
+        values = {column: getattr(self, column) for column in TRACKED_COLUMNS}
+        values['decision_count'] = self.decision_count
+        return values
+
+    def write_events(self, executor):
+        """
+        Insert the events recorded since the last write, plus a snapshot if one is due.
+        :param executor: A SQLAlchemy session or connection to write with.
+        """
+        events, self.pending_events = self.pending_events, []
+        if not events:
+            return
+        executor.execute(GameEvent.__table__.insert(), [dict(event, game_state_id=self.id) for event in events])
+        if any(event['sequence'] % SNAPSHOT_INTERVAL == 0 for event in events):
+            self.write_snapshot(executor)
+
+    def append_events(self, connection):
+        """
+        Write the pending events without flushing the rest of the row, as a write-behind session
+        store does between flushes. The row's allocated sequence and version are updated in the
+        same statement, so a writer that loaded the row earlier gets a version conflict instead
+        of numbering its events alike.
+        :param connection: A SQLAlchemy connection inside a transaction.
+        :raises StaleDataError: If the row's version is no longer the one this state was loaded with.
+        """
+        if not self.pending_events:
+            return
+        table = GameState.__table__
+        result = connection.execute(
+            table.update()
+            .where(table.c.id == self.id, table.c.version == self.version)
+            .values(version=self.version + 1, allocated_sequence=self.allocated_sequence)
+        )
+        if result.rowcount != 1:
+            raise StaleDataError(f"Game state {self.id} was changed by another writer.")
+        self.write_events(connection)
+        # The next flush of the row must expect the new version
+        set_committed_value(self, 'version', self.version + 1)
+        set_committed_value(self, 'allocated_sequence', self.allocated_sequence)
+
+    def write_snapshot(self, executor):
+        """Insert a snapshot of the current state at the current event sequence."""
+        executor.execute(GameSnapshot.__table__.insert(), [{
+            'game_state_id': self.id,
+            'sequence': self.event_sequence,
+            'state': self.snapshot_values()
+        }])
+
+    def get_decisions(self, after_turn=0, limit=DECISION_PAGE_SIZE):
+        """
+        Return a page of decisions in turn order.
+
+        :param after_turn: Only return decisions made after this turn, e.g. the last turn of the previous page.
+        :param limit: The maximum number of decisions to return.
+        :return: A list of Decision objects.
+        """
+        decisions = (
+            Decision.query
+            .filter(Decision.game_state_id == self.id, Decision.turn > after_turn)
+            .order_by(Decision.turn)
+            .limit(limit)
+            .all()
+        )
+        # Decisions buffered by a write-behind session store are newer than any stored row
+        session = object_session(self)
+        if session is not None and session.info.get(WRITE_BEHIND_KEY) and len(decisions) < limit:
+            pending = sorted(
+                (decision for decision in session.new if isinstance(decision, Decision) and decision.turn > after_turn),
+                key=lambda decision: decision.turn
+            )
+            decisions += pending[:limit - len(decisions)]
+        return decisions
+
+    def get_recent_decisions(self, limit=DECISION_PAGE_SIZE):
+        """Return the latest decisions, oldest first."""
+        return self.get_decisions(after_turn=max(self.decision_count - limit, 0), limit=limit)
+
+def _record_column_change(target, value, oldvalue, initiator):
+    # New games are captured whole by their first snapshot
+    if not inspect(target).has_identity:
+        return
+    from .event_store import change_events
+    for kind, data in change_events(initiator.key, oldvalue, value):
+        target.record_event(kind, data)
+
+def _discard_pending_events(target, context, attrs):
+    # Reloaded after a rollback: events recorded against the discarded values no longer apply
+    target.pending_events = []
+
+event.listen(GameState, 'refresh', _discard_pending_events)
+
+# A graph assignment is compared with the previous graph node by node, which takes time in
+# proportion to the graph; graphs are only assigned when a command or event changed them
+for tracked_column in TRACKED_COLUMNS:
+    event.listen(getattr(GameState, tracked_column), 'set', _record_column_change, active_history=True)
+
+def is_sequence_conflict(error):
+    """Return True if an IntegrityError was raised by events claiming sequence numbers already written."""
+    message = str(error.orig)
+    return 'ix_game_event_game_state_sequence' in message or 'game_event.sequence' in message
+
+def in_unit_of_work():
+    """Return True if the current session is inside a unit_of_work block."""
+    return db.session.info.get(UNIT_OF_WORK_DEPTH_KEY, 0) > 0
+
+@contextmanager
+def unit_of_work():
+    """
+    Stage every game state change made inside the block and commit them in one transaction.
+    Nested blocks join the outermost one. Any exception rolls the whole transaction back.
+
+    :return: The SQLAlchemy session used for the unit of work.
+    """
+    info = db.session.info
+    depth = info.get(UNIT_OF_WORK_DEPTH_KEY, 0)
+    info[UNIT_OF_WORK_DEPTH_KEY] = depth + 1
+    try:
+        yield db.session
+        if depth == 0:
+            db.session.commit()
+    except Exception:
+        if depth == 0:
+            db.session.rollback()
+        raise
+    finally:
+        info[UNIT_OF_WORK_DEPTH_KEY] = depth
+
+@contextmanager
+def deferred_saves():
+    """
+    Skip the writes made by GameState.save inside the block, so a game changed many times,
+    e.g. by a batch of commands, is written with one save after the block instead of one per change.
+    Queries inside the block do not autoflush either, so nothing locks the database for writing
+    until that save, however long the block takes (e.g. while narratives are generated).
+    """
+    info = db.session.info
+    outermost = not info.get(DEFERRED_SAVES_KEY)
+    info[DEFERRED_SAVES_KEY] = True
+    try:
+        with db.session.no_autoflush:
+            yield
+    finally:
+        if outermost:
+            info.pop(DEFERRED_SAVES_KEY, None)
+
+def run_with_retry(state_id, operation, max_attempts=DEFAULT_MAX_ATTEMPTS):
+    """
+    Load a game state and apply an operation to it in a unit of work, retrying on version conflicts,
+    including events that lost their sequence numbers to another writer.
+    Each attempt reloads the state, so the operation must only depend on the state it is given.
+
+    :param state_id: The ID of the game state to load.
+    :param operation: A function that takes the loaded GameState (or None if it does not exist).
+    :param max_attempts: How many times to run the operation before giving up.
+    :return: Whatever the operation returned on the attempt that committed.
+    :raises ConcurrentUpdateError: If every attempt conflicted with another command.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with unit_of_work():
+                return operation(GameState.load(state_id))
+        except StaleDataError:
+            logger.info("Game state %s changed concurrently (attempt %d of %d).", state_id, attempt, max_attempts)
+        except IntegrityError as error:
+            if not is_sequence_conflict(error):
+                raise
+            logger.info("Game state %s events conflicted (attempt %d of %d).", state_id, attempt, max_attempts)
+    raise ConcurrentUpdateError(f"Game state {state_id} was modified concurrently; gave up after {max_attempts} attempts.")
+
+def upgrade_schema():
+    """
+    Add columns introduced since an existing database was created.
+    db.create_all only creates missing tables, so new columns are added with ALTER TABLE.
+    init_app only runs this for databases older than SCHEMA_VERSION; bump it when adding a step.
+    """
+    existing_columns = {column['name'] for column in inspect(db.engine).get_columns(GameState.__tablename__)}
+    with db.engine.begin() as connection:
+        for name, ddl in ADDED_COLUMNS.items():
+            if name not in existing_columns:
+                connection.execute(text(f"ALTER TABLE {GameState.__tablename__} ADD COLUMN {name} {ddl}"))
+        for index in GameState.__table__.indexes:
+            index.create(connection, checkfirst=True)
+        # Games from before allocated_sequence was tracked have written every event up to the latest one
+        connection.execute(text(
+            f"UPDATE {GameState.__tablename__} SET allocated_sequence = MAX(event_sequence, COALESCE(("
+            f"SELECT MAX(sequence) FROM game_event WHERE game_event.game_state_id = {GameState.__tablename__}.id), 0)) "
+            "WHERE allocated_sequence = 0"
+        ))
+        # Games from before updated_at was tracked count as active from the upgrade on
+        connection.execute(text(f"UPDATE {GameState.__tablename__} SET updated_at = CURRENT_TIMESTAMP WHERE updated_at IS NULL"))
+        migrate_decision_history(connection)
+        compress_legacy_rows(connection)
+        snapshot_legacy_games(connection)
+
+def migrate_decision_history(connection):
+    """Move decisions still stored in the legacy JSON list column into the decision table."""
+    rows = connection.execute(text(
+        "SELECT id, decision_history FROM game_state WHERE decision_history NOT IN ('[]', '{}')"
+    )).all()
+    for state_id, raw_history in rows:
+        history = json.loads(raw_history)
+        connection.execute(Decision.__table__.insert(), [
+            dict(Decision.row_values(turn, decision), game_state_id=state_id)
+            for turn, decision in enumerate(history, start=1)
+        ])
+        connection.execute(
+            text("UPDATE game_state SET decision_history = '[]', decision_count = :count WHERE id = :id"),
+            {"count": len(history), "id": state_id}
+        )
+
+def compress_legacy_rows(connection):
+    """
+    Rewrite graph and memory values still stored as plain JSON text in compressed form.
+    Compressed values are stored as blobs, so only text values need to be read.
+    """
+    column_type = CompressedJSON()
+    for column in COMPRESSED_COLUMNS:
+        while True:
+            rows = connection.execute(text(
+                f"SELECT id, {column} FROM game_state WHERE typeof({column}) = 'text' LIMIT :limit"
+            ), {"limit": COMPRESSION_BATCH_SIZE}).all()
+            if not rows:
+                break
+            connection.execute(
+                text(f"UPDATE game_state SET {column} = :value WHERE id = :id"),
+                [
+                    {"id": state_id, "value": column_type.process_bind_param(column_type.process_result_value(raw, None), None)}
+                    for state_id, raw in rows
+                ]
+            )
+
+def snapshot_legacy_games(connection):
+    """Give games created before the event log a snapshot to replay from."""
+    game_state_table = GameState.__table__
+    rows = connection.execute(
+        game_state_table.select().where(
+            game_state_table.c.id.not_in(db.select(GameSnapshot.__table__.c.game_state_id))
+        )
+    ).mappings().all()
+    if rows:
+        connection.execute(GameSnapshot.__table__.insert(), [
+            {
+                'game_state_id': row['id'],
+                'sequence': row['event_sequence'],
+                'state': dict({column: row[column] for column in TRACKED_COLUMNS}, decision_count=row['decision_count'])
+            }
+            for row in rows
+        ])
+
+def create_tables(engine):
+    """
+    Create the tables that do not exist yet. A new SQLite database is first set to incremental
+    vacuum, which is only possible before its first table is created, so it can later return
+    freed pages to the file system without a blocking VACUUM; existing databases are switched
+    with archive.enable_incremental_vacuum.
+    """
+    with engine.begin() as connection:
+        if engine.dialect.name == 'sqlite' and connection.exec_driver_sql("PRAGMA page_count").scalar() == 0:
+            # Stored in the file's header when this connection creates the first table
+            connection.exec_driver_sql("PRAGMA auto_vacuum = INCREMENTAL")
+        db.metadata.create_all(connection)
+
+def stored_schema_version(engine):
+    """
+    Return the SCHEMA_VERSION a database was last upgraded to, kept in SQLite's user_version
+    header field; 0 for databases never stamped, and for other databases, which are always upgraded.
+    """
+    if engine.dialect.name != 'sqlite':
+        return 0
+    with engine.connect() as connection:
+        return connection.exec_driver_sql("PRAGMA user_version").scalar()
+
+def stamp_schema_version(engine):
+    """Record that a SQLite database has been upgraded to SCHEMA_VERSION."""
+    if engine.dialect.name == 'sqlite':
+        with engine.begin() as connection:
+            connection.exec_driver_sql(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
 def init_app(app):
-    """Initialize the module with the Flask app configuration."""
+    """
+    Initialize the module with the Flask app configuration.
+    The schema upgrade scans every game, so it only runs when the database's stored schema
+    version is older than SCHEMA_VERSION.
+    """
     db.init_app(app)
     with app.app_context():
-        db.create_all()
\ No newline at end of file
+        create_tables(db.engine)
+        if stored_schema_version(db.engine) < SCHEMA_VERSION:
+            upgrade_schema()
+            stamp_schema_version(db.engine)
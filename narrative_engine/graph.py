@@ -52,27 +52,35 @@ class NarrativeGraph:
         del self.nodes[from_node_id].exits[exit_name]
 
 def load_graph_from_json(config_str):
-    config = json.loads(config_str)
+    return load_graph_from_dict(json.loads(config_str))
+
+# Build a graph from an already decoded configuration, e.g. a GameState column value.
+# Containers are copied so changes to the graph never alias the configuration it came from.
+def load_graph_from_dict(config):
     graph = NarrativeGraph()
     for node_id, data in config.get("nodes", {}).items():
         node = Node(
             node_id=node_id,
             description=data["description"],
-            exits=data.get("exits", {}),
-            items=data.get("items", []),
-            actions=data.get("actions", {})
+            exits=dict(data.get("exits", {})),
+            items=list(data.get("items", [])),
+            actions=dict(data.get("actions", {}))
         )
         graph.add_node(node)
     return graph
 
-# Convert graph to JSON for storage
-def graph_to_json(graph):
+# Convert graph to a JSON-compatible dictionary for storage, copying containers as above
+def graph_to_dict(graph):
     nodes_dict = {}
     for node_id, node in graph.nodes.items():
         nodes_dict[node_id] = {
             "description": node.description,
-            "exits": node.exits,
-            "items": node.items,
-            "actions": node.actions
+            "exits": dict(node.exits),
+            "items": list(node.items),
+            "actions": dict(node.actions)
         }
-    return json.dumps({"nodes": nodes_dict})
+    return {"nodes": nodes_dict}
+
+# Convert graph to JSON for storage
+def graph_to_json(graph):
+    return json.dumps(graph_to_dict(graph))
@@ -0,0 +1,354 @@
+# narrative_engine/jobs.py
+
+import atexit
+import json
+import logging
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import nullcontext
+from narrative_engine.ai_generator import (
+    prepare_prompt, get_cached_narrative, generate_narrative_with_params, finish_narrative
+)
+
+logger = logging.getLogger(__name__)
+
+# Job statuses
+PENDING = 'pending'
+DONE = 'done'
+FAILED = 'failed'
+
+# Number of finished jobs kept by a local queue for clients to fetch
+DEFAULT_RETENTION = 10000
+
+# Seconds a Redis queue keeps a job
+DEFAULT_JOB_TTL = 3600
+
+# Seconds a Redis queue's job waits for a generation started by another process before
+# running it itself, in case that process stopped
+DEFAULT_GENERATION_TIMEOUT = 300
+
+class LocalJobQueue:
+    """
+    Runs narrative jobs on a pool of threads in this process.
+    Every submission is a job of its own, finished with its own payload (e.g. to remember the
+    narrative for its game), but jobs whose prompts share a cache key share one generation,
+    whether it is running or has finished. Finished jobs and generations are kept until max_jobs
+    newer ones have finished; the jobs waiting on a generation that fails run it again.
+    """
+
+    def __init__(self, generate, finish=None, workers=4, max_jobs=DEFAULT_RETENTION, context=nullcontext):
+        """
+        :param generate: Called with a job's payload in a worker thread; returns the narrative.
+                         Called once for all the jobs sharing the payload's cache key.
+        :param finish: Called with each job's payload and narrative in its worker thread, e.g.
+                       to append the narrative to the job's game; optional.
+        :param workers: Number of worker threads.
+        :param max_jobs: Number of finished jobs, and of generated narratives, kept.
+        :param context: Called to get the context manager each job runs in, e.g. app.app_context.
+        """
+        self.generate = generate
+        self.finish = finish
+        self.max_jobs = max_jobs
+        self.context = context
+        self._pending = set()
+        self._finished = OrderedDict()
+        # Generations by cache key, running or done
+        self._generations = OrderedDict()
+        self._changed = threading.Condition()
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='narrative-job')
+
+    def submit(self, job_id, payload):
+        """Queue a job; return False if a job with this ID was already submitted."""
+        with self._changed:
+            if job_id in self._pending or job_id in self._finished:
+                return False
+            self._pending.add(job_id)
+        self._executor.submit(self._run, job_id, payload)
+        return True
+
+    def result(self, job_id, timeout=0):
+        """
+        Return a job's status, with its narrative once it is done, waiting up to timeout seconds
+        for a pending job to finish. Returns None if the job is unknown.
+        """
+        deadline = time.monotonic() + timeout
+        with self._changed:
+            while job_id in self._pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return {"status": PENDING}
+                self._changed.wait(remaining)
+            job = self._finished.get(job_id)
+            return dict(job) if job else None
+
+    def close(self):
+        """Stop the workers; jobs not yet started are dropped."""
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+    def _run(self, job_id, payload):
+        try:
+            with self.context():
+                narrative = self._narrative(payload)
+                if self.finish:
+                    self.finish(payload, narrative)
+            job = {"status": DONE, "narrative": narrative}
+        except Exception as error:
+            logger.exception("Narrative job %s failed", job_id)
+            job = {"status": FAILED, "error": str(error)}
+        with self._changed:
+            self._pending.discard(job_id)
+            self._finished[job_id] = job
+            while len(self._finished) > self.max_jobs:
+                self._finished.popitem(last=False)
+            self._changed.notify_all()
+
+    def _narrative(self, payload):
+        cache_key = payload["cache_key"]
+        while True:
+            with self._changed:
+                generation = self._generations.get(cache_key)
+                if generation is None:
+                    generation = self._generations[cache_key] = Future()
+                    break
+            try:
+                return generation.result()
+            except Exception:
+                # The job running it failed; run it again unless another waiting job already is
+                continue
+        try:
+            narrative = self.generate(payload)
+        except Exception as error:
+            with self._changed:
+                self._generations.pop(cache_key, None)
+            generation.set_exception(error)
+            raise
+        generation.set_result(narrative)
+        with self._changed:
+            while len(self._generations) > self.max_jobs:
+                self._generations.popitem(last=False)
+        return narrative
+
+class RedisJobQueue:
+    """
+    Keeps narrative jobs in Redis, so any server process can run a job and report its result.
+    Each process runs workers taking jobs from a shared list; a job's status and narrative are
+    stored under its ID for ttl seconds. As with LocalJobQueue, jobs whose prompts share a cache
+    key share one generation, stored under the cache key for ttl seconds.
+    """
+
+    def __init__(self, client, generate, finish=None, workers=4, ttl=DEFAULT_JOB_TTL, prefix='narrative_job',
+                 context=nullcontext, poll_interval=0.05, generation_timeout=DEFAULT_GENERATION_TIMEOUT):
+        """
+        :param client: The Redis client.
+        :param generate: Called with a job's payload in a worker thread; returns the narrative.
+                         Called once for all the jobs sharing the payload's cache key.
+        :param finish: Called with each job's payload and narrative in its worker thread; optional.
+        :param workers: Number of worker threads in this process.
+        :param ttl: Seconds a job is kept.
+        :param prefix: Prefix of the Redis keys.
+        :param context: Called to get the context manager each job runs in, e.g. app.app_context.
+        :param poll_interval: Seconds between checks while waiting for a job or a generation.
+        :param generation_timeout: Seconds a generation started by another process is waited for.
+        """
+        self.client = client
+        self.generate = generate
+        self.finish = finish
+        self.ttl = int(ttl)
+        self.prefix = prefix
+        self.context = context
+        self.poll_interval = poll_interval
+        self.generation_timeout = int(generation_timeout)
+        self.queue_key = f"{prefix}:queue"
+        self._stopped = threading.Event()
+        self._workers = [
+            threading.Thread(target=self._work, name=f'narrative-job-{index}', daemon=True)
+            for index in range(workers)
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, job_id, payload):
+        """Queue a job; return False if a job with this ID was already submitted."""
+        if not self.client.set(self._key(job_id), json.dumps({"status": PENDING}), nx=True, ex=self.ttl):
+            return False
+        self.client.lpush(self.queue_key, json.dumps({"job_id": job_id, "payload": payload}))
+        return True
+
+    def result(self, job_id, timeout=0):
+        """
+        Return a job's status, with its narrative once it is done, waiting up to timeout seconds
+        for a pending job to finish. Returns None if the job is unknown or has expired.
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            job = self._load(self._key(job_id))
+            if job is None or job["status"] != PENDING or time.monotonic() >= deadline:
+                return job
+            time.sleep(min(self.poll_interval, max(0.0, deadline - time.monotonic())))
+
+    def close(self):
+        """Stop the workers once their current jobs finish; queued jobs stay in Redis."""
+        self._stopped.set()
+
+    def _key(self, job_id):
+        return f"{self.prefix}:{job_id}"
+
+    def _load(self, key):
+        value = self.client.get(key)
+        return json.loads(value) if value else None
+
+    def _narrative(self, payload):
+        key = self._key(f"generation:{payload['cache_key']}")
+        while True:
+            # The pending marker expires, so a generation whose process stopped is run again
+            if self.client.set(key, json.dumps({"status": PENDING}), nx=True, ex=self.generation_timeout):
+                break
+            generation = self._load(key)
+            if generation is not None and generation["status"] == DONE:
+                return generation["narrative"]
+            self._stopped.wait(self.poll_interval)
+        try:
+            narrative = self.generate(payload)
+        except Exception:
+            # The jobs waiting on it run it again
+            self.client.delete(key)
+            raise
+        self.client.set(key, json.dumps({"status": DONE, "narrative": narrative}), ex=self.ttl)
+        return narrative
+
+    def _work(self):
+        while not self._stopped.is_set():
+            try:
+                item = self.client.brpop(self.queue_key, timeout=1)
+            except Exception as error:
+                logger.error("Error reading narrative jobs from Redis: %s", error)
+                self._stopped.wait(1)
+                continue
+            if item is None:
+                continue
+            queued = json.loads(item[1])
+            try:
+                with self.context():
+                    narrative = self._narrative(queued["payload"])
+                    if self.finish:
+                        self.finish(queued["payload"], narrative)
+                job = {"status": DONE, "narrative": narrative}
+            except Exception as error:
+                logger.exception("Narrative job %s failed", queued["job_id"])
+                job = {"status": FAILED, "error": str(error)}
+            try:
+                self.client.set(self._key(queued["job_id"]), json.dumps(job), ex=self.ttl)
+            except Exception as error:
+                logger.error("Error storing narrative job in Redis: %s", error)
+
+class QueuedNarrative:
+    """Stands in for a narrative in a result until NarrativeJobs.submit has queued its job."""
+
+    def __init__(self, payload):
+        self.payload = payload
+
+class NarrativeJobs:
+    """
+    A narrator for the game's operations that prepares the prompts of the narratives they ask
+    for, so their jobs can be queued once the operation has committed instead of generating them.
+    """
+
+    def __init__(self):
+        # Number of jobs queued by submit
+        self.queued = 0
+
+    def __call__(self, location_type, tone, required_elements, memory=None):
+        # The prompt includes the memory as it is at this point of the operation
+        prompt, prompt_meta, cache_key = prepare_prompt(location_type, tone, required_elements, memory)
+        return QueuedNarrative({
+            "prompt": prompt,
+            "prompt_meta": prompt_meta,
+            "cache_key": cache_key,
+            "location_type": location_type,
+            "tone": tone,
+            "required_elements": required_elements
+        })
+
+    def submit(self, queue, result, game_id=None, remember=False):
+        """
+        Queue a job for each narrative in the result and replace the narrative with the job's ID,
+        under the narrative's key with a _job suffix (e.g. "narrative_job"). Each narrative gets a
+        job of its own, so the game and remember flag of every request are kept, even when
+        narratives with the same prompt share their generation. Narratives recorded by attempts of
+        the operation that were retried are not in the result, so they are never queued.
+        :param queue: The LocalJobQueue or RedisJobQueue.
+        :param result: The result returned by the operation, containing QueuedNarrative values.
+        :param game_id: The game the narratives are generated for.
+        :param remember: Whether a job appends its narrative to the game's narrative memory, as the
+                         synchronous routes do for a command's narratives; False for read-only requests.
+        """
+        def replace(value):
+            if isinstance(value, dict):
+                replaced = {}
+                for key, item in value.items():
+                    if isinstance(item, QueuedNarrative):
+                        job_id = uuid.uuid4().hex
+                        queue.submit(job_id, dict(item.payload, game_id=game_id, remember=remember))
+                        self.queued += 1
+                        replaced[f"{key}_job"] = job_id
+                    else:
+                        replaced[key] = replace(item)
+                return replaced
+            if isinstance(value, list):
+                return [replace(item) for item in value]
+            return value
+        
+        return replace(result)
+
+def generate_job_narrative(payload):
+    """Generate the narrative of a job queued by NarrativeJobs, reusing the narrative cache."""
+    cache_key = payload["cache_key"]
+    narrative = get_cached_narrative(cache_key)
+    if narrative is None:
+        narrative = generate_narrative_with_params(payload["prompt"], payload["prompt_meta"])
+    return finish_narrative(
+        narrative, payload["location_type"], payload["tone"], payload["required_elements"], None, cache_key
+    )
+
+def init_app(app, generate, finish=None):
+    """
+    Start the narrative job queue from the Flask app configuration.
+    Expected configuration keys (all optional):
+      - NARRATIVE_JOBS_ENABLED (defaults to False)
+      - NARRATIVE_JOB_BACKEND ('local', the default, or 'redis' to share jobs through REDIS_URL)
+      - NARRATIVE_JOB_WORKERS
+      - NARRATIVE_JOB_RETENTION (finished jobs kept by the local queue)
+      - NARRATIVE_JOB_TTL (seconds the Redis queue keeps a job)
+
+    :param generate: Called with a job's payload in an app context; returns the narrative.
+    :param finish: Called with each job's payload and narrative in an app context; optional.
+    :return: The started queue, or None if narrative jobs are disabled.
+    """
+    if not app.config.get('NARRATIVE_JOBS_ENABLED', False):
+        return None
+    workers = app.config.get('NARRATIVE_JOB_WORKERS', 4)
+    backend = app.config.get('NARRATIVE_JOB_BACKEND', 'local')
+    if backend == 'redis':
+        import redis
+        queue = RedisJobQueue(
+            redis.Redis.from_url(app.config['REDIS_URL']),
+            generate,
+            finish,
+            workers,
+            ttl=app.config.get('NARRATIVE_JOB_TTL', DEFAULT_JOB_TTL),
+            context=app.app_context
+        )
+    else:
+        queue = LocalJobQueue(
+            generate,
+            finish,
+            workers,
+            max_jobs=app.config.get('NARRATIVE_JOB_RETENTION', DEFAULT_RETENTION),
+            context=app.app_context
+        )
+    atexit.register(queue.close)
+    app.logger.info("Narrative jobs enabled (%s queue, %d workers).", backend, workers)
+    return queue
@@ -0,0 +1,41 @@
+# narrative_engine/response_cache.py
+
+import threading
+from collections import OrderedDict
+
+# Number of games whose latest response is kept
+DEFAULT_CACHE_SIZE = 1024
+
+class ResponseCache:
+    """
+    Keeps the latest response body of each game under its ETag, so unchanged games are
+    served without being loaded or narrated again. Once max_size games are cached, the
+    least recently used one is dropped.
+    """
+
+    def __init__(self, max_size=DEFAULT_CACHE_SIZE):
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, etag):
+        """Return the body cached for the key if it was stored under this ETag, or None."""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] != etag:
+                return None
+            self._entries.move_to_end(key)
+            return entry[1]
+
+    def put(self, key, etag, body):
+        """Cache a body under its ETag, replacing the key's previous body."""
+        if self.max_size <= 0:
+            return
+        with self._lock:
+            self._entries[key] = (etag, body)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+
+    def __len__(self):
+        return len(self._entries)
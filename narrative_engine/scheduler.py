@@ -0,0 +1,137 @@
+# narrative_engine/scheduler.py
+
+import heapq
+import logging
+from .events import Event, EventContext
+
+logger = logging.getLogger(__name__)
+
+def game_clock(game_state):
+    """
+    Return a game's clock, which is its turn: the number of decisions recorded so far.
+    Only commands recording a decision (moves, actions and uses) advance it; pickups and
+    failed commands do not, so they bring no timed event closer.
+    """
+    return getattr(game_state, 'decision_count', 0) or 0
+
+def schedule_event(game_state, name, delay=None, at=None, data=None):
+    """
+    Schedule a timed event for a game. The game's queue of timed events is a heap stored in
+    its scheduled_events column, so it is saved and restored along with the rest of the game.
+
+    :param game_state: The GameState (or an EventContext for it).
+    :param name: The name the event's action is registered under in a Scheduler.
+    :param delay: Number of turns from now after which the event is due.
+    :param at: The game-clock turn at which the event is due; used instead of delay.
+    :param data: Optional JSON-compatible value passed to the event's action.
+    :return: The ID of the scheduled event, for cancel_event.
+    """
+    if (delay is None) == (at is None):
+        raise ValueError("Pass either delay or at")
+    due = game_clock(game_state) + delay if at is None else at
+
+    # Copy the queue and assign it back so SQLAlchemy detects the change
+    schedule = getattr(game_state, 'scheduled_events', None) or {}
+    queue = list(schedule.get('queue', []))
+    event_id = schedule.get('next_id', 1)
+    # The ID breaks ties between events due on the same turn, in scheduling order
+    heapq.heappush(queue, [due, event_id, name, data])
+    game_state.scheduled_events = {'queue': queue, 'next_id': event_id + 1}
+    return event_id
+
+def cancel_event(game_state, event_id):
+    """
+    Remove a scheduled event before it is due.
+    :return: True if the event was still scheduled.
+    """
+    schedule = getattr(game_state, 'scheduled_events', None) or {}
+    queue = [entry for entry in schedule.get('queue', []) if entry[1] != event_id]
+    if len(queue) == len(schedule.get('queue', [])):
+        return False
+    heapq.heapify(queue)
+    game_state.scheduled_events = dict(schedule, queue=queue)
+    return True
+
+def pending_events(game_state):
+    """Return a game's scheduled events as (due turn, name) pairs, soonest first."""
+    schedule = getattr(game_state, 'scheduled_events', None) or {}
+    return [(due, name) for due, _, name, _ in sorted(schedule.get('queue', []))]
+
+class Scheduler:
+    """
+    Fires timed events when the game clock reaches them.
+    The actions of timed events are registered here by name; the games only store the names,
+    so scheduled events survive restarts and stay small.
+    """
+
+    def __init__(self):
+        self.actions = {}
+
+    def register(self, name, action):
+        """
+        Register the action of a timed event.
+        :param name: The name events are scheduled under.
+        :param action: A function that takes game_state and the event's data and performs the event.
+        """
+        self.actions[name] = action
+
+    def run_due(self, game_state):
+        """
+        Fire the game's events that are due by its current turn, in due order.
+        Only due events are popped, so a game pays nothing for timers that are not due yet.
+        Events scheduled by the actions run here fire on a later call at the earliest.
+
+        :param game_state: The GameState (or an EventContext for it).
+        :return: The names of the events that fired.
+        """
+        schedule = getattr(game_state, 'scheduled_events', None) or {}
+        queue = schedule.get('queue')
+        now = game_clock(game_state)
+        if not queue or queue[0][0] > now:
+            return []
+
+        queue = list(queue)
+        due_events = []
+        while queue and queue[0][0] <= now:
+            due_events.append(heapq.heappop(queue))
+        # Store the remaining queue before any action runs, so actions can schedule more events
+        game_state.scheduled_events = dict(schedule, queue=queue)
+
+        fired = []
+        for _, _, name, data in due_events:
+            action = self.actions.get(name)
+            if action is None:
+                logger.warning("No action registered for timed event %r; dropping it.", name)
+                continue
+            action(game_state, data)
+            fired.append(name)
+        return fired
+
+# Example: the torch burns out a number of turns after it is lit
+
+TORCH_BURN_TURNS = 10
+
+TORCH_BURNT_OUT_NARRATIVE = "Your torch sputters and dies, leaving only a charred stick."
+
+def torch_lit_condition(game_state):
+    """Check if the player holds the torch and it has not been lit yet."""
+    flags = getattr(game_state, 'flags', None) or {}
+    return 'torch' in game_state.inventory and not flags.get('torch_lit')
+
+def torch_lit_action(game_state):
+    """Light the torch and schedule it to burn out."""
+    game_state.flags = dict(game_state.flags, torch_lit=True)
+    schedule_event(game_state, 'torch_burns_out', delay=TORCH_BURN_TURNS)
+    game_state.save()
+
+def torch_burns_out(game_state, data):
+    """Replace the lit torch with a burnt-out one."""
+    game_state.inventory = [item for item in game_state.inventory if item != 'torch'] + ['burnt torch']
+    if isinstance(game_state, EventContext):
+        game_state.memory.add_event(TORCH_BURNT_OUT_NARRATIVE)
+    else:
+        game_state.narrative_memory = list(game_state.narrative_memory or []) + [TORCH_BURNT_OUT_NARRATIVE]
+    game_state.save()
+
+# Create an event that lights the torch once it is picked up
+light_torch_event = Event("Light Torch", torch_lit_condition, torch_lit_action, items=('torch',))
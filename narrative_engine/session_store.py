@@ -0,0 +1,316 @@
+# narrative_engine/session_store.py
+
+import atexit
+import logging
+import threading
+import time
+from sqlalchemy import event, inspect
+from sqlalchemy.orm import Session, object_session
+from sqlalchemy.orm.exc import StaleDataError
+from models import db
+from .game_state import GameState, ConcurrentUpdateError, WRITE_BEHIND_KEY
+from .event_store import replay_unapplied_events
+
+# Key in a hot session's info dict counting attribute changes made to its game state
+CHANGE_COUNT_KEY = 'change_count'
+
+logger = logging.getLogger(__name__)
+
+def _count_change(target, value, oldvalue, initiator):
+    session = object_session(target)
+    if session is not None and session.info.get(WRITE_BEHIND_KEY):
+        session.info[CHANGE_COUNT_KEY] = session.info.get(CHANGE_COUNT_KEY, 0) + 1
+
+# Count changes so the store can tell turns that changed a game from turns that only read it
+for column_attribute in inspect(GameState).column_attrs:
+    event.listen(getattr(GameState, column_attribute.key), 'set', _count_change)
+
+class HotSession:
+    """
+    An active game held in memory.
+    The game state lives in its own SQLAlchemy session that never autoflushes, so changes
+    stay in memory until the store flushes them.
+    """
+
+    def __init__(self, engine, state_id):
+        self.state_id = state_id
+        self.session = Session(engine, autoflush=False, expire_on_commit=False, info={WRITE_BEHIND_KEY: True})
+        # Set whenever the session checks out a database connection, which it keeps until commit
+        self.holds_connection = False
+        event.listen(self.session, 'after_begin', self._on_begin)
+        self.game_state = self.session.get(GameState, state_id)
+        # Release the connection; the loaded attributes stay usable without it
+        self.session.commit()
+        self.holds_connection = False
+        self.lock = threading.RLock()
+        self.seen_changes = 0
+        self.unflushed_turns = 0
+        self.last_flush = self.last_access = time.monotonic()
+        self.closed = False
+
+    def _on_begin(self, session, transaction, connection):
+        self.holds_connection = True
+
+    def has_changes(self):
+        """Return True if the game state has changes that have not been flushed."""
+        return bool(self.session.new or self.session.dirty)
+
+    def changed_since_last_turn(self):
+        """Return True if the game state was changed since the last call."""
+        changes = self.session.info.get(CHANGE_COUNT_KEY, 0)
+        changed = changes != self.seen_changes
+        self.seen_changes = changes
+        return changed
+
+    def write_events(self):
+        """
+        Append the events of the turns since the last write to the event log, in a short transaction of their own.
+        :raises ConcurrentUpdateError: If the row was changed outside this store since it was loaded or flushed.
+        """
+        try:
+            with self.session.get_bind().begin() as connection:
+                self.game_state.append_events(connection)
+        except StaleDataError as error:
+            raise ConcurrentUpdateError(f"Game state {self.state_id} was modified outside the session store.") from error
+
+    def flush(self):
+        """
+        Commit buffered changes and any unwritten events to the database.
+        :raises ConcurrentUpdateError: If the row was changed outside this store since the last flush.
+        """
+        try:
+            self.session.flush()
+            self.game_state.write_events(self.session)
+            self.session.commit()
+        except StaleDataError as error:
+            self.session.rollback()
+            raise ConcurrentUpdateError(f"Game state {self.state_id} was modified outside the session store.") from error
+        except Exception:
+            self.session.rollback()
+            raise
+        self.holds_connection = False
+        self.unflushed_turns = 0
+        self.last_flush = time.monotonic()
+
+    def close(self):
+        self.closed = True
+        self.session.close()
+
+class HotSessionStore:
+    """
+    Keeps active games in memory and writes them back to the database behind the requests
+    that change them: after flush_turns changed turns, after flush_interval seconds, or when
+    an idle game is evicted. Every changed turn appends its events to the game's event log,
+    so turns that have not been flushed can be replayed into the database after a crash.
+    """
+
+    def __init__(self, engine, flush_turns=10, flush_interval=30.0, idle_timeout=600.0):
+        """
+        :param engine: The SQLAlchemy engine of the game database.
+        :param flush_turns: Number of changed turns after which a game is flushed.
+        :param flush_interval: Maximum number of seconds a changed game stays unflushed.
+        :param idle_timeout: Number of seconds without a command after which a game is evicted.
+        """
+        self.engine = engine
+        self.flush_turns = flush_turns
+        self.flush_interval = flush_interval
+        self.idle_timeout = idle_timeout
+        self._sessions = {}
+        # Counts games dropped from memory, so a load racing an eviction can tell it may be stale
+        self._dropped = 0
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._worker = None
+
+    def run(self, state_id, operation):
+        """
+        Apply an operation to the in-memory state of a game, loading the game if it is not resident.
+        Follows the same contract as game_state.run_with_retry.
+
+        :param state_id: The ID of the game state.
+        :param operation: A function that takes the GameState (or None if it does not exist).
+        :return: Whatever the operation returned.
+        """
+        while True:
+            game = self._checkout(state_id)
+            if game is None:
+                return operation(None)
+            with game.lock:
+                if game.closed:
+                    # Evicted while we were waiting for the lock; load it again
+                    continue
+                game.last_access = time.monotonic()
+                try:
+                    result = operation(game.game_state)
+                    self._end_turn(game)
+                except Exception:
+                    self._discard(game)
+                    raise
+                return result
+
+    def resident_sequence(self, state_id):
+        """
+        Return the event sequence of a resident game, including unflushed turns, or None if the
+        game is not resident (the database then has its latest state).
+        """
+        with self._lock:
+            game = self._sessions.get(state_id)
+        if game is None or game.closed:
+            return None
+        return game.game_state.event_sequence
+
+    def flush(self, state_id):
+        """Flush a resident game so the database reflects its latest state."""
+        with self._lock:
+            game = self._sessions.get(state_id)
+        if game is not None:
+            with game.lock:
+                if not game.closed and (game.unflushed_turns or game.has_changes()):
+                    game.flush()
+
+    def flush_due(self):
+        """Flush every game whose changes are older than the flush interval."""
+        now = time.monotonic()
+        for game in self._resident():
+            with game.lock:
+                if not game.closed and game.unflushed_turns and now - game.last_flush >= self.flush_interval:
+                    game.flush()
+
+    def flush_all(self):
+        """Flush every resident game with unflushed changes."""
+        for game in self._resident():
+            self.flush(game.state_id)
+
+    def evict_idle(self):
+        """
+        Flush and drop games that have not received a command within the idle timeout.
+        :return: The number of games evicted.
+        """
+        now = time.monotonic()
+        evicted = 0
+        for game in self._resident():
+            with game.lock:
+                if game.closed or now - game.last_access < self.idle_timeout:
+                    continue
+                if game.unflushed_turns or game.has_changes():
+                    game.flush()
+                with self._lock:
+                    self._sessions.pop(game.state_id, None)
+                    self._dropped += 1
+                game.close()
+                evicted += 1
+        return evicted
+
+    def recover(self):
+        """
+        Replay events that a previous process appended but never flushed into their game state rows.
+        :return: The number of games recovered.
+        """
+        with self.engine.begin() as connection:
+            recovered = replay_unapplied_events(connection)
+        logger.info("Recovered %d game(s) from the event log.", recovered)
+        return recovered
+
+    def start(self):
+        """Start a background thread that flushes due games and evicts idle ones."""
+        if self._worker is not None:
+            return
+        self._worker = threading.Thread(target=self._maintain, name="hot-session-store", daemon=True)
+        self._worker.start()
+
+    def close(self):
+        """Stop the background thread and flush every resident game."""
+        self._stop.set()
+        if self._worker is not None:
+            self._worker.join()
+            self._worker = None
+        self.flush_all()
+
+    def _maintain(self):
+        interval = min(self.flush_interval, self.idle_timeout) / 2
+        while not self._stop.wait(interval):
+            try:
+                self.flush_due()
+                self.evict_idle()
+            except Exception as error:
+                logger.error("Hot session maintenance failed: %s", error)
+
+    def _checkout(self, state_id):
+        while True:
+            with self._lock:
+                game = self._sessions.get(state_id)
+                dropped = self._dropped
+            if game is not None:
+                return game
+            # Load the game without holding the store's lock, so a slow load only delays its own game
+            loaded = HotSession(self.engine, state_id)
+            if loaded.game_state is None:
+                loaded.close()
+                return None
+            with self._lock:
+                game = self._sessions.get(state_id)
+                if game is None and self._dropped == dropped:
+                    self._sessions[state_id] = game = loaded
+            if game is not loaded:
+                # Another thread loaded the game first, or a game was flushed and dropped while
+                # this copy loaded and it may predate the flush; use theirs or load it again
+                loaded.close()
+                if game is not None:
+                    return game
+                continue
+            return game
+
+    def _resident(self):
+        with self._lock:
+            return list(self._sessions.values())
+
+    def _end_turn(self, game):
+        changed = game.changed_since_last_turn()
+        if changed:
+            game.unflushed_turns += 1
+        due = (
+            game.unflushed_turns >= self.flush_turns
+            or (game.unflushed_turns and time.monotonic() - game.last_flush >= self.flush_interval)
+        )
+        # A turn that read from the database (e.g. decision history) holds a connection until commit
+        if due or game.holds_connection:
+            game.flush()
+        elif changed:
+            game.write_events()
+
+    def _discard(self, game):
+        # A failed operation may have left partial changes in memory; drop them and rebuild
+        # the row from the events of the turns that completed
+        with self._lock:
+            self._sessions.pop(game.state_id, None)
+            self._dropped += 1
+        game.close()
+        with self.engine.begin() as connection:
+            replay_unapplied_events(connection, [game.state_id])
+
+def init_app(app):
+    """
+    Create a hot session store from the Flask app configuration.
+    Expected configuration keys (all optional):
+      - HOT_SESSIONS_ENABLED (defaults to False)
+      - HOT_SESSION_FLUSH_TURNS
+      - HOT_SESSION_FLUSH_INTERVAL
+      - HOT_SESSION_IDLE_TIMEOUT
+
+    :return: The started store, or None if hot sessions are disabled.
+    """
+    if not app.config.get('HOT_SESSIONS_ENABLED', False):
+        return None
+    with app.app_context():
+        engine = db.engine
+    store = HotSessionStore(
+        engine,
+        flush_turns=app.config.get('HOT_SESSION_FLUSH_TURNS', 10),
+        flush_interval=app.config.get('HOT_SESSION_FLUSH_INTERVAL', 30.0),
+        idle_timeout=app.config.get('HOT_SESSION_IDLE_TIMEOUT', 600.0)
+    )
+    store.recover()
+    store.start()
+    atexit.register(store.close)
+    app.logger.info("Hot session store enabled (flush every %d turns).", store.flush_turns)
+    return store
@@ -0,0 +1,224 @@
+# narrative_engine/vocabulary.py
+
+# Abbreviations must be at least this long to be completed from the prefix trie
+MIN_PREFIX_LENGTH = 2
+
+# Largest edit distance of a fuzzy match. difflib.get_close_matches, which commands were matched
+# with before, has no such limit, so it also matched longer phrases with more typos, e.g.
+# "lihgt torhc" for "light torch" (four edits). Those no longer match: the index's size grows
+# steeply with this distance
+DEFAULT_MAX_DISTANCE = 2
+
+# Default minimum similarity for fuzzy matches, as in difflib.get_close_matches
+DEFAULT_CUTOFF = 0.7
+
+def edit_distance(a, b):
+    """Return the Levenshtein distance between two strings."""
+    if len(a) < len(b):
+        a, b = b, a
+    previous = list(range(len(b) + 1))
+    for i, a_char in enumerate(a, start=1):
+        current = [i]
+        for j, b_char in enumerate(b, start=1):
+            current.append(min(
+                previous[j] + 1,
+                current[j - 1] + 1,
+                previous[j - 1] + (a_char != b_char)
+            ))
+        previous = current
+    return previous[-1]
+
+def similarity(a, b):
+    """
+    Return how alike two strings are, from 0 (nothing in common) to 1 (equal): twice the length
+    of their longest common subsequence over their total length, like difflib's ratio.
+    """
+    if not a and not b:
+        return 1.0
+    previous = [0] * (len(b) + 1)
+    for a_char in a:
+        current = [0]
+        for j, b_char in enumerate(b, start=1):
+            current.append(previous[j - 1] + 1 if a_char == b_char else max(previous[j], current[j - 1]))
+        previous = current
+    return 2.0 * previous[-1] / (len(a) + len(b))
+
+class PrefixTrie:
+    """A trie of terms that completes abbreviations with a single possible completion."""
+
+    __slots__ = ('children', 'count', 'term')
+
+    def __init__(self):
+        self.children = {}
+        # Number of terms at or below this node, and one of them
+        self.count = 0
+        self.term = None
+
+    def insert(self, term):
+        node = self
+        node.count += 1
+        node.term = term
+        for char in term:
+            node = node.children.setdefault(char, PrefixTrie())
+            node.count += 1
+            node.term = term
+
+    def unique_completion(self, prefix):
+        """
+        Return the only term starting with the prefix, or None if there are none or several.
+        Takes time proportional to the length of the prefix, however many terms there are.
+        """
+        node = self
+        for char in prefix:
+            node = node.children.get(char)
+            if node is None:
+                return None
+        return node.term if node.count == 1 else None
+
+def deletions(term, max_distance):
+    """Return the strings made by deleting up to max_distance characters from a term, including the term."""
+    variants = {term}
+    frontier = {term}
+    for _ in range(max_distance):
+        frontier = {variant[:i] + variant[i + 1:] for variant in frontier for i in range(len(variant))}
+        variants |= frontier
+    return variants
+
+class DeletionIndex:
+    """
+    Finds the terms within a small edit distance of a word with dictionary lookups.
+    Every term is stored under the strings made by deleting up to max_distance of its characters.
+    Two strings within that edit distance always share one of these, so a lookup only generates the
+    word's own deletions and checks the terms stored under them, however large the vocabulary is.
+    """
+
+    def __init__(self, max_distance=DEFAULT_MAX_DISTANCE):
+        self.max_distance = max_distance
+        self.entries = {}
+
+    def add(self, term):
+        for variant in deletions(term, self.max_distance):
+            self.entries.setdefault(variant, []).append(term)
+
+    def search(self, word, radius):
+        """Return (distance, term) pairs for the terms within the radius of the word, closest first."""
+        radius = min(radius, self.max_distance)
+        seen = set()
+        matches = []
+        for variant in deletions(word, radius):
+            for term in self.entries.get(variant, ()):
+                if term in seen:
+                    continue
+                seen.add(term)
+                if abs(len(term) - len(word)) > radius:
+                    continue
+                distance = edit_distance(word, term)
+                if distance <= radius:
+                    matches.append((distance, term))
+        return sorted(matches)
+
+class VocabularyIndex:
+    """
+    Looks up the closest term in a fixed vocabulary: an exact term, then the only term an
+    abbreviation can stand for, then the most similar term by edit distance.
+    """
+
+    def __init__(self, terms, max_distance=DEFAULT_MAX_DISTANCE):
+        """
+        :param terms: The terms to index.
+        :param max_distance: The largest edit distance a fuzzy match may have. Building the index
+                             takes time and memory that grow steeply with it.
+        """
+        self.terms = set()
+        self.trie = PrefixTrie()
+        self.deletions = DeletionIndex(max_distance)
+        for term in terms:
+            self.terms.add(term)
+            self.trie.insert(term)
+            self.deletions.add(term)
+
+    def match(self, word, cutoff=DEFAULT_CUTOFF):
+        """
+        Fuzzy matches must be at least as similar as the cutoff and within the index's
+        max_distance edits of the word.
+
+        :param word: The normalized word to look up.
+        :param cutoff: Minimum similarity of a fuzzy match (see similarity).
+        :return: The matching term, or None.
+        """
+        if word in self.terms:
+            return word
+        if len(word) >= MIN_PREFIX_LENGTH:
+            completion = self.trie.unique_completion(word)
+            if completion is not None:
+                return completion
+        # The edit distance d is at most the number of characters outside the common subsequence, and
+        # a term d edits away has at most len(word) + d characters, so similarity >= cutoff implies
+        # d <= 2 * (1 - cutoff) * len(word) / cutoff
+        radius = int(2 * (1 - cutoff) * len(word) / cutoff) if cutoff > 0 else len(word)
+        best_term, best_similarity = None, cutoff
+        for _, term in self.deletions.search(word, radius):
+            term_similarity = similarity(word, term)
+            if term_similarity > best_similarity or (best_term is None and term_similarity == cutoff):
+                best_term, best_similarity = term, term_similarity
+        return best_term
+
+class Vocabulary(dict):
+    """
+    A dictionary of terms to values with a VocabularyIndex over its keys.
+    The index is built on first use and rebuilt after the vocabulary changes.
+    """
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self._index = None
+
+    def index(self):
+        """Return the index over the current terms, building it if the vocabulary changed."""
+        index = self._index
+        if index is None:
+            index = self._index = VocabularyIndex(self.keys())
+        return index
+
+    def match(self, word, cutoff=DEFAULT_CUTOFF):
+        """Return the value of the term matching the word (see VocabularyIndex.match), or None."""
+        term = self.index().match(word, cutoff)
+        return self[term] if term is not None else None
+
+    def _changed(self):
+        self._index = None
+
+    def __setitem__(self, key, value):
+        # Only the terms are indexed, so replacing a value keeps the index
+        if key not in self:
+            self._changed()
+        super().__setitem__(key, value)
+
+    def __delitem__(self, key):
+        super().__delitem__(key)
+        self._changed()
+
+    def update(self, *args, **kwargs):
+        super().update(*args, **kwargs)
+        self._changed()
+
+    def setdefault(self, key, default=None):
+        if key not in self:
+            self._changed()
+        return super().setdefault(key, default)
+
+    def pop(self, *args):
+        self._changed()
+        return super().pop(*args)
+
+    def popitem(self):
+        self._changed()
+        return super().popitem()
+
+    def clear(self):
+        super().clear()
+        self._changed()
+
+    def __ior__(self, other):
+        self.update(other)
+        return self
@@ -0,0 +1,140 @@
+# narrative_engine/world.py
+
+from sqlalchemy.orm import aliased, selectinload
+from models import db
+from models.location import Location
+from models.item import Item
+from models.action import Action
+from models.exit import Exit
+# Mapped so the foreign keys of the world tables resolve when they are created
+from models import player, game_state, story_memory  # noqa: F401
+from .graph import Node, NarrativeGraph
+
+def get_location(name):
+    """
+    Load a location by name with its items, actions and exits, in one query per relationship.
+    :param name: The name of the location, which is its node ID in the narrative graph.
+    :return: The Location, or None if there is no location with that name.
+    """
+    return db.session.execute(
+        db.select(Location).where(Location.name == name).options(*_contents())
+    ).scalars().first()
+
+def load_locations(names=None):
+    """
+    Load several locations with their contents eagerly, so calling to_dict on each of them
+    issues no further queries.
+
+    :param names: The names of the locations to load; defaults to every location.
+    :return: A list of Locations ordered by ID.
+    """
+    return _load_locations(names, _contents())
+
+def items_at(name, visible_only=True):
+    """Return the items at a location, found through the indexed location name and item location ID."""
+    query = db.select(Item).join(Location, Item.location_id == Location.id).where(Location.name == name)
+    if visible_only:
+        query = query.where(Item.visible.is_(True))
+    return db.session.execute(query.order_by(Item.id)).scalars().all()
+
+def exits_from(name):
+    """Return the exits of a location as a dictionary of direction to destination name."""
+    destination = aliased(Location)
+    rows = db.session.execute(
+        db.select(Exit.direction, destination.name)
+        .join(Location, Exit.location_id == Location.id)
+        .join(destination, Exit.destination_id == destination.id)
+        .where(Location.name == name)
+    ).all()
+    return dict(rows)
+
+def available_actions(name, inventory=(), flags=None):
+    """
+    Return the actions at a location whose requirements are met.
+    The actions are loaded with their location, which decodes their requirements once.
+
+    :param name: The name of the location.
+    :param inventory: The identifiers of the items the player holds, as used in requires_items.
+    :param flags: A dictionary of the game's flags.
+    :return: A list of Actions ordered by ID.
+    """
+    locations = _load_locations([name], (selectinload(Location.actions),))
+    if not locations:
+        return []
+    held = set(inventory)
+    flags = flags or {}
+    return [
+        action for action in sorted(locations[0].actions, key=lambda action: action.id)
+        if held.issuperset(action.required_items)
+        and all(flags.get(flag) == value for flag, value in action.required_flags.items())
+    ]
+
+def location_to_node(location):
+    """Convert an eagerly loaded Location into a narrative graph Node."""
+    return Node(
+        node_id=location.name,
+        description=location.description,
+        exits={exit_link.direction: exit_link.destination.name for exit_link in location.exit_links},
+        items=[item.name for item in location.items if item.visible],
+        actions={action.name: action.description for action in location.actions}
+    )
+
+def load_world_graph(names=None):
+    """
+    Build a narrative graph from the world tables.
+    Pass the names of the locations a command needs to avoid loading a large world whole.
+
+    :param names: The names of the locations to include; defaults to every location.
+    :return: A NarrativeGraph.
+    """
+    graph = NarrativeGraph()
+    for location in load_locations(names):
+        graph.add_node(location_to_node(location))
+    return graph
+
+def create_indexes():
+    """Create indexes added to the world tables since an existing database was created."""
+    for table in (Location.__table__, Item.__table__, Action.__table__, Exit.__table__):
+        for index in table.indexes:
+            index.create(db.engine, checkfirst=True)
+
+def migrate_legacy_exits():
+    """Move exits still stored in the legacy JSON column of locations into the exits table."""
+    locations = db.session.execute(
+        db.select(Location).where(Location.exits.is_not(None), Location.exits.not_in(['', '{}']))
+    ).scalars().all()
+    for location in locations:
+        location.migrate_legacy_exits()
+    db.session.commit()
+    return len(locations)
+
+def init_app(app):
+    """
+    Create the world tables and their indexes, move legacy JSON exits into rows and register
+    the import-world CLI command. Expects the database to be initialized already.
+    """
+    from .world_import import import_world_command
+    app.cli.add_command(import_world_command)
+    with app.app_context():
+        db.create_all()
+        create_indexes()
+        migrate_legacy_exits()
+
+def _load_locations(names, options):
+    query = db.select(Location).options(*options).order_by(Location.id)
+    if names is not None:
+        query = query.where(Location.name.in_(names))
+    locations = db.session.execute(query).scalars().all()
+    # Decode the actions' JSON requirements here, so checking them does not parse them again
+    for location in locations:
+        for action in location.actions:
+            action.required_items = frozenset(action.get_required_items())
+            action.required_flags = action.get_required_flags()
+    return locations
+
+def _contents():
+    return (
+        selectinload(Location.items),
+        selectinload(Location.actions),
+        selectinload(Location.exit_links).selectinload(Exit.destination)
+    )
@@ -0,0 +1,173 @@
+# narrative_engine/world_import.py
+
+import json
+import logging
+import time
+import click
+from flask.cli import with_appcontext
+from sqlalchemy import MetaData, Table, Column, Integer, String
+from models import db
+from models.location import Location
+from models.item import Item
+from models.action import Action
+from models.exit import Exit
+from .action_events import invalidate_action_events
+
+# Number of locations written per transaction
+IMPORT_BATCH_SIZE = 10000
+
+# Exits are staged here with their destination's name until every location has an ID
+_staging_metadata = MetaData()
+staged_exits = Table(
+    'staged_exits', _staging_metadata,
+    Column('location_id', Integer, nullable=False),
+    Column('direction', String(50), nullable=False),
+    Column('destination_name', String(100), nullable=False),
+    prefixes=['TEMPORARY']
+)
+
+logger = logging.getLogger(__name__)
+
+def read_world_nodes(stream):
+    """
+    Yield (node_id, node) pairs from a world file.
+    Accepts the graph_to_json format ({"nodes": {node_id: node}}) or JSON Lines with one node per
+    line, each carrying its ID as "node_id". JSON Lines files are read one line at a time.
+    """
+    first_line = stream.readline()
+    try:
+        first = json.loads(first_line)
+    except json.JSONDecodeError:
+        # The start of a pretty-printed document
+        first = {}
+    if not isinstance(first, dict) or "node_id" not in first:
+        # A single JSON document, which may span many lines
+        config = json.loads(first_line + stream.read())
+        yield from config.get("nodes", {}).items()
+        return
+    yield first["node_id"], first
+    for line in stream:
+        if line.strip():
+            node = json.loads(line)
+            yield node["node_id"], node
+
+def import_world(nodes, batch_size=IMPORT_BATCH_SIZE, progress=None):
+    """
+    Load world nodes into the locations, items, actions and exits tables.
+    Rows are written with executemany in one transaction per batch. Location IDs are assigned
+    up front so items and actions need no round trip. Exits are staged and resolved to
+    location IDs in a second pass, since they may point at locations later in the file.
+    Locations whose name already exists are skipped.
+
+    :param nodes: An iterable of (node_id, node) pairs, e.g. from read_world_nodes.
+    :param batch_size: Number of locations written per transaction.
+    :param progress: Optional function called with (locations imported so far, seconds elapsed).
+    :return: A dictionary of counts and the time taken.
+    """
+    stats = {'locations': 0, 'items': 0, 'actions': 0, 'exits': 0, 'skipped_locations': 0, 'unresolved_exits': 0}
+    started = time.monotonic()
+
+    with db.engine.connect() as connection:
+        staged_exits.create(connection)
+        try:
+            next_id = (connection.execute(db.select(db.func.max(Location.id))).scalar() or 0) + 1
+
+            batch = []
+            for node_id, node in nodes:
+                batch.append((node_id, node))
+                if len(batch) >= batch_size:
+                    next_id = _write_batch(connection, batch, next_id, stats)
+                    batch = []
+                    if progress:
+                        progress(stats['locations'], time.monotonic() - started)
+            if batch:
+                next_id = _write_batch(connection, batch, next_id, stats)
+                if progress:
+                    progress(stats['locations'], time.monotonic() - started)
+
+            # Second pass: resolve destinations by name in one statement, preferring the newest location
+            staged_count = connection.execute(db.select(db.func.count()).select_from(staged_exits)).scalar()
+            resolved = (
+                db.select(
+                    staged_exits.c.location_id, staged_exits.c.direction,
+                    db.func.max(Location.id).label('destination_id')
+                )
+                .join(Location, Location.name == staged_exits.c.destination_name)
+                .group_by(staged_exits.c.location_id, staged_exits.c.direction)
+            )
+            result = connection.execute(
+                Exit.__table__.insert().from_select(['location_id', 'direction', 'destination_id'], resolved)
+            )
+            stats['exits'] = result.rowcount
+            stats['unresolved_exits'] = staged_count - result.rowcount
+            # Actions were written with Core statements, which the ORM change events do not see
+            if connection.dialect.name != 'sqlite':
+                invalidate_action_events(connection)
+            connection.commit()
+        finally:
+            # The temporary table lives as long as the pooled connection, so drop it
+            # even when the import fails, or the next import could not create it
+            connection.rollback()
+            staged_exits.drop(connection, checkfirst=True)
+            connection.commit()
+
+    stats['seconds'] = time.monotonic() - started
+    logger.info("Imported %d locations in %.1fs.", stats['locations'], stats['seconds'])
+    return stats
+
+def _write_batch(connection, batch, next_id, stats):
+    names = [node_id for node_id, _ in batch]
+    existing = set(connection.execute(db.select(Location.name).where(Location.name.in_(names))).scalars())
+
+    locations, items, actions, exits = [], [], [], []
+    for node_id, node in batch:
+        if node_id in existing:
+            stats['skipped_locations'] += 1
+            continue
+        existing.add(node_id)
+        location_id = next_id
+        next_id += 1
+        locations.append({'id': location_id, 'name': node_id, 'description': node.get("description", ""), 'exits': '{}'})
+        items += [
+            {'name': item, 'description': item, 'location_id': location_id, 'portable': True, 'visible': True}
+            for item in node.get("items", [])
+        ]
+        actions += [
+            {'name': name, 'description': description, 'location_id': location_id}
+            for name, description in node.get("actions", {}).items()
+        ]
+        exits += [
+            {'location_id': location_id, 'direction': direction, 'destination_name': destination}
+            for direction, destination in node.get("exits", {}).items()
+        ]
+
+    for table, rows in ((Location.__table__, locations), (Item.__table__, items),
+                        (Action.__table__, actions), (staged_exits, exits)):
+        if rows:
+            connection.execute(table.insert(), rows)
+    connection.commit()
+
+    stats['locations'] += len(locations)
+    stats['items'] += len(items)
+    stats['actions'] += len(actions)
+    return next_id
+
+@click.command('import-world')
+@click.argument('world_file', type=click.File('r', encoding='utf-8'))
+@click.option('--batch-size', default=IMPORT_BATCH_SIZE, show_default=True, help='Locations written per transaction.')
+@with_appcontext
+def import_world_command(world_file, batch_size):
+    """Import a world file (graph JSON or JSON Lines) into the world tables."""
+    def report(count, elapsed):
+        click.echo(f"{count} locations imported ({count / max(elapsed, 1e-9):.0f}/s)")
+
+    stats = import_world(read_world_nodes(world_file), batch_size=batch_size, progress=report)
+    click.echo(
+        f"Done in {stats['seconds']:.1f}s: {stats['locations']} locations, {stats['items']} items, "
+        f"{stats['actions']} actions, {stats['exits']} exits"
+    )
+    if stats['skipped_locations'] or stats['unresolved_exits']:
+        click.echo(
+            f"Skipped {stats['skipped_locations']} existing locations and "
+            f"{stats['unresolved_exits']} exits to unknown locations"
+        )
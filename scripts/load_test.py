@@ -0,0 +1,396 @@
+# scripts/load_test.py
+"""
+Simulate many concurrent players running the scenarios in scripts/*.http against the game.
+
+Each player starts a game, then sends the requests of a scenario in order with its own game ID in
+place of the one in the file. By default the game runs in this process on the ASGI server, against
+a temporary database and a mock narrative provider that answers after --llm-latency seconds, so
+thousands of players can be simulated on one machine. --server flask runs the players on threads
+through the Flask app instead, and --url sends them to a running server (which uses its own provider).
+Settings such as HOT_SESSIONS_ENABLED are read from the environment as usual.
+
+Prints throughput, latency percentiles and error rates per route and database contention, and
+writes them to a JSON file so builds can be compared:
+
+    uv run python scripts/load_test.py --players 2000 --concurrency 1000 --output load.json
+"""
+
+import argparse
+import asyncio
+import datetime
+import json
+import logging
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCRIPTS = os.path.join(ROOT, 'scripts')
+
+REQUEST_LINE = re.compile(r'^(GET|POST|PUT|PATCH|DELETE)\s+(\S+)')
+HEADER_LINE = re.compile(r'^([\w-]+):\s*(.*)$')
+
+# Routes taking a game ID; the ID in the .http files is replaced with each player's game
+GAME_ROUTE = re.compile(r'^/(state|history|command|commands|move|pickup)/(?:\d+|\{state_id\})(?=/|$|\?)')
+
+def parse_http_file(path):
+    """
+    Read the requests of a .http file, in order.
+    Lines starting with # are comments, including commented-out example requests.
+    :return: A list of dicts with the method, path (with query), headers and JSON body of each request.
+    """
+    requests = []
+    current = None
+    body_lines = None
+    with open(path) as file:
+        for line in file:
+            line = line.rstrip('\n')
+            match = REQUEST_LINE.match(line)
+            if match or line.startswith('#'):
+                if current is not None:
+                    _finish(current, body_lines)
+                    requests.append(current)
+                    current = None
+                if match:
+                    url = urlsplit(match.group(2))
+                    current = {
+                        "method": match.group(1),
+                        "path": url.path + (f"?{url.query}" if url.query else ""),
+                        "headers": {},
+                        "body": None
+                    }
+                    body_lines = None
+                continue
+            if current is None:
+                continue
+            if body_lines is None:
+                header = HEADER_LINE.match(line)
+                if header:
+                    current["headers"][header.group(1)] = header.group(2)
+                elif not line.strip():
+                    body_lines = []
+                else:
+                    body_lines = [line]
+            else:
+                body_lines.append(line)
+    if current is not None:
+        _finish(current, body_lines)
+        requests.append(current)
+    return requests
+
+def _finish(request, body_lines):
+    body = "\n".join(body_lines or []).strip()
+    request["body"] = json.loads(body) if body else None
+
+def load_scenario(name):
+    """
+    Turn a .http file into a scenario for one player: its requests, with the game ID replaced by
+    {state_id}, after a request starting a new game if the file does not begin with one. Requests
+    needing values the scenario does not know (e.g. a {job_id}) are left out.
+    """
+    steps = []
+    for step in parse_http_file(os.path.join(SCRIPTS, f"{name}.http")):
+        step["path"] = GAME_ROUTE.sub(r'/\1/{state_id}', step["path"])
+        if re.search(r'\{(?!state_id\})', step["path"]):
+            continue
+        # An ETag copied into the file would not match the player's game
+        step["headers"].pop("If-None-Match", None)
+        steps.append(step)
+    if not steps or (steps[0]["method"], steps[0]["path"]) != ("GET", "/"):
+        steps.insert(0, {"method": "GET", "path": "/", "headers": {}, "body": None})
+    return steps
+
+def route_name(method, path):
+    """Group requests by method and route, e.g. GET /move for /move/12/forward."""
+    first = path.split('?')[0].strip('/').split('/')[0]
+    return f"{method} /{first}"
+
+class MockCompletions:
+    """Answers chat completions after a delay with the prompt, which names every required element."""
+
+    def __init__(self, latency):
+        self.latency = latency
+
+    def create(self, messages, stream=False, **kwargs):
+        time.sleep(self.latency)
+        return self._response(messages)
+
+    def _response(self, messages):
+        message = type('Message', (), {'content': f"A mock narrative. {messages[-1]['content']}"})
+        choice = type('Choice', (), {'message': message})
+        return type('Response', (), {'choices': [choice]})
+
+class MockAsyncCompletions(MockCompletions):
+    async def create(self, messages, stream=False, **kwargs):
+        await asyncio.sleep(self.latency)
+        if not stream:
+            return self._response(messages)
+        content = self._response(messages).choices[0].message.content
+
+        async def chunks():
+            delta = type('Delta', (), {'content': content})
+            yield type('Chunk', (), {'choices': [type('Choice', (), {'delta': delta})]})
+        return chunks()
+
+def install_mock_provider(latency):
+    """Replace the OpenAI SDK clients the narrative generator creates with mock ones."""
+    from narrative_engine import ai_generator
+
+    def client(completions):
+        def create_client(api_key=None):
+            chat = type('Chat', (), {'completions': completions})
+            return type('Client', (), {'chat': chat})
+        return create_client
+
+    ai_generator.OpenAI = client(MockCompletions(latency))
+    ai_generator.AsyncOpenAI = client(MockAsyncCompletions(latency))
+
+class ContentionCounter(logging.Handler):
+    """
+    Counts the database contention logged by the game in this process: commands retried because
+    another command changed the same game, and errors from waiting too long for SQLite's write lock.
+    Installed on the root logger, it also keeps the game's per-request log messages off the console.
+    """
+
+    def __init__(self):
+        super().__init__(logging.INFO)
+        self.retries = 0
+        self.lock_errors = 0
+
+    def emit(self, record):
+        if 'changed concurrently' in record.getMessage():
+            self.retries += 1
+        elif record.exc_info and 'database is locked' in str(record.exc_info[1]):
+            self.lock_errors += 1
+
+class AsgiTarget:
+    """Sends requests to the ASGI application in this process."""
+
+    def __init__(self, instance_path):
+        import asgi
+        self.asgi = asgi
+        asgi.start(instance_path=instance_path)
+
+    async def request(self, method, path, headers, body):
+        path, _, query = path.partition('?')
+        data = json.dumps(body).encode() if body is not None else b''
+        messages = []
+
+        async def receive():
+            return {'type': 'http.request', 'body': data, 'more_body': False}
+
+        async def send(message):
+            messages.append(message)
+
+        scope = {
+            'type': 'http', 'method': method, 'path': path, 'query_string': query.encode(),
+            'headers': [(name.lower().encode(), value.encode()) for name, value in headers.items()]
+        }
+        await self.asgi.application(scope, receive, send)
+        status = messages[0]['status']
+        content = b''.join(message.get('body', b'') for message in messages[1:])
+        return status, json.loads(content) if content else None
+
+class ThreadTarget:
+    """Sends requests from a pool of threads, one per concurrent player."""
+
+    def __init__(self, concurrency):
+        self.executor = ThreadPoolExecutor(max_workers=concurrency)
+
+    async def request(self, method, path, headers, body):
+        return await asyncio.get_running_loop().run_in_executor(
+            self.executor, self.send, method, path, headers, body
+        )
+
+class FlaskTarget(ThreadTarget):
+    """Sends requests to the Flask app in this process, through a test client per thread."""
+
+    def __init__(self, concurrency, instance_path):
+        super().__init__(concurrency)
+        import game
+        self.app = game.create_app(instance_path=instance_path)
+        self.clients = threading.local()
+
+    def send(self, method, path, headers, body):
+        if not hasattr(self.clients, 'client'):
+            self.clients.client = self.app.test_client()
+        headers = {name: value for name, value in headers.items() if name.lower() != 'content-type'}
+        response = self.clients.client.open(path, method=method, headers=headers, json=body)
+        return response.status_code, response.get_json(silent=True)
+
+class HttpTarget(ThreadTarget):
+    """Sends requests to a running server."""
+
+    def __init__(self, concurrency, url):
+        super().__init__(concurrency)
+        self.url = url.rstrip('/')
+
+    def send(self, method, path, headers, body):
+        data = json.dumps(body).encode() if body is not None else None
+        headers = dict(headers, **({'Content-Type': 'application/json'} if data else {}))
+        request = urllib.request.Request(self.url + path, data=data, headers=headers, method=method)
+        try:
+            with urllib.request.urlopen(request, timeout=120) as response:
+                status, content = response.status, response.read()
+        except urllib.error.HTTPError as error:
+            status, content = error.code, error.read()
+        try:
+            return status, json.loads(content) if content else None
+        except ValueError:
+            return status, None
+
+async def play(target, steps, samples, think_time):
+    """Run one player's scenario, recording (route, status, seconds, body) for each request."""
+    state_id = None
+    for step in steps:
+        path = step["path"]
+        if '{state_id}' in path:
+            if state_id is None:
+                return
+            path = path.replace('{state_id}', str(state_id))
+        start = time.perf_counter()
+        try:
+            status, body = await target.request(step["method"], path, step["headers"], step["body"])
+        except Exception as error:
+            status, body = 599, {"error": str(error)}
+        samples.append((route_name(step["method"], path), status, time.perf_counter() - start, body))
+        if step["path"] == '/' and isinstance(body, dict) and 'game_id' in body:
+            state_id = body['game_id']
+        if think_time:
+            await asyncio.sleep(think_time)
+
+async def run_players(target, scenarios, players, concurrency, think_time):
+    samples = []
+    slots = asyncio.Semaphore(concurrency)
+
+    async def player(index):
+        async with slots:
+            await play(target, scenarios[index % len(scenarios)], samples, think_time)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(player(index) for index in range(players)))
+    return samples, time.perf_counter() - start
+
+def percentile(sorted_values, fraction):
+    """Nearest-rank percentile of a sorted list."""
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, max(0, round(fraction * len(sorted_values)) - 1))]
+
+def summarize(samples, duration):
+    """Build the report: throughput, and latency (in milliseconds) and errors per route."""
+    by_route = defaultdict(list)
+    for route, status, seconds, _ in samples:
+        by_route[route].append((status, seconds))
+
+    routes = {}
+    for route, results in sorted(by_route.items()):
+        latencies = sorted(seconds * 1000 for _, seconds in results)
+        errors = sum(1 for status, _ in results if status >= 400)
+        routes[route] = {
+            "requests": len(results),
+            "errors": errors,
+            "error_rate": errors / len(results),
+            "mean": sum(latencies) / len(latencies),
+            "p50": percentile(latencies, 0.50),
+            "p95": percentile(latencies, 0.95),
+            "p99": percentile(latencies, 0.99),
+            "max": latencies[-1]
+        }
+
+    errors = sum(1 for _, status, _, _ in samples if status >= 400)
+    return {
+        "duration": duration,
+        "requests": len(samples),
+        "throughput": len(samples) / duration if duration else 0.0,
+        "errors": errors,
+        "error_rate": errors / len(samples) if samples else 0.0,
+        "status_codes": dict(sorted(Counter(str(status) for _, status, _, _ in samples).items())),
+        "routes": routes,
+        "db_contention": {
+            # Commands that gave up after retrying because other commands kept changing the game
+            "conflicts": sum(1 for _, status, _, _ in samples if status == 409)
+        }
+    }
+
+def print_report(report):
+    print(f"{report['requests']} requests in {report['duration']:.2f} s: "
+          f"{report['throughput']:.1f} requests/s, {report['error_rate']:.2%} errors")
+    print(f"{'route':<20}{'requests':>9}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}")
+    for route, stats in report["routes"].items():
+        print(f"{route:<20}{stats['requests']:>9}{stats['errors']:>8}"
+              f"{stats['p50']:>10.1f}{stats['p95']:>10.1f}{stats['p99']:>10.1f}")
+    print("status codes:", report["status_codes"])
+    print("db contention:", report["db_contention"])
+    if "narrative_admission" in report:
+        admission = report["narrative_admission"]
+        print(f"narrative admission: {admission['admitted']} admitted, {admission['shed']} shed, "
+              f"longest wait {admission['longest_wait']:.2f} s")
+
+def main():
+    scenarios = sorted(name[:-5] for name in os.listdir(SCRIPTS) if name.endswith('.http'))
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--scenario', action='append', choices=scenarios,
+                        help='Scenario to play, by .http file name; repeat to mix scenarios across players '
+                             '(default: test_door_event).')
+    parser.add_argument('--players', type=int, default=1000, help='Number of players, each starting its own game.')
+    parser.add_argument('--concurrency', type=int, default=None, help='Players playing at once (default: all).')
+    parser.add_argument('--think-time', type=float, default=0.0, help='Seconds a player waits between requests.')
+    parser.add_argument('--server', choices=('asgi', 'flask'), default='asgi', help='How the game is served in this process.')
+    parser.add_argument('--url', help='Send the requests to a running server instead, e.g. http://localhost:5000.')
+    parser.add_argument('--llm-latency', type=float, default=0.5, help='Seconds the mock narrative provider takes.')
+    parser.add_argument('--output', default='load_test_results.json', help='File the JSON report is written to.')
+    args = parser.parse_args()
+
+    scenario_names = args.scenario or ['test_door_event']
+    concurrency = args.concurrency or args.players
+    sys.path.insert(0, ROOT)
+    contention = ContentionCounter()
+
+    with tempfile.TemporaryDirectory() as instance_path:
+        if args.url:
+            target = HttpTarget(concurrency, args.url)
+        else:
+            install_mock_provider(args.llm_latency)
+            logging.getLogger().addHandler(contention)
+            logging.getLogger().setLevel(logging.INFO)
+            if args.server == 'asgi':
+                target = AsgiTarget(instance_path)
+            else:
+                target = FlaskTarget(concurrency, instance_path)
+
+        samples, duration = asyncio.run(run_players(
+            target, [load_scenario(name) for name in scenario_names], args.players, concurrency, args.think_time
+        ))
+
+    report = summarize(samples, duration)
+    report["config"] = {
+        "scenarios": scenario_names,
+        "players": args.players,
+        "concurrency": concurrency,
+        "think_time": args.think_time,
+        "server": args.url or args.server,
+        "llm_latency": None if args.url else args.llm_latency
+    }
+    report["started_at"] = datetime.datetime.now(datetime.timezone.utc).isoformat()
+    if not args.url:
+        from narrative_engine.ai_generator import admission_stats
+        report["db_contention"]["conflict_retries"] = contention.retries
+        report["db_contention"]["lock_errors"] = contention.lock_errors
+        report["narrative_admission"] = admission_stats()
+
+    print_report(report)
+    with open(args.output, 'w') as file:
+        json.dump(report, file, indent=2)
+    print(f"Report written to {args.output}")
+
+if __name__ == '__main__':
+    main()
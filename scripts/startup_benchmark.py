@@ -0,0 +1,60 @@
+# scripts/startup_benchmark.py
+"""
+Measure how long a fresh worker process takes to serve its first request.
+
+Each run starts a new interpreter, imports the game, creates the app and sends one request
+through the test client against an empty database in a temporary directory. Prints the median
+of each phase in milliseconds, so changes to start-up time can be tracked:
+
+    uv run python scripts/startup_benchmark.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Runs in the child process; phases are measured from just before the game is imported
+CHILD = """
+import json, sys, time
+sys.path.insert(0, {root!r})
+start = time.perf_counter()
+import game
+imported = time.perf_counter()
+app = game.create_app(instance_path={tmp!r})
+created = time.perf_counter()
+response = app.test_client().get('/history/1')
+served = time.perf_counter()
+assert response.status_code == 404, response.status_code
+print(json.dumps({{
+    'import': (imported - start) * 1000,
+    'create_app': (created - imported) * 1000,
+    'first_request': (served - created) * 1000,
+    'time_to_first_request': (served - start) * 1000
+}}))
+"""
+
+def run_once():
+    with tempfile.TemporaryDirectory() as tmp:
+        output = subprocess.run(
+            [sys.executable, '-c', CHILD.format(root=ROOT, tmp=tmp)],
+            cwd=tmp, capture_output=True, text=True, check=True
+        ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='Number of fresh processes to start.')
+    args = parser.parse_args()
+
+    runs = [run_once() for _ in range(args.runs)]
+    for phase in runs[0]:
+        print(f"{phase:>22}: {statistics.median(run[phase] for run in runs):8.1f} ms")
+
+if __name__ == '__main__':
+    main()
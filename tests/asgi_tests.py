@@ -0,0 +1,392 @@
+import asyncio
+import json
+from unittest import mock
+import pytest
+import asgi
+import game
+from models import db
+from narrative_engine.game_state import GameState, GameEvent
+
+def narrative_for(prompt):
+    """The narrative the mock provider writes: the prompt's instruction, which names every required element."""
+    return prompt.splitlines()[-1]
+
+def narrative_for_location(location):
+    return f"Generate a detailed description of a {location} environment"
+
+@pytest.fixture
+def provider():
+    async def generate(prompt, prompt_meta, on_delta=None):
+        narrative = narrative_for(prompt)
+        if on_delta:
+            for piece in narrative.split(" "):
+                await on_delta(piece + " ")
+        return narrative
+    with mock.patch('narrative_engine.ai_generator.generate_narrative_with_params_async', new=generate), \
+         mock.patch('narrative_engine.ai_generator.generate_narrative_with_params', side_effect=lambda prompt, meta: narrative_for(prompt)):
+        yield
+
+@pytest.fixture
+def app(tmp_path, provider):
+    """This process's ASGI app, started with a database of its own."""
+    app = asgi.start({'TESTING': True, 'WEBSOCKET_CHECKPOINT_TURNS': 2}, instance_path=str(tmp_path))
+    yield app
+    asgi.server['db_executor'].shutdown(wait=True)
+    asgi.server.update(app=None, db_executor=None)
+    asgi.resident_games.clear()
+
+async def request(method, path, body=None, query=b'', headers=()):
+    """Send one HTTP request to the ASGI application; return its status, headers and JSON body."""
+    data = json.dumps(body).encode() if body is not None else b''
+    sent = []
+
+    async def receive():
+        return {'type': 'http.request', 'body': data, 'more_body': False}
+
+    async def send(message):
+        sent.append(message)
+
+    scope = {'type': 'http', 'method': method, 'path': path, 'query_string': query, 'headers': list(headers)}
+    await asgi.application(scope, receive, send)
+    start, response_body = sent
+    payload = json.loads(response_body['body']) if response_body['body'] else None
+    return start['status'], dict(start['headers']), payload
+
+def run(coroutine):
+    return asyncio.run(coroutine)
+
+async def new_game():
+    status, _, result = await request('GET', '/')
+    assert status == 200
+    return result["game_id"]
+
+class TestRoutes:
+    def test_index_creates_game(self, app):
+        async def scenario():
+            status, _, result = await request('GET', '/')
+            assert status == 200
+            assert "cave entrance" in result["intro_narrative"]
+            with app.app_context():
+                assert GameState.load(result["game_id"]).current_location == "entrance"
+        run(scenario())
+
+    def test_state_and_history(self, app):
+        async def scenario():
+            game_id = await new_game()
+            status, headers, result = await request('GET', f'/state/{game_id}')
+            assert status == 200
+            assert result["location"]["id"] == "entrance"
+            assert headers[b'etag'] == f'"{game_id}-{result["version"]}-0"'.encode()
+
+            status, _, page = await request('GET', f'/history/{game_id}', query=b'limit=1')
+            assert status == 200
+            assert [decision["turn"] for decision in page["decisions"]] == [1]
+            assert page["next_after"] == 1
+        run(scenario())
+
+    def test_commands(self, app):
+        async def scenario():
+            game_id = await new_game()
+            status, _, result = await request('POST', f'/command/{game_id}', {"command": "go forward"})
+            assert status == 200
+            assert result["new_location"] == "cave_interior"
+            # Generated once the command was saved, then appended to the game's memory
+            assert "cave_interior" in result["narrative"]
+
+            status, _, result = await request('POST', f'/commands/{game_id}', {"commands": ["take stone", "back"]})
+            assert status == 200
+            assert result["completed"] == 2
+            assert result["location"] == "entrance"
+
+            status, _, result = await request('GET', f'/move/{game_id}/forward')
+            assert (status, result["new_location"]) == (200, "cave_interior")
+
+            status, _, result = await request('POST', f'/pickup/{game_id}/stone')
+            assert (status, result["error"]) == (400, "There is no stone here to pick up")
+
+            with app.app_context():
+                game_state = GameState.load(game_id)
+                assert game_state.inventory == ["map", "stone"]
+                assert narrative_for_location("cave_interior") in " ".join(game_state.narrative_memory)
+        run(scenario())
+
+    def test_pickup(self, app):
+        async def scenario():
+            game_id = await new_game()
+            status, _, result = await request('POST', f'/pickup/{game_id}/torch')
+            assert status == 200
+            assert result["inventory"] == ["map", "torch"]
+        run(scenario())
+
+    def test_command_errors(self, app):
+        async def scenario():
+            game_id = await new_game()
+            assert (await request('POST', f'/command/{game_id}', {}))[0] == 400
+            status, _, result = await request('POST', f'/command/{game_id}', {"command": "dance wildly"})
+            assert (status, result["error"]) == (400, "I don't understand 'dance wildly'")
+            assert (await request('POST', f'/command/{game_id + 1}', {"command": "go forward"}))[0] == 404
+            assert (await request('POST', f'/commands/{game_id}', {"commands": []}))[0] == 400
+        run(scenario())
+
+    def test_metrics(self, app):
+        status, _, result = run(request('GET', '/metrics'))
+        assert status == 200
+        assert result["narrative_admission"]["active"] == 0
+
+class TestConditionalGet:
+    def test_if_none_match_gets_not_modified(self, app):
+        async def scenario():
+            game_id = await new_game()
+            _, headers, _ = await request('GET', f'/state/{game_id}')
+            etag = headers[b'etag']
+
+            status, headers, result = await request('GET', f'/state/{game_id}', headers=[(b'if-none-match', etag)])
+            assert status == 304
+            assert result is None
+            assert headers[b'etag'] == etag
+
+            # Changed by a command, so the old ETag no longer matches
+            await request('POST', f'/command/{game_id}', {"command": "go forward"})
+            status, headers, result = await request('GET', f'/state/{game_id}', headers=[(b'if-none-match', etag)])
+            assert status == 200
+            assert headers[b'etag'] != etag
+            assert result["location"]["id"] == "cave_interior"
+        run(scenario())
+
+    def test_missing_game(self, app):
+        assert run(request('GET', '/state/999'))[0] == 404
+
+class TestDispatch:
+    def test_unknown_path(self, app):
+        status, _, result = run(request('GET', '/nowhere'))
+        assert (status, result) == (404, {"error": "Not found"})
+
+    def test_wrong_method(self, app):
+        status, _, result = run(request('POST', '/state/1'))
+        assert (status, result) == (405, {"error": "Method not allowed"})
+
+    def test_invalid_json(self, app):
+        async def send_garbage():
+            sent = []
+
+            async def receive():
+                return {'type': 'http.request', 'body': b'{not json', 'more_body': False}
+
+            async def send(message):
+                sent.append(message)
+
+            await asgi.application({'type': 'http', 'method': 'POST', 'path': '/command/1'}, receive, send)
+            return sent[0]['status']
+        assert run(send_garbage()) == 400
+
+    def test_handler_error_is_internal_server_error(self, app):
+        with mock.patch('game.history_page', side_effect=RuntimeError("disk on fire")):
+            status, _, result = run(request('GET', '/history/1'))
+        assert (status, result) == (500, {"error": "Internal server error"})
+
+class WebSocketClient:
+    """A connection to /play: commands are queued to the application, its messages collected."""
+
+    def __init__(self, path):
+        self.path = path
+        self.inbox = asyncio.Queue()
+        self.outbox = asyncio.Queue()
+        self.task = None
+
+    async def connect(self):
+        self.inbox.put_nowait({'type': 'websocket.connect'})
+        self.task = asyncio.create_task(asgi.application({'type': 'websocket', 'path': self.path}, self.inbox.get, self.outbox.put))
+        return await self.outbox.get()
+
+    async def receive(self):
+        message = await self.outbox.get()
+        return json.loads(message['text']) if message['type'] == 'websocket.send' else message
+
+    async def command(self, command_text):
+        """Send a command and return its messages, up to the end of its narrative."""
+        self.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps({"command": command_text})})
+        messages = [await self.receive()]
+        if "error" not in messages[0]:
+            while messages[-1]["type"] != "narrative_end":
+                messages.append(await self.receive())
+        return messages
+
+    async def disconnect(self):
+        self.inbox.put_nowait({'type': 'websocket.disconnect'})
+        await self.task
+
+def stored_game(state_id):
+    """The game's row as written in the database, and the latest sequence of its event log."""
+    row = db.session.execute(
+        db.select(GameState.current_location, GameState.event_sequence).where(GameState.id == state_id)
+    ).one()
+    logged = db.session.execute(
+        db.select(db.func.max(GameEvent.sequence)).where(GameEvent.game_state_id == state_id)
+    ).scalar()
+    return row.current_location, row.event_sequence, logged
+
+class TestWebSocket:
+    def test_streams_narratives_and_saves_the_game_on_disconnect(self, app):
+        async def scenario():
+            game_id = await new_game()
+            client = WebSocketClient(f'/play/{game_id}')
+            assert (await client.connect())['type'] == 'websocket.accept'
+            connected = await client.receive()
+            assert (connected["type"], connected["location"]) == ("connected", "entrance")
+
+            messages = await client.command("take torch")
+            assert messages[0]["type"] == "result"
+            assert messages[0]["inventory"] == ["map", "torch"]
+            deltas = [message["delta"] for message in messages[1:-1]]
+            assert deltas and all(message["type"] == "narrative" for message in messages[1:-1])
+            assert messages[-1]["narrative"] == "".join(deltas).strip()
+            narratives = [messages[-1]["narrative"]]
+
+            for command_text in ["go forward", "examine walls"]:
+                narratives.append((await client.command(command_text))[-1]["narrative"])
+            await client.disconnect()
+            assert game_id not in asgi.resident_games
+
+            # The database holds the game as it was in memory, its narratives included
+            with app.app_context():
+                game_state = GameState.load(game_id)
+                assert game_state.current_location == "cave_interior"
+                assert game_state.inventory == ["map", "torch"]
+                assert game_state.decision_count == 3
+                assert game_state.narrative_memory[-6:] == [
+                    "You picked up the torch.", narratives[0],
+                    "You moved forward to the cave_interior.", narratives[1],
+                    "You notice strange markings on the walls.", narratives[2]
+                ]
+                location, sequence, logged = stored_game(game_id)
+                assert sequence == logged
+        run(scenario())
+
+    def test_writes_the_row_every_checkpoint_turns(self, app):
+        async def scenario():
+            game_id = await new_game()
+            client = WebSocketClient(f'/play/{game_id}')
+            await client.connect()
+            await client.receive()
+            sequence_before = (await asgi.run_db(stored_game, game_id))[1]
+
+            # One changed turn: its events are logged, the row is left for the checkpoint
+            await client.command("go forward")
+            location, sequence, logged = await asgi.run_db(stored_game, game_id)
+            assert (location, sequence) == ("entrance", sequence_before)
+            assert logged > sequence
+
+            # Turns that change nothing do not count towards the checkpoint
+            assert "error" in (await client.command("fly away"))[0]
+            assert (await asgi.run_db(stored_game, game_id))[:2] == ("entrance", sequence_before)
+
+            # The second changed turn writes the row
+            await client.command("deeper")
+            location, sequence, logged = await asgi.run_db(stored_game, game_id)
+            assert location == "treasure_room"
+            assert sequence == logged
+            await client.disconnect()
+        run(scenario())
+
+    def test_failed_turn_is_discarded(self, app):
+        execute_command = game.execute_command
+
+        def fail_after_changes(*args, **kwargs):
+            execute_command(*args, **kwargs)
+            raise RuntimeError("narrator crashed")
+
+        async def scenario():
+            game_id = await new_game()
+            client = WebSocketClient(f'/play/{game_id}')
+            await client.connect()
+            await client.receive()
+            await client.command("go forward")
+
+            with mock.patch('game.execute_command', side_effect=fail_after_changes):
+                client.inbox.put_nowait({'type': 'websocket.receive', 'text': json.dumps({"command": "take stone"})})
+                with pytest.raises(RuntimeError):
+                    await client.task
+            assert game_id not in asgi.resident_games
+
+            # The completed turn is kept, once; the failed one left nothing behind
+            with app.app_context():
+                game_state = GameState.load(game_id)
+                assert game_state.current_location == "cave_interior"
+                assert game_state.inventory == ["map"]
+                assert game_state.decision_count == 2
+                location, sequence, logged = stored_game(game_id)
+                assert sequence == logged
+
+            # The game can be played again
+            client = WebSocketClient(f'/play/{game_id}')
+            assert (await client.connect())['type'] == 'websocket.accept'
+            assert (await client.receive())["inventory"] == ["map"]
+            await client.disconnect()
+        run(scenario())
+
+    def test_second_connection_is_refused(self, app):
+        async def scenario():
+            game_id = await new_game()
+            client = WebSocketClient(f'/play/{game_id}')
+            await client.connect()
+            await client.receive()
+
+            second = WebSocketClient(f'/play/{game_id}')
+            assert await second.connect() == {'type': 'websocket.close', 'code': 4409}
+            await second.task
+            # HTTP commands are refused too
+            status, _, _ = await request('POST', f'/command/{game_id}', {"command": "go forward"})
+            assert status == 409
+
+            await client.disconnect()
+            assert (await request('POST', f'/command/{game_id}', {"command": "go forward"}))[0] == 200
+        run(scenario())
+
+    def test_missing_game_is_closed(self, app):
+        async def scenario():
+            client = WebSocketClient('/play/999')
+            assert await client.connect() == {'type': 'websocket.close', 'code': 4404}
+            await client.task
+            assert 999 not in asgi.resident_games
+        run(scenario())
+
+    def test_invalid_message_gets_error(self, app):
+        async def scenario():
+            game_id = await new_game()
+            client = WebSocketClient(f'/play/{game_id}')
+            await client.connect()
+            await client.receive()
+            client.inbox.put_nowait({'type': 'websocket.receive', 'text': 'go forward'})
+            assert await client.receive() == {"type": "error", "error": "Missing command parameter"}
+            await client.disconnect()
+        run(scenario())
+
+class TestRunDb:
+    def test_returns_result_inside_app_context(self, app):
+        from flask import current_app
+        assert run(asgi.run_db(lambda: current_app.name)) == app.name
+
+    def test_propagates_errors(self, app):
+        def fail():
+            raise ValueError("bad row")
+        with pytest.raises(ValueError, match="bad row"):
+            run(asgi.run_db(fail))
+
+class TestLifespan:
+    def test_startup_and_shutdown(self, app):
+        messages = iter([{'type': 'lifespan.startup'}, {'type': 'lifespan.shutdown'}])
+        sent = []
+
+        async def receive():
+            return next(messages)
+
+        async def send(message):
+            sent.append(message['type'])
+
+        run(asgi.application({'type': 'lifespan'}, receive, send))
+
+        assert sent == ['lifespan.startup.complete', 'lifespan.shutdown.complete']
+        assert app.extensions['game_services']['ready']
+        # The database threads were stopped
+        with pytest.raises(RuntimeError):
+            asgi.server['db_executor'].submit(lambda: None)
@@ -0,0 +1,136 @@
+# tests/benchmarks/conftest.py
+"""
+Microbenchmarks of the engine's hot paths, skipped unless RUN_BENCHMARKS is set:
+
+    RUN_BENCHMARKS=1 uv run pytest tests/benchmarks -q
+    RUN_BENCHMARKS=full uv run pytest tests/benchmarks -q   # adds the largest sizes, e.g. 1M-node graphs
+
+Each benchmark's best time is compared with its entry in baseline.json. Baselines are stored relative
+to a calibration workload timed on the same machine, so they carry over to faster or slower machines.
+A benchmark more than BENCHMARK_TOLERANCE (default 2) times slower than its baseline fails: enough
+to catch a change in complexity through the timing noise of a shared machine.
+With UPDATE_BENCHMARK_BASELINE=1 the measured times are written to baseline.json instead.
+"""
+
+import gc
+import json
+import os
+import time
+import pytest
+
+BASELINE_PATH = os.path.join(os.path.dirname(__file__), 'baseline.json')
+
+RUN_BENCHMARKS = os.environ.get('RUN_BENCHMARKS', '').lower()
+FULL_SIZES = RUN_BENCHMARKS == 'full'
+UPDATE_BASELINE = os.environ.get('UPDATE_BENCHMARK_BASELINE', '').lower() in ('1', 'true')
+TOLERANCE = float(os.environ.get('BENCHMARK_TOLERANCE', 2.0))
+
+# Timer noise allowed on top of the tolerance, in seconds, for benchmarks taking microseconds
+NOISE_FLOOR = 2e-6
+
+# Each benchmark runs for at least this many seconds and rounds, and its best round counts
+MIN_TIME = 0.5
+MIN_ROUNDS = 5
+MAX_ROUNDS = 1000
+
+# Benchmarks measured in this session, by name, relative to the calibration workload
+_measured = {}
+
+def pytest_collection_modifyitems(config, items):
+    if RUN_BENCHMARKS:
+        return
+    skip = pytest.mark.skip(reason="Benchmarks run with RUN_BENCHMARKS=1")
+    for item in items:
+        if 'benchmark' in item.fixturenames:
+            item.add_marker(skip)
+
+def pytest_sessionfinish(session, exitstatus):
+    if not (UPDATE_BASELINE and _measured):
+        return
+    baseline = load_baseline()
+    baseline['benchmarks'].update(_measured)
+    baseline['benchmarks'] = dict(sorted(baseline['benchmarks'].items()))
+    with open(BASELINE_PATH, 'w') as file:
+        json.dump(baseline, file, indent=2)
+        file.write('\n')
+
+def load_baseline():
+    if not os.path.exists(BASELINE_PATH):
+        return {'benchmarks': {}}
+    with open(BASELINE_PATH) as file:
+        return json.load(file)
+
+def measure(function, setup=None):
+    """
+    Return the best time of one call to the function, in seconds.
+    Without setup, fast functions are called several times per round so a round outlasts the timer's
+    resolution; with setup, it is called before every call, untimed, and its result passed as arguments.
+    """
+    # As timeit does, keep collections of the objects other benchmarks left alive out of the timings
+    gc.collect()
+    gc_was_enabled = gc.isenabled()
+    gc.disable()
+    try:
+        return _best_time(function, setup)
+    finally:
+        if gc_was_enabled:
+            gc.enable()
+
+def _best_time(function, setup):
+    number = 1
+    if setup is None:
+        while True:
+            start = time.perf_counter()
+            for _ in range(number):
+                function()
+            if time.perf_counter() - start >= 0.001 or number >= 1 << 20:
+                break
+            number *= 2
+    best = float('inf')
+    total = 0.0
+    rounds = 0
+    while rounds < MIN_ROUNDS or (total < MIN_TIME and rounds < MAX_ROUNDS):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        for _ in range(number):
+            function(*args)
+        elapsed = time.perf_counter() - start
+        best = min(best, elapsed / number)
+        total += elapsed
+        rounds += 1
+    return best
+
+def _calibration_workload():
+    # Dict building, string formatting, sorting and JSON: the kind of work the engine does
+    data = {f"node_{index}": {"exits": {"north": f"node_{index + 1}"}, "items": ["key"]} for index in range(20000)}
+    json.loads(json.dumps(data))
+    sorted(data, reverse=True)
+
+@pytest.fixture(scope='session')
+def calibration():
+    """The best time of the calibration workload on this machine."""
+    return measure(_calibration_workload)
+
+@pytest.fixture
+def benchmark(request, calibration):
+    """
+    Measure a function under the test's name and check it against the baseline, e.g.
+    benchmark(lambda: graph_to_json(graph)), or benchmark(function, setup) to prepare each call.
+    """
+    def run(function, setup=None):
+        name = request.node.name
+        best = measure(function, setup)
+        _measured[name] = {'relative': best / calibration, 'seconds': best}
+
+        entry = load_baseline()['benchmarks'].get(name)
+        if entry is None or UPDATE_BASELINE:
+            return best
+        expected = entry['relative'] * calibration
+        limit = expected * entry.get('tolerance', TOLERANCE) + NOISE_FLOOR
+        assert best <= limit, (
+            f"{name} took {best * 1e3:.4f} ms, more than {limit * 1e3:.4f} ms "
+            f"(baseline {expected * 1e3:.4f} ms on this machine)"
+        )
+        return best
+
+    return run
@@ -0,0 +1,143 @@
+from difflib import get_close_matches
+from types import SimpleNamespace
+import pytest
+from conftest import FULL_SIZES, measure
+from narrative_engine.ai_generator import validate_narrative
+from narrative_engine.commands import parse_command
+from narrative_engine.events import Event, EventHandler
+from narrative_engine.graph import NarrativeGraph, Node, load_graph_from_json, graph_to_json
+from narrative_engine.narrative_memory import NarrativeMemory
+from narrative_engine.vocabulary import VocabularyIndex
+
+GRAPH_SIZES = [10, 1000, 100000] + ([1000000] if FULL_SIZES else [])
+VOCABULARY_SIZES = [10, 100, 1000] + ([10000] if FULL_SIZES else [])
+# Words of narrative text and required elements
+NARRATIVE_SIZES = [(100, 3), (1000, 10), (10000, 50)] + ([(100000, 200)] if FULL_SIZES else [])
+MEMORY_SIZES = [10, 1000, 100000] + ([1000000] if FULL_SIZES else [])
+EVENT_COUNTS = [10, 1000, 100000] + ([1000000] if FULL_SIZES else [])
+
+def build_graph(size):
+    """A chain of rooms, each with exits both ways, an item and an action, like an imported world."""
+    graph = NarrativeGraph()
+    for index in range(size):
+        exits = {}
+        if index > 0:
+            exits["back"] = f"room_{index - 1}"
+        if index < size - 1:
+            exits["forward"] = f"room_{index + 1}"
+        graph.add_node(Node(
+            f"room_{index}",
+            f"Room {index} of the cave, its walls carved with old runes.",
+            exits=exits,
+            items=[f"stone_{index}"],
+            actions={"examine runes": f"The runes of room {index} glow faintly."}
+        ))
+    return graph
+
+@pytest.fixture(scope='module', params=GRAPH_SIZES)
+def graph_size(request):
+    return request.param
+
+@pytest.fixture(scope='module')
+def graph(graph_size):
+    return build_graph(graph_size)
+
+@pytest.fixture(scope='module')
+def graph_json(graph):
+    return graph_to_json(graph)
+
+class TestGraphBenchmarks:
+    def test_graph_to_json(self, benchmark, graph):
+        benchmark(lambda: graph_to_json(graph))
+
+    def test_load_graph_from_json(self, benchmark, graph_json):
+        benchmark(lambda: load_graph_from_json(graph_json))
+
+    def test_remove_node(self, benchmark, graph, graph_size):
+        middle = f"room_{graph_size // 2}"
+        removed = graph.nodes[middle]
+        neighbour = graph.nodes[f"room_{graph_size // 2 - 1}"] if graph_size > 1 else None
+
+        def restore():
+            # Put the node and the exit leading to it back, untimed
+            if middle not in graph.nodes:
+                graph.add_node(removed)
+                if neighbour is not None:
+                    neighbour.exits["forward"] = middle
+            return (middle,)
+
+        benchmark(graph.remove_node, restore)
+        restore()
+
+class TestCommandBenchmarks:
+    @pytest.mark.parametrize('vocabulary_size', VOCABULARY_SIZES)
+    def test_parse_command(self, benchmark, vocabulary_size):
+        node = Node(
+            "vault",
+            "A vault lined with shelves.",
+            exits={f"passage{index}": "vault" for index in range(vocabulary_size)},
+            items=[f"relic{index}" for index in range(vocabulary_size)],
+            actions={f"inspect shelf{index}": "Dusty." for index in range(vocabulary_size)}
+        )
+        inventory = [f"tool{index}" for index in range(vocabulary_size)]
+        target = vocabulary_size // 2
+        # Exact, abbreviated and misspelled commands, and one that is not understood
+        commands = [
+            f"go passage{target}", f"take relic{target}", f"inspect shelf{target}",
+            f"use tool{target} on relic{target}", "invent", "tkae relci1", "dance wildly"
+        ]
+        parse_command(commands[0], node, inventory)
+        benchmark(lambda: [parse_command(command, node, inventory) for command in commands])
+
+    @pytest.mark.parametrize('vocabulary_size', VOCABULARY_SIZES)
+    def test_vocabulary_match(self, benchmark, vocabulary_size):
+        terms = [f"relic{index}" for index in range(vocabulary_size)]
+        index = VocabularyIndex(terms)
+        target = vocabulary_size // 2
+        # Misspelled, and not understood
+        words = [f"rleic{target}", f"relc{target}", "dance"]
+
+        difflib_time = measure(lambda: [get_close_matches(word, terms, n=1, cutoff=0.7) for word in words])
+        index_time = benchmark(lambda: [index.match(word) for word in words])
+        # The difflib scan this replaced grows with the vocabulary, the index's lookups do not
+        if vocabulary_size >= 100:
+            assert index_time < difflib_time
+
+class TestNarrativeBenchmarks:
+    @pytest.mark.parametrize('words,elements', NARRATIVE_SIZES)
+    def test_validate_narrative(self, benchmark, words, elements):
+        required = [f"element{index}" for index in range(elements)]
+        # The elements are spread through the text
+        text_words = ["darkness"] * words
+        for index, element in enumerate(required):
+            text_words[index * (words // elements)] = element
+        text = " ".join(text_words)
+        assert validate_narrative(text, ", ".join(required))
+        benchmark(lambda: validate_narrative(text, ", ".join(required)))
+
+    @pytest.mark.parametrize('length', MEMORY_SIZES)
+    def test_memory_get_log(self, benchmark, length):
+        memory = NarrativeMemory()
+        for index in range(length):
+            memory.add_event(f"You moved forward to room_{index}.")
+        benchmark(memory.get_log)
+
+class TestEventBenchmarks:
+    @pytest.mark.parametrize('count', EVENT_COUNTS)
+    def test_process_events(self, benchmark, count):
+        # Ten events per location, all waiting for the key; the player is in one of the locations
+        handler = EventHandler()
+        triggered = []
+        for index in range(count):
+            handler.register_event(Event(
+                f"event_{index}",
+                lambda state: "key" in state.inventory,
+                lambda state, index=index: triggered.append(index),
+                location=f"room_{index // 10}"
+            ))
+        game_state = SimpleNamespace(
+            current_location="room_0", player_progress="Level 1", inventory=["key"], flags={},
+            narrative_graph={}, narrative_memory=[]
+        )
+        assert len(handler.process_events(game_state)) == min(count, 10)
+        benchmark(lambda: handler.process_events(game_state))
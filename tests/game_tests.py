@@ -0,0 +1,393 @@
+import os
+import subprocess
+import sys
+import threading
+import time
+from unittest import mock
+import pytest
+from sqlalchemy import event
+from sqlalchemy.orm.exc import StaleDataError
+from game import (
+    create_app, create_game, run_game_operation, command_operation, batch_operation, hot_session_store, MAX_BATCH_COMMANDS
+)
+from models import db
+from narrative_engine.game_state import GameState, DECISION_PAGE_SIZE
+from narrative_engine.narrative_memory import NarrativeMemory
+from narrative_engine.scheduler import pending_events, TORCH_BURN_TURNS
+from narrative_engine.ai_generator import current_admission
+
+# Seconds the mock provider takes per narrative; longer than SQLite waits for a lock
+PROVIDER_DELAY = 1.0
+LOCK_TIMEOUT = 0.2
+
+@pytest.fixture
+def app(tmp_path):
+    """The game app with a file database that gives up quickly on a locked database."""
+    app = create_app({
+        'TESTING': True,
+        'SQLALCHEMY_ENGINE_OPTIONS': {'connect_args': {'timeout': LOCK_TIMEOUT}}
+    }, instance_path=str(tmp_path))
+    with app.app_context():
+        yield app
+
+@pytest.fixture
+def slow_provider():
+    def generate(prompt, prompt_meta):
+        time.sleep(PROVIDER_DELAY)
+        return "A slow narrative of damp stone."
+    with mock.patch('narrative_engine.ai_generator.generate_narrative_with_params', side_effect=generate):
+        yield
+
+@pytest.fixture
+def jobs_app(tmp_path):
+    """The game app with narratives generated by background jobs."""
+    app = create_app({'TESTING': True, 'NARRATIVE_JOBS_ENABLED': True, 'NARRATIVE_JOB_WORKERS': 1}, instance_path=str(tmp_path))
+    with app.app_context():
+        yield app
+        app.extensions['game_services']['narrative_jobs'].close()
+
+@pytest.fixture
+def provider():
+    """A provider answering at once with a narrative naming the prompt's required elements."""
+    generate = lambda prompt, meta: prompt.splitlines()[-1]
+    # Narrative jobs call the provider through their own import
+    with mock.patch('narrative_engine.ai_generator.generate_narrative_with_params', side_effect=generate) as generated, \
+         mock.patch('narrative_engine.jobs.generate_narrative_with_params', side_effect=generate):
+        yield generated
+
+def new_game(app):
+    return app.test_client().get('/').get_json()["game_id"]
+
+class TestCommands:
+    def test_concurrent_games_do_not_wait_on_each_others_narratives(self, app, slow_provider):
+        game_ids = [new_game(app), new_game(app)]
+        responses = {}
+
+        def play(game_id):
+            responses[game_id] = app.test_client().post(f'/command/{game_id}', json={"command": "go forward"})
+
+        threads = [threading.Thread(target=play, args=(game_id,)) for game_id in game_ids]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        # Neither command held the database's write lock while its narrative was generated
+        for game_id in game_ids:
+            assert responses[game_id].status_code == 200, responses[game_id].get_json()
+            assert responses[game_id].get_json()["new_location"] == "cave_interior"
+            assert "A slow narrative of damp stone." in GameState.load(game_id).narrative_memory
+
+    def test_command_updates_the_row_once(self, app, provider):
+        game_id = new_game(app)
+        statements = []
+        record = lambda conn, cursor, statement, *args: statements.append(statement)
+        event.listen(db.engine, 'before_cursor_execute', record)
+        try:
+            response = app.test_client().post(f'/command/{game_id}', json={"command": "go forward"})
+        finally:
+            event.remove(db.engine, 'before_cursor_execute', record)
+
+        assert response.status_code == 200
+        # The move, its decision and the narrative memory are written in one update, with their events in one insert
+        assert sum(statement.startswith("UPDATE game_state") for statement in statements) == 1
+        assert sum(statement.startswith("INSERT INTO game_event") for statement in statements) == 1
+
+    def test_retried_command_reuses_its_narrative(self, app, provider):
+        game_id = new_game(app)
+        provider.reset_mock()
+        operation = command_operation(command_text="go forward")
+        attempts = []
+
+        def conflicting(game_state):
+            result = operation(game_state)
+            attempts.append(result)
+            if len(attempts) == 1:
+                raise StaleDataError("changed by another command")
+            return result
+
+        result, status = run_game_operation(game_id, conflicting)
+
+        assert status == 200 and len(attempts) == 2
+        assert provider.call_count == 1
+        assert result["narrative"] == attempts[0][0]["narrative"]
+        assert GameState.load(game_id).narrative_memory.count(result["narrative"]) == 1
+
+class TestBatchCommands:
+    def test_stops_at_first_failed_command(self, app, provider):
+        game_id = new_game(app)
+        response = app.test_client().post(f'/commands/{game_id}', json={"commands": ["go forward", "dance wildly", "deeper"]})
+
+        assert response.status_code == 400
+        result = response.get_json()
+        assert result["completed"] == 1
+        assert [entry["command"] for entry in result["results"]] == ["go forward", "dance wildly"]
+        assert result["results"][1]["error"] == "I don't understand 'dance wildly'"
+        # The command before the failed one was kept
+        assert GameState.load(game_id).current_location == "cave_interior"
+
+    def test_narrative_modes(self, app, provider):
+        client = app.test_client()
+        commands = ["take torch", "go forward"]
+
+        result = client.post(f'/commands/{new_game(app)}', json={"commands": commands}).get_json()
+        assert "cave_interior" in result["narrative"]
+        assert not any("narrative" in entry for entry in result["results"])
+
+        result = client.post(f'/commands/{new_game(app)}', json={"commands": commands, "narrative": "each"}).get_json()
+        assert "narrative" not in result
+        assert "torch" in result["results"][0]["narrative"]
+        assert "cave_interior" in result["results"][1]["narrative"]
+
+        result = client.post(f'/commands/{new_game(app)}', json={"commands": commands, "narrative": "none"}).get_json()
+        assert "narrative" not in result
+        assert not any("narrative" in entry for entry in result["results"])
+        assert (result["location"], result["inventory"]) == ("cave_interior", ["map", "torch"])
+
+    def test_retried_batch_reuses_its_narratives(self, app, provider):
+        game_id = new_game(app)
+        provider.reset_mock()
+        operation = batch_operation(["take torch", "go forward", "go back"], "each")
+        attempts = []
+
+        def conflicting(game_state):
+            attempts.append(operation(game_state))
+            if len(attempts) == 1:
+                raise StaleDataError("changed by another command")
+            return attempts[-1]
+
+        result, status = run_game_operation(game_id, conflicting)
+
+        assert status == 200 and len(attempts) == 2
+        assert provider.call_count == 3
+        memory = GameState.load(game_id).narrative_memory
+        assert all(memory.count(entry["narrative"]) == 1 for entry in result["results"])
+
+    def test_commits_once(self, app, provider):
+        game_id = new_game(app)
+        commits = []
+        record = lambda connection: commits.append(connection)
+        event.listen(db.engine, 'commit', record)
+        try:
+            response = app.test_client().post(f'/commands/{game_id}', json={"commands": ["take torch", "go forward", "deeper", "take key"]})
+        finally:
+            event.remove(db.engine, 'commit', record)
+
+        assert response.status_code == 200
+        assert response.get_json()["completed"] == 4
+        assert len(commits) == 1
+        game_state = GameState.load(game_id)
+        assert (game_state.current_location, game_state.inventory) == ("treasure_room", ["map", "torch", "key"])
+
+    def test_rejects_invalid_requests(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+        too_many = ["go forward", "back"] * (MAX_BATCH_COMMANDS // 2) + ["go forward"]
+
+        for body in [{}, {"commands": []}, {"commands": "go forward"}, {"commands": too_many},
+                     {"commands": ["go forward"], "narrative": "some"}]:
+            assert client.post(f'/commands/{game_id}', json=body).status_code == 400
+        assert GameState.load(game_id).current_location == "entrance"
+
+        # The cap itself is accepted
+        response = client.post(f'/commands/{game_id}', json={"commands": too_many[:-1], "narrative": "none"})
+        assert response.status_code == 200
+        assert response.get_json()["completed"] == MAX_BATCH_COMMANDS
+
+class TestStateCaching:
+    def test_first_get_returns_etag(self, app, provider):
+        game_id = new_game(app)
+        response = app.test_client().get(f'/state/{game_id}')
+
+        assert response.status_code == 200
+        assert response.headers["ETag"] == f'"{game_id}-{response.get_json()["version"]}-0"'
+        assert "no-cache" in response.headers["Cache-Control"]
+
+    def test_if_none_match_gets_not_modified(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+        etag = client.get(f'/state/{game_id}').headers["ETag"]
+
+        response = client.get(f'/state/{game_id}', headers={"If-None-Match": etag})
+        assert response.status_code == 304
+        assert response.data == b''
+        assert response.headers["ETag"] == etag
+
+    def test_etag_changes_after_command(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+        etag = client.get(f'/state/{game_id}').headers["ETag"]
+
+        client.post(f'/command/{game_id}', json={"command": "go forward"})
+        response = client.get(f'/state/{game_id}', headers={"If-None-Match": etag})
+        assert response.status_code == 200
+        assert response.headers["ETag"] != etag
+        assert response.get_json()["location"]["id"] == "cave_interior"
+
+    def test_cached_body_is_served_without_loading_the_game(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+        first = client.get(f'/state/{game_id}')
+
+        with mock.patch.object(GameState, 'load', side_effect=AssertionError("the game was loaded")), \
+             mock.patch('narrative_engine.ai_generator.generate_narrative_with_params') as generate:
+            second = client.get(f'/state/{game_id}')
+            generate.assert_not_called()
+
+        assert second.status_code == 200
+        assert second.get_json() == first.get_json()
+        assert second.headers["ETag"] == first.headers["ETag"]
+
+class TestNarrativeJobs:
+    def test_command_is_accepted_and_its_narrative_remembered(self, jobs_app, provider):
+        client = jobs_app.test_client()
+        response = client.get('/')
+        game_id = response.get_json()["game_id"]
+        client.get(f'/narrative/{response.get_json()["intro_narrative_job"]}?wait=5')
+
+        response = client.post(f'/command/{game_id}', json={"command": "go forward"})
+        assert response.status_code == 202
+        result = response.get_json()
+        assert "narrative" not in result
+        assert result["new_location"] == "cave_interior"
+
+        job_id = result["narrative_job"]
+        response = client.get(f'/narrative/{job_id}?wait=5')
+        assert response.status_code == 200
+        job = response.get_json()
+        assert (job["status"], job["job_id"]) == ("done", job_id)
+        assert "cave_interior" in job["narrative"]
+        # Appended to the game's memory before the job was reported done
+        assert GameState.load(game_id).narrative_memory[-1] == job["narrative"]
+
+    def test_pending_job(self, jobs_app):
+        release = threading.Event()
+        with mock.patch('narrative_engine.jobs.generate_narrative_with_params',
+                        side_effect=lambda prompt, meta: release.wait(5) and prompt.splitlines()[-1]):
+            response = jobs_app.test_client().get('/')
+            job_id = response.get_json()["intro_narrative_job"]
+
+            response = jobs_app.test_client().get(f'/narrative/{job_id}')
+            assert response.status_code == 202
+            assert response.get_json() == {"status": "pending", "job_id": job_id}
+            release.set()
+            assert jobs_app.test_client().get(f'/narrative/{job_id}?wait=5').status_code == 200
+
+    def test_unknown_job(self, jobs_app):
+        response = jobs_app.test_client().get('/narrative/unknown')
+        assert response.status_code == 404
+        assert response.get_json() == {"error": "Narrative job not found"}
+
+    def test_jobs_disabled(self, app):
+        response = app.test_client().get('/narrative/unknown')
+        assert response.status_code == 404
+        assert response.get_json() == {"error": "Narrative jobs are disabled"}
+
+class TestHistory:
+    def test_limit_is_kept_within_a_page(self, app):
+        game_id = create_game(NarrativeMemory(), "The cave awaits.")["game_id"]
+        client = app.test_client()
+
+        for limit in [0, -1]:
+            response = client.get(f'/history/{game_id}?limit={limit}')
+            assert response.status_code == 200
+            page = response.get_json()
+            assert [decision["turn"] for decision in page["decisions"]] == [1]
+            assert page["next_after"] == 1
+
+        response = client.get(f'/history/{game_id}?limit={DECISION_PAGE_SIZE + 1}')
+        assert response.get_json()["next_after"] is None
+
+class TestUseCommand:
+    def test_use_sets_the_flag_events_wait_for(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+        client.post(f'/command/{game_id}', json={"command": "take torch"})
+
+        response = client.post(f'/command/{game_id}', json={"command": "use torch"})
+        assert response.status_code == 200, response.get_json()
+        assert response.get_json()["message"] == "You used the torch"
+        assert GameState.load(game_id).flags.get("used_torch") is True
+
+    def test_use_needs_the_item_and_the_target(self, app, provider):
+        game_id = new_game(app)
+        client = app.test_client()
+
+        response = client.post(f'/command/{game_id}', json={"command": "use key on door"})
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "You don't have the key"
+
+        client.post(f'/command/{game_id}', json={"command": "take torch"})
+        response = client.post(f'/command/{game_id}', json={"command": "use torch on chest"})
+        assert response.status_code == 400
+        assert response.get_json()["error"] == "There is no chest here"
+
+class TestTorchExample:
+    def test_picking_up_the_torch_lights_nothing_by_default(self, app, provider):
+        game_id = new_game(app)
+
+        response = app.test_client().post(f'/command/{game_id}', json={"command": "take torch"})
+        assert "triggered_events" not in response.get_json()
+        game_state = GameState.load(game_id)
+        assert "torch_lit" not in game_state.flags
+        assert pending_events(game_state) == []
+
+    def test_configured_torch_burns_out(self, app, provider):
+        app.config['TORCH_EXAMPLE_ENABLED'] = True
+        game_id = new_game(app)
+        client = app.test_client()
+
+        response = client.post(f'/command/{game_id}', json={"command": "take torch"})
+        assert response.get_json()["triggered_events"] == ["Light Torch"]
+        game_state = GameState.load(game_id)
+        assert pending_events(game_state) == [(game_state.decision_count + TORCH_BURN_TURNS, 'torch_burns_out')]
+
+        for turn in range(TORCH_BURN_TURNS):
+            response = client.post(f'/command/{game_id}', json={"command": "go forward" if turn % 2 == 0 else "go back"})
+        assert response.get_json()["triggered_events"] == ["torch_burns_out"]
+        assert "burnt torch" in GameState.load(game_id).inventory
+
+class TestAppIsolation:
+    def test_creating_the_app_imports_no_sdk_and_starts_nothing(self, tmp_path):
+        instance = tmp_path / "instance"
+        script = (
+            "import sys, game\n"
+            f"app = game.create_app({{'TESTING': True}}, instance_path={str(instance)!r})\n"
+            "assert 'openai' not in sys.modules and 'redis' not in sys.modules\n"
+            "assert 'game_services' not in app.extensions\n"
+        )
+        root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        completed = subprocess.run([sys.executable, "-c", script], cwd=root, capture_output=True, text=True)
+
+        assert completed.returncode == 0, completed.stderr
+        # The database is only created by the first request
+        assert not instance.exists()
+
+    def test_services_start_on_the_first_request(self, tmp_path):
+        app = create_app({'TESTING': True}, instance_path=str(tmp_path / "instance"))
+        assert 'game_services' not in app.extensions
+
+        app.test_client().get('/metrics')
+
+        assert app.extensions['game_services']['ready']
+        assert (tmp_path / "instance" / "game_state.db").exists()
+
+    def test_apps_do_not_share_services(self, tmp_path):
+        apps = [
+            create_app({
+                'TESTING': True, 'HOT_SESSIONS_ENABLED': True, 'HOT_SESSION_FLUSH_INTERVAL': 3600,
+                'MAX_CONCURRENT_GENERATIONS': limit
+            }, instance_path=str(tmp_path / f"instance_{limit}"))
+            for limit in (1, 2)
+        ]
+        stores, controllers = [], []
+        for app in apps:
+            with app.app_context():
+                stores.append(hot_session_store())
+                controllers.append(current_admission())
+            assert app.test_client().get('/metrics').get_json()["narrative_admission"]["max_concurrent"] == len(stores)
+        for app in apps:
+            app.extensions['game_services']['hot_store'].close()
+
+        assert stores[0] is not stores[1]
+        assert controllers[0] is not controllers[1]
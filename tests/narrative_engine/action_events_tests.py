@@ -0,0 +1,132 @@
+import json
+import pytest
+from flask import Flask
+from sqlalchemy import event, text
+from unittest.mock import patch
+from narrative_engine.game_state import GameState, db, init_app
+from narrative_engine import world
+from narrative_engine import action_events
+from narrative_engine.action_events import ActionEventCache, compile_action
+from models.location import Location
+from models.action import Action
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app with a vault that opens with a key."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        world.init_app(app)
+        action_events.init_app(app)
+        hall = Location(name="hallway", description="A long hallway.")
+        vault = Location(name="vault", description="A sealed vault.")
+        db.session.add_all([hall, vault])
+        db.session.flush()
+        db.session.add(Action(
+            name="Vault Opens", description="The vault door swings open.", location_id=hall.id,
+            requires_items=json.dumps(["key"]), grants_items=json.dumps(["gold"]),
+            sets_flags=json.dumps({"vault_open": True})
+        ))
+        db.session.commit()
+        yield app
+
+@pytest.fixture
+def state(app):
+    state = GameState("beginning", "hallway", narrative_memory=[])
+    state.save()
+    return state
+
+class TestCompileAction:
+    def test_condition_requires_items_and_flags(self, app, state):
+        compiled = compile_action("Lever", "hallway", None, None, '["key"]', '{"power": true}', None, '{"lever_pulled": true}')
+
+        assert compiled.location == "hallway"
+        assert compiled.items == ("key",)
+        assert compiled.flags == ("power",)
+        assert not compiled.condition(state)
+        state.add_item("key")
+        assert not compiled.condition(state)
+        state.set_flag("power")
+        assert compiled.condition(state)
+
+    def test_action_applies_effects_once(self, app, state):
+        compiled = compile_action("Trapdoor", "hallway", "You fall.", "vault", None, None, '["bruise"]', None)
+
+        assert compiled.check_and_execute(state)
+        assert state.current_location == "vault"
+        assert state.inventory == ["bruise"]
+        assert state.narrative_memory == ["You fall."]
+        assert not compiled.condition(state)
+
+class TestActionEventCache:
+    def test_compiled_events_trigger(self, app, state):
+        cache = ActionEventCache()
+        assert cache.process_events(state) == []
+
+        state.add_item("key")
+        assert cache.potential_events(state) == ["Vault Opens"]
+        assert cache.process_events(state) == ["Vault Opens"]
+
+        state = GameState.load(state.id)
+        assert state.inventory == ["key", "gold"]
+        assert state.flags == {"vault_open": True}
+        assert cache.process_events(state) == []
+
+    def test_compiled_once_and_reloaded_on_change(self, app, state):
+        cache = ActionEventCache()
+        with patch('narrative_engine.action_events.load_action_events', wraps=action_events.load_action_events) as load:
+            cache.process_events(state)
+            cache.process_events(state)
+            assert load.call_count == 1
+
+            hall = world.get_location("hallway")
+            db.session.add(Action(name="Echo", description="Your voice echoes.", location_id=hall.id, sets_flags=json.dumps({"echoed": True})))
+            db.session.commit()
+
+            assert cache.potential_events(state) == ["Echo"]
+            assert load.call_count == 2
+
+    def test_reloaded_after_writes_outside_the_orm(self, app, state):
+        cache = ActionEventCache()
+        version = action_events.current_version()
+        cache.process_events(state)
+
+        # e.g. another process, or raw SQL run against the database
+        with db.engine.begin() as connection:
+            hall_id = connection.execute(text("SELECT id FROM locations WHERE name = 'hallway'")).scalar()
+            connection.execute(text(
+                "INSERT INTO actions (name, description, location_id, sets_flags) "
+                "VALUES ('Draft', 'A cold draft.', :hall_id, '{\"drafty\": true}')"
+            ), {"hall_id": hall_id})
+
+        # Seen from the next request, which reads the version again
+        assert action_events.current_version() == version
+        with app.app_context():
+            assert action_events.current_version() > version
+            assert cache.potential_events(state) == ["Draft"]
+
+    def test_version_read_once_per_request(self, app, state):
+        cache = ActionEventCache()
+        with app.app_context():
+            statements = []
+            listener = lambda *args: statements.append(args[2])
+            event.listen(db.engine, 'before_cursor_execute', listener)
+            try:
+                cache.process_events(state)
+                cache.potential_events(state)
+                action_events.current_version()
+            finally:
+                event.remove(db.engine, 'before_cursor_execute', listener)
+        assert sum('action_version' in statement for statement in statements) == 1
+
+    def test_actions_without_effects_are_not_compiled(self, app, state):
+        hall = world.get_location("hallway")
+        db.session.add(Action(name="examine walls", description="Strange markings.", location_id=hall.id))
+        db.session.commit()
+
+        assert [compiled.name for compiled in action_events.load_action_events()] == ["Vault Opens"]
+        assert compile_action("Look", "hallway", "You look around.", None, None, None, "[]", "{}") is None
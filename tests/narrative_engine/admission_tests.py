@@ -0,0 +1,122 @@
+import asyncio
+import threading
+import time
+from narrative_engine.admission import TokenBucket, AdmissionController, current_game, narrating_for
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+class TestTokenBucket:
+    def test_allows_burst_then_rate(self):
+        clock = FakeClock()
+        bucket = TokenBucket(rate=2, burst=3, clock=clock)
+
+        assert [bucket.take() for _ in range(4)] == [True, True, True, False]
+        assert bucket.wait_time() == 0.5
+
+        clock.now += 0.5
+        assert bucket.take()
+        assert not bucket.take()
+
+    def test_unlimited(self):
+        bucket = TokenBucket()
+        assert all(bucket.take() for _ in range(1000))
+        assert bucket.wait_time() == 0
+
+class TestAdmissionController:
+    def test_admits_up_to_max_concurrent(self):
+        controller = AdmissionController(max_concurrent=1, max_wait=0.05)
+        with controller.admit("a") as first:
+            with controller.admit("b") as second:
+                assert first
+                # Waited max_wait for the only slot, then shed
+                assert not second
+        with controller.admit("b") as third:
+            assert third
+
+        stats = controller.stats()
+        assert (stats["admitted"], stats["shed"], stats["active"], stats["queued"]) == (2, 1, 0, 0)
+
+    def test_sheds_when_game_queue_is_full(self):
+        controller = AdmissionController(max_concurrent=1, max_queue_per_game=1, max_wait=1)
+        results = []
+
+        def wait():
+            with controller.admit("a") as admitted:
+                results.append(admitted)
+
+        with controller.admit("a"):
+            waiting = threading.Thread(target=wait)
+            waiting.start()
+            while controller.stats()["queued"] == 0:
+                time.sleep(0.001)
+            start = time.monotonic()
+            with controller.admit("a") as admitted:
+                # Shed at once, without waiting
+                assert not admitted
+                assert time.monotonic() - start < 0.5
+        waiting.join()
+        assert results == [True]
+
+    def test_sheds_when_queues_are_full(self):
+        controller = AdmissionController(max_concurrent=1, max_queue=0)
+        with controller.admit("a"):
+            with controller.admit("b") as admitted:
+                assert not admitted
+
+    def test_games_are_served_round_robin(self):
+        controller = AdmissionController(max_concurrent=1, max_queue_per_game=10)
+        order = []
+
+        async def request(game, started):
+            with narrating_for(game):
+                started.set()
+                async with controller.admit_async(current_game.get()) as admitted:
+                    assert admitted
+                    order.append(game)
+
+        async def main():
+            async with controller.admit_async("busy"):
+                for game in ["a", "a", "a", "b", "c"]:
+                    started = asyncio.Event()
+                    asyncio.get_running_loop().create_task(request(game, started))
+                    await started.wait()
+                    await asyncio.sleep(0)
+                assert controller.stats()["queued"] == 5
+                assert controller.stats()["queued_games"] == 3
+            while len(order) < 5:
+                await asyncio.sleep(0.001)
+
+        asyncio.run(main())
+        assert order == ["a", "b", "c", "a", "a"]
+
+    def test_rate_limits_call_starts(self):
+        controller = AdmissionController(rate=50, burst=1)
+        start = time.monotonic()
+        for _ in range(3):
+            with controller.admit() as admitted:
+                assert admitted
+        # The second and third calls waited for a token each
+        assert time.monotonic() - start >= 0.035
+        assert controller.stats()["longest_wait"] > 0
+
+    def test_cancelled_waiter_leaves_queue(self):
+        controller = AdmissionController(max_concurrent=1)
+
+        async def main():
+            async with controller.admit_async("a"):
+                async def wait():
+                    async with controller.admit_async("b"):
+                        pass
+                task = asyncio.get_running_loop().create_task(wait())
+                await asyncio.sleep(0.01)
+                task.cancel()
+                await asyncio.gather(task, return_exceptions=True)
+                assert controller.stats()["queued"] == 0
+
+        asyncio.run(main())
+        assert controller.stats()["active"] == 0
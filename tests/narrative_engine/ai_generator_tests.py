@@ -1,3 +1,4 @@
+import asyncio
 import pytest
 from unittest import mock
 from flask import Flask
@@ -6,9 +7,10 @@ import openai
 from narrative_engine.ai_generator import (
     init_app, build_prompt, validate_narrative, 
     fallback_narrative, generate_narrative, 
-    generate_dynamic_narrative
+    generate_dynamic_narrative, generate_dynamic_narrative_async
 )
 from narrative_engine.narrative_memory import NarrativeMemory
+from narrative_engine.admission import AdmissionController
 
 @pytest.fixture
 def app():
@@ -187,4 +189,70 @@ class TestAIGenerator:
             assert "Player entered the cave entrance." in call_args
             
             # Check that the new narrative was added to memory
-            assert "Narrative about a cave with stalactites and bats." in memory.events
\ No newline at end of file
+            assert "Narrative about a cave with stalactites and bats." in memory.events
+
+    @mock.patch('narrative_engine.ai_generator.get_prompt_template', return_value=(
+        "Describe a {location_type} in a {tone} tone with {required_elements}.",
+        {"max_tokens": 500, "temperature": 0.7}
+    ))
+    @mock.patch('narrative_engine.ai_generator.redis_client', None)
+    @mock.patch('narrative_engine.ai_generator.admission', AdmissionController(max_concurrent=2))
+    def test_generate_dynamic_narrative_async_limits_concurrency(self, mock_prompt):
+        """Test that async generations run concurrently, but no more than the limit at once."""
+        in_flight = []
+        peak = []
+        
+        async def create(**kwargs):
+            in_flight.append(1)
+            peak.append(len(in_flight))
+            await asyncio.sleep(0.01)
+            in_flight.pop()
+            choice = mock.MagicMock()
+            choice.message.content = "A cave with stalactites."
+            return mock.MagicMock(choices=[choice])
+        
+        async def generate_all():
+            memories = [NarrativeMemory() for _ in range(5)]
+            narratives = await asyncio.gather(*(
+                generate_dynamic_narrative_async("cave", "spooky", "stalactites", memory) for memory in memories
+            ))
+            return narratives, memories
+        
+        with mock.patch('narrative_engine.ai_generator.AsyncOpenAI') as mock_async_openai:
+            mock_async_openai.return_value.chat.completions.create = create
+            narratives, memories = asyncio.run(generate_all())
+        
+        assert narratives == ["A cave with stalactites."] * 5
+        assert max(peak) == 2
+        assert all(memory.events == ["A cave with stalactites."] for memory in memories)
+
+    @mock.patch('narrative_engine.ai_generator.get_prompt_template', return_value=(
+        "Describe a {location_type} in a {tone} tone with {required_elements}.",
+        {"max_tokens": 500, "temperature": 0.7}
+    ))
+    @mock.patch('narrative_engine.ai_generator.redis_client', None)
+    def test_generate_dynamic_narrative_async_streams_deltas(self, mock_prompt):
+        """Test that with on_delta the narrative is streamed piece by piece."""
+        async def create(**kwargs):
+            assert kwargs["stream"] is True
+            async def chunks():
+                for piece in ["A cave ", "with ", "stalactites."]:
+                    chunk = mock.MagicMock()
+                    chunk.choices[0].delta.content = piece
+                    yield chunk
+            return chunks()
+        
+        deltas = []
+        async def on_delta(delta):
+            deltas.append(delta)
+        
+        memory = NarrativeMemory()
+        with mock.patch('narrative_engine.ai_generator.AsyncOpenAI') as mock_async_openai:
+            mock_async_openai.return_value.chat.completions.create = create
+            narrative = asyncio.run(generate_dynamic_narrative_async(
+                "cave", "spooky", "stalactites", memory, on_delta=on_delta
+            ))
+        
+        assert deltas == ["A cave ", "with ", "stalactites."]
+        assert narrative == "A cave with stalactites."
+        assert memory.events == [narrative]
@@ -0,0 +1,80 @@
+import datetime
+import pytest
+from flask import Flask
+from sqlalchemy import text
+from narrative_engine.game_state import GameState, GameEvent, Decision, db, init_app
+from narrative_engine.archive import archive_idle_games, read_archive, compact_database, ArchiveJob, init_app as init_archive
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a Flask app backed by a new file database, which can be compacted."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game_state.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+    app.config['ARCHIVE_PATH'] = str(tmp_path / "archive.jsonl.gz")
+
+    with app.app_context():
+        init_app(app)
+        init_archive(app)
+        yield app
+
+def create_game(location, days_idle=0):
+    graph = {"nodes": {f"room_{i}": {"description": "x" * 200, "exits": {}, "items": [], "actions": {}} for i in range(200)}}
+    state = GameState("beginning", location, narrative_graph=graph, narrative_memory=["Start"])
+    state.save()
+    state.update_location("forest")
+    state.add_decision("move_forest")
+    if days_idle:
+        db.session.execute(
+            text("UPDATE game_state SET updated_at = :updated_at WHERE id = :id"),
+            {'updated_at': datetime.datetime.utcnow() - datetime.timedelta(days=days_idle), 'id': state.id}
+        )
+        db.session.commit()
+    return state.id
+
+class TestArchive:
+    def test_archives_only_idle_games(self, app):
+        idle_ids = [create_game("cave", days_idle=10), create_game("hall", days_idle=8)]
+        active_id = create_game("vault")
+
+        archived = archive_idle_games(db.engine, app.config['ARCHIVE_PATH'], ttl=7 * 24 * 3600, batch_size=1)
+
+        assert archived == 2
+        db.session.expire_all()
+        assert [state.id for state in GameState.query.all()] == [active_id]
+        assert GameEvent.query.filter(GameEvent.game_state_id.in_(idle_ids)).count() == 0
+        assert Decision.query.filter(Decision.game_state_id.in_(idle_ids)).count() == 0
+
+        records = list(read_archive(app.config['ARCHIVE_PATH']))
+        assert [record['game_state']['id'] for record in records] == idle_ids
+        assert records[0]['game_state']['current_location'] == "forest"
+        assert records[0]['decision'][0]['details'] == "move_forest"
+        assert [event['kind'] for event in records[0]['game_event']] == ['column_set', 'decision_recorded']
+        assert len(records[0]['game_state']['narrative_graph']['nodes']) == 200
+
+    def test_recent_games_are_kept(self, app):
+        create_game("cave", days_idle=1)
+        assert archive_idle_games(db.engine, app.config['ARCHIVE_PATH'], ttl=7 * 24 * 3600) == 0
+
+    def test_compaction_reclaims_space(self, app):
+        for _ in range(5):
+            create_game("cave", days_idle=10)
+        db.session.remove()
+
+        job = ArchiveJob(db.engine, app.config['ARCHIVE_PATH'], ttl=3600)
+        result = job.run_once()
+
+        assert result['archived'] == 5
+        assert result['reclaimed_bytes'] > 0
+        with db.engine.connect() as connection:
+            assert connection.exec_driver_sql("PRAGMA freelist_count").scalar() == 0
+
+    def test_cli_command(self, app):
+        create_game("cave", days_idle=10)
+        db.session.remove()
+
+        result = app.test_cli_runner().invoke(args=['archive-games', '--ttl', '3600'])
+
+        assert result.exit_code == 0, result.output
+        assert "Archived 1 game(s)" in result.output
@@ -1,6 +1,10 @@
 # filepath: /home/ianphil/src/text_adventure/tests/narrative_engine/commands_tests.py
 import pytest
-from narrative_engine.commands import Command, MoveCommand, create_move_command, parse_command, COMMAND_MAPPINGS
+from narrative_engine.commands import (
+    Command, MoveCommand, TakeCommand, ActionCommand, UseCommand,
+    create_move_command, parse_command, grammar_for, COMMAND_MAPPINGS
+)
+from narrative_engine.graph import Node
 
 class TestCommand:
     def test_base_command(self):
@@ -71,4 +75,72 @@ class TestCommandParser:
     def test_unknown_command(self):
         # Test handling of unknown commands
         command = parse_command("jump")
-        assert command is None
\ No newline at end of file
+        assert command is None
+
+    def test_abbreviation_completes_unique_prefix(self):
+        command = parse_command("nor")
+        assert isinstance(command, MoveCommand)
+        assert command.direction == "north"
+
+    def test_vocabulary_changes_rebuild_index(self):
+        COMMAND_MAPPINGS['climb'] = lambda: create_move_command('up')
+        try:
+            assert parse_command("clmb").direction == "up"
+        finally:
+            del COMMAND_MAPPINGS['climb']
+        assert parse_command("clmb") is None
+
+@pytest.fixture
+def node():
+    return Node(
+        "cave_interior", "Inside the cave.",
+        exits={"forward": "hallway", "back": "entrance", "door": "secret_room"},
+        items=["stone", "key"],
+        actions={"examine walls": "Markings.", "open chest": "A golden key!"}
+    )
+
+class TestContextParser:
+    def test_location_exits(self, node):
+        for text in ("go forward", "forward", "walk to the door", "go bakc"):
+            command = parse_command(text, node)
+            assert isinstance(command, MoveCommand)
+        assert parse_command("go forward", node).direction == "forward"
+        assert parse_command("go bakc", node).direction == "back"
+        # Compass directions are still understood everywhere
+        assert parse_command("n", node).direction == "north"
+        assert parse_command("go north", node).direction == "north"
+
+    def test_take_items(self, node):
+        command = parse_command("pick up the stone", node)
+        assert isinstance(command, TakeCommand)
+        assert command.item == "stone"
+        assert parse_command("grab ky", node).item == "key"
+        # Unknown objects are passed through so the game can say what is missing
+        assert parse_command("take lamp", node).item == "lamp"
+
+    def test_location_actions(self, node):
+        command = parse_command("Open the chest", node)
+        assert isinstance(command, ActionCommand)
+        assert command.action == "open chest"
+        assert parse_command("examine wals", node).action == "examine walls"
+
+    def test_verb_object_preposition_object(self, node):
+        command = parse_command("use torch on door", node, inventory=["torch"])
+        assert isinstance(command, UseCommand)
+        assert (command.item, command.target) == ("torch", "door")
+        assert parse_command("use key", node).target is None
+
+    def test_unknown_commands(self, node):
+        assert parse_command("jump", node) is None
+        assert parse_command("fly away", node) is None
+        assert parse_command("go", node) is None
+
+    def test_grammar_cached_per_node_version(self, node):
+        grammar = grammar_for(node, ["torch"])
+        assert grammar_for(node, ["torch"]) is grammar
+        assert grammar_for(node, ["torch", "key"]) is not grammar
+
+        # Changing the node's words compiles a new grammar
+        node.update(items=["stone"])
+        assert grammar_for(node, ["torch"]) is not grammar
+        assert isinstance(parse_command("take key", node), TakeCommand)
@@ -0,0 +1,129 @@
+import pytest
+from flask import Flask
+from narrative_engine.game_state import GameState, GameEvent, GameSnapshot, db, init_app, SNAPSHOT_INTERVAL
+from narrative_engine.event_store import change_events, apply_event, rebuild_state, get_events, replay_unapplied_events
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app for testing."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        yield app
+
+@pytest.fixture
+def state(app):
+    graph = {"nodes": {"start": {"description": "Start", "exits": {}, "items": ["key"]}}}
+    state = GameState("beginning", "start", inventory=["map"], narrative_graph=graph, narrative_memory=["You wake up."])
+    state.save()
+    return state
+
+class TestChangeEvents:
+    def test_unchanged_value(self):
+        assert change_events('current_location', "start", "start") == []
+
+    def test_column_set(self):
+        assert change_events('current_location', "start", "forest") == [
+            ('column_set', {'column': 'current_location', 'value': "forest"})
+        ]
+
+    def test_graph_changes_are_recorded_per_node(self):
+        old = {"nodes": {"a": {"items": ["key"]}, "b": {"items": []}, "c": {}}}
+        new = {"nodes": {"a": {"items": []}, "b": {"items": []}, "d": {}}}
+
+        assert change_events('narrative_graph', old, new) == [
+            ('node_set', {'node_id': "a", 'node': {"items": []}}),
+            ('node_set', {'node_id': "d", 'node': {}}),
+            ('node_removed', {'node_id': "c"})
+        ]
+
+    def test_memory_changes_are_recorded_as_appends(self):
+        assert change_events('narrative_memory', ["one"], ["one", "two"]) == [
+            ('memory_appended', {'entries': ["two"]})
+        ]
+
+    def test_rewritten_memory_is_set_whole(self):
+        assert change_events('narrative_memory', ["one", "two"], ["two"]) == [
+            ('column_set', {'column': 'narrative_memory', 'value': ["two"]})
+        ]
+
+class TestApplyEvent:
+    def test_replaying_change_events_reproduces_the_new_value(self):
+        old = {"nodes": {"a": {"items": ["key"]}, "c": {}}}
+        new = {"nodes": {"a": {"items": []}, "d": {}}}
+        values = {'narrative_graph': {"nodes": {"a": {"items": ["key"]}, "c": {}}}}
+
+        for kind, data in change_events('narrative_graph', old, new):
+            apply_event(values, kind, data)
+
+        assert values['narrative_graph'] == new
+
+    def test_audit_events_change_nothing(self):
+        values = {'current_location': "start"}
+        apply_event(values, 'command_executed', {'command': 'move'})
+        assert values == {'current_location': "start"}
+
+class TestEventLog:
+    def test_changes_are_recorded_on_save(self, state):
+        state.update_location("forest")
+        state.add_decision("move_forest")
+        state.add_item("key")
+
+        assert [game_event.kind for game_event in get_events(state.id)] == [
+            'column_set', 'decision_recorded', 'column_set'
+        ]
+        assert state.event_sequence == 3
+
+    def test_new_games_start_with_a_snapshot(self, state):
+        snapshot = GameSnapshot.query.filter_by(game_state_id=state.id).one()
+        assert snapshot.sequence == 0
+        assert snapshot.state['inventory'] == ["map"]
+
+    def test_rebuild_state_matches_the_stored_row(self, state):
+        state.update_location("forest")
+        state.add_decision("move_forest")
+        graph = dict(state.narrative_graph, nodes={"start": {"description": "Start", "exits": {}, "items": []}})
+        state.narrative_graph = graph
+        state.narrative_memory = state.narrative_memory + ["You picked up the key."]
+        state.save()
+
+        assert rebuild_state(state.id) == state.snapshot_values()
+
+    def test_rebuild_state_at_an_earlier_sequence(self, state):
+        state.update_location("forest")
+        state.update_location("river")
+
+        assert rebuild_state(state.id, sequence=1)['current_location'] == "forest"
+        assert rebuild_state(state.id, sequence=0)['current_location'] == "start"
+
+    def test_snapshots_are_taken_periodically(self, state):
+        for turn in range(SNAPSHOT_INTERVAL):
+            state.add_item(f"pebble_{turn}")
+
+        sequences = [snapshot.sequence for snapshot in GameSnapshot.query.filter_by(game_state_id=state.id)]
+        assert sequences == [0, SNAPSHOT_INTERVAL]
+        assert rebuild_state(state.id) == state.snapshot_values()
+
+    def test_replay_unapplied_events(self, state):
+        # Events that reached the log without the row being updated, as after a crash
+        db.session.execute(GameEvent.__table__.insert(), [
+            {'game_state_id': state.id, 'sequence': 1, 'kind': 'column_set',
+             'data': {'column': 'current_location', 'value': "forest"}},
+            {'game_state_id': state.id, 'sequence': 2, 'kind': 'decision_recorded',
+             'data': {'turn': 1, 'decision': "move_forest"}}
+        ])
+        db.session.commit()
+
+        with db.engine.begin() as connection:
+            assert replay_unapplied_events(connection) == 1
+            assert replay_unapplied_events(connection) == 0
+
+        db.session.expire_all()
+        state = GameState.load(state.id)
+        assert state.current_location == "forest"
+        assert state.decision_history == ["move_forest"]
+        assert state.event_sequence == 2
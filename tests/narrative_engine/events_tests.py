@@ -1,5 +1,7 @@
 import pytest
-from narrative_engine.events import Event, EventHandler, door_condition, door_action
+from narrative_engine.events import Event, EventHandler, EventContext, door_condition, door_action, DOOR_OPEN_NARRATIVE
+from narrative_engine.graph import NarrativeGraph, Node
+from narrative_engine.narrative_memory import NarrativeMemory
 from unittest.mock import MagicMock
 
 class TestEvent:
@@ -90,6 +92,59 @@ class TestEventHandler:
         assert "Event 2" in triggered
         assert game_state["count"] == 3  # 1 + 2
 
+class TestIndexedDispatch:
+    def make_state(self, location, inventory=(), flags=None):
+        game_state = MagicMock()
+        game_state.current_location = location
+        game_state.inventory = list(inventory)
+        game_state.flags = flags or {}
+        return game_state
+
+    def test_only_events_for_the_current_location_are_evaluated(self):
+        handler = EventHandler()
+        evaluated = []
+        for i in range(1000):
+            location = f"room_{i}"
+            handler.register_event(Event(location, lambda state, name=location: evaluated.append(name), lambda state: None, location=location))
+
+        handler.process_events(self.make_state("room_42"))
+
+        assert evaluated == ["room_42"]
+
+    def test_trigger_keys_are_checked_before_conditions(self):
+        handler = EventHandler()
+        condition = MagicMock(return_value=True)
+        handler.register_event(Event("Open Door", condition, lambda state: None, location="hallway", items=("key",)))
+
+        assert handler.process_events(self.make_state("hallway")) == []
+        condition.assert_not_called()
+        assert handler.process_events(self.make_state("hallway", ["key"])) == ["Open Door"]
+
+    def test_item_and_flag_keyed_events(self):
+        handler = EventHandler()
+        handler.register_event(Event("Glowing Key", lambda state: True, lambda state: None, items=("key",)))
+        handler.register_event(Event("Power On", lambda state: True, lambda state: None, flags=("power",)))
+
+        assert handler.process_events(self.make_state("cave")) == []
+        assert handler.process_events(self.make_state("cave", ["key"], {"power": True})) == ["Glowing Key", "Power On"]
+        assert handler.process_events(self.make_state("cave", flags={"power": False})) == []
+
+    def test_registration_order_is_kept_across_buckets(self):
+        handler = EventHandler()
+        handler.register_event(Event("Anywhere", lambda state: True, lambda state: None))
+        handler.register_event(Event("Hallway", lambda state: True, lambda state: None, location="hallway"))
+        handler.register_event(Event("Also Anywhere", lambda state: True, lambda state: None))
+
+        assert handler.process_events(self.make_state("hallway")) == ["Anywhere", "Hallway", "Also Anywhere"]
+
+    def test_potential_events_does_not_execute(self):
+        handler = EventHandler()
+        action = MagicMock()
+        handler.register_event(Event("Hallway", lambda state: True, action, location="hallway"))
+
+        assert handler.potential_events(self.make_state("hallway")) == ["Hallway"]
+        action.assert_not_called()
+
 class TestDoorEvent:
     def test_door_condition_not_met_wrong_location(self):
         game_state = MagicMock()
@@ -140,4 +195,153 @@ class TestDoorEvent:
         door_action(game_state)
 
         assert game_state.flags["door_open"] is True
-        assert game_state.exits["door"] == "secret_room"
\ No newline at end of file
+        assert game_state.exits["door"] == "secret_room"
+
+class TestEventContext:
+    def make_context(self):
+        game_state = MagicMock()
+        game_state.current_location = "hallway"
+        game_state.inventory = ["key"]
+        game_state.flags = {}
+        game_state.door_open = False
+        game_state.narrative_graph = {"nodes": {}}
+        game_state.narrative_memory = []
+        graph = NarrativeGraph()
+        graph.add_node(Node("hallway", "A long hallway.", exits={"back": "cave"}))
+        memory = NarrativeMemory()
+        memory.add_event("You entered the hallway.")
+        return game_state, EventContext(game_state, graph, memory)
+
+    def test_door_action_changes_the_shared_graph_and_memory(self):
+        game_state, context = self.make_context()
+
+        handler = EventHandler()
+        handler.register_event(Event("Open Door", door_condition, door_action, location="hallway", items=("key",)))
+        assert handler.process_events(game_state, context) == ["Open Door"]
+
+        assert context.graph.nodes["hallway"].exits["door"] == "secret_room"
+        assert context.memory.events[-1] == DOOR_OPEN_NARRATIVE
+        assert game_state.flags == {"door_open": True}
+        game_state.save.assert_not_called()
+        # Nothing is written back until the request stages its changes
+        assert game_state.narrative_graph == {"nodes": {}}
+
+        context.stage()
+
+        assert game_state.narrative_graph["nodes"]["hallway"]["exits"]["door"] == "secret_room"
+        assert game_state.narrative_memory == ["You entered the hallway.", DOOR_OPEN_NARRATIVE]
+        assert handler.process_events(game_state, context) == []
+
+    def test_stage_leaves_unchanged_values_alone(self):
+        game_state, context = self.make_context()
+        context.stage()
+        assert game_state.narrative_graph == {"nodes": {}}
+        assert game_state.narrative_memory == []
+
+    def test_actions_written_against_a_game_state(self):
+        game_state, context = self.make_context()
+
+        def legacy_action(state):
+            state.inventory = state.inventory + ["lamp"]
+            state.narrative_memory = state.narrative_memory + ["A lamp appears."]
+            state.save()
+
+        legacy_action(context)
+        context.stage()
+
+        assert game_state.inventory == ["key", "lamp"]
+        assert game_state.narrative_memory == ["You entered the hallway.", "A lamp appears."]
+        game_state.save.assert_not_called()
+
+class TestCascadingEvents:
+    def make_state(self, location="hallway", inventory=(), flags=None):
+        game_state = MagicMock()
+        game_state.current_location = location
+        game_state.inventory = list(inventory)
+        game_state.flags = flags or {}
+        return game_state
+
+    def set_flag(self, flag):
+        def action(state):
+            state.flags = dict(state.flags, **{flag: True})
+        return action
+
+    def test_chained_events_trigger_regardless_of_registration_order(self):
+        handler = EventHandler()
+        handler.register_event(Event("Alarm", lambda state: not state.flags.get("alarm"), self.set_flag("alarm"), flags=("door_open",)))
+        handler.register_event(Event("Open Door", lambda state: not state.flags.get("door_open"), self.set_flag("door_open"), location="hallway"))
+
+        assert handler.process_events(self.make_state()) == ["Open Door", "Alarm"]
+
+    def test_events_moved_into_by_an_action_are_evaluated(self):
+        handler = EventHandler()
+
+        def fall(state):
+            state.current_location = "pit"
+        handler.register_event(Event("Trapdoor", lambda state: True, fall, location="hallway"))
+        handler.register_event(Event("Land", lambda state: True, lambda state: None, location="pit"))
+
+        assert handler.process_events(self.make_state()) == ["Trapdoor", "Land"]
+
+    def test_only_dependent_events_are_re_evaluated(self):
+        handler = EventHandler()
+        progress_reads = []
+
+        def reads_progress(state):
+            progress_reads.append(state.player_progress)
+            return False
+        handler.register_event(Event("Progress Watcher", reads_progress, lambda state: None, location="hallway"))
+        handler.register_event(Event("Flag Setter", lambda state: not state.flags.get("lit"), self.set_flag("lit"), location="hallway"))
+
+        assert handler.process_events(self.make_state()) == ["Flag Setter"]
+        assert len(progress_reads) == 1
+
+    def test_cycles_trigger_each_event_once(self):
+        handler = EventHandler()
+
+        def toggle(state):
+            state.flags = dict(state.flags, on=not state.flags.get("on"))
+        handler.register_event(Event("Toggle", lambda state: True, toggle, location="hallway"))
+
+        assert handler.process_events(self.make_state()) == ["Toggle"]
+
+    def test_own_writes_do_not_count_as_a_cycle(self, caplog):
+        handler = EventHandler()
+
+        def count_visit(state):
+            state.flags = dict(state.flags, visits=state.flags.get("visits", 0) + 1)
+        handler.register_event(Event("Visit", lambda state: state.flags.get("visits", 0) < 5, count_visit, location="hallway"))
+
+        assert handler.process_events(self.make_state()) == ["Visit"]
+        assert "re-enabled" not in caplog.text
+
+    def test_door_event_does_not_warn(self, caplog):
+        handler = EventHandler()
+        handler.register_event(Event("Open Door", door_condition, door_action, location="hallway", items=("key",)))
+        game_state = self.make_state(inventory=["key"])
+        game_state.door_open = False
+        game_state.narrative_graph = {"nodes": {}}
+        game_state.narrative_memory = []
+
+        assert handler.process_events(game_state) == ["Open Door"]
+        assert "re-enabled" not in caplog.text
+
+    def test_events_re_enabled_by_other_events_are_logged(self, caplog):
+        handler = EventHandler()
+
+        def blow_out(state):
+            state.flags = dict(state.flags, lit=False, gust=True)
+        handler.register_event(Event("Light", lambda state: not state.flags.get("lit"), self.set_flag("lit"), location="hallway"))
+        handler.register_event(Event("Gust", lambda state: not state.flags.get("gust"), blow_out, flags=("lit",)))
+
+        assert handler.process_events(self.make_state()) == ["Light", "Gust"]
+        assert "'Light' was re-enabled" in caplog.text
+
+    def test_step_cap(self):
+        handler = EventHandler()
+        for i in range(10):
+            handler.register_event(Event(f"Event {i}", lambda state: False, lambda state: None))
+
+        handler.process_events({}, max_steps=3)
+        assert handler.process_events({}, max_steps=3) == []
+
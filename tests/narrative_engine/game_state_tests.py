@@ -1,6 +1,15 @@
+import json
+import sqlite3
+from unittest import mock
 import pytest
 from flask import Flask
-from narrative_engine.game_state import GameState, db, init_app
+from sqlalchemy import event, text
+from sqlalchemy.orm.exc import StaleDataError
+from narrative_engine.game_state import (
+    GameState, Decision, db, init_app, unit_of_work, in_unit_of_work, deferred_saves,
+    run_with_retry, upgrade_schema, ConcurrentUpdateError, SCHEMA_VERSION,
+    CompressedJSON, COMPRESSED_JSON_MARKER, compress_legacy_rows
+)
 
 @pytest.fixture
 def app():
@@ -129,4 +138,336 @@ class TestGameState:
             loaded_state = GameState.load(state_id)
             assert "entered_cave" in loaded_state.decision_history
             assert "fought_troll" in loaded_state.decision_history
-            assert len(loaded_state.decision_history) == 2
\ No newline at end of file
+            assert len(loaded_state.decision_history) == 2
+
+class TestDecisionHistory:
+    def test_decisions_are_stored_as_rows(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room", decision_history=["entered_cave"])
+            state.save()
+            state.add_decision({"action": "move_north", "timestamp": "2025-04-07T12:00:00"})
+            
+            rows = Decision.query.filter_by(game_state_id=state.id).order_by(Decision.turn).all()
+            assert [row.turn for row in rows] == [1, 2]
+            assert rows[0].action == "entered_cave"
+            assert rows[1].action == "move_north"
+            assert rows[1].timestamp == "2025-04-07T12:00:00"
+            assert state.decision_count == 2
+    
+    def test_get_decisions_pages_by_turn(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            for turn in range(1, 8):
+                state.add_decision(f"decision_{turn}")
+            
+            first_page = state.get_decisions(limit=3)
+            assert [decision.details for decision in first_page] == ["decision_1", "decision_2", "decision_3"]
+            
+            second_page = state.get_decisions(after_turn=first_page[-1].turn, limit=3)
+            assert [decision.turn for decision in second_page] == [4, 5, 6]
+            
+            assert state.get_decisions(after_turn=7) == []
+    
+    def test_get_recent_decisions(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            for turn in range(1, 6):
+                state.add_decision(f"decision_{turn}")
+            
+            recent = state.get_recent_decisions(limit=2)
+            assert [decision.to_dict()["details"] for decision in recent] == ["decision_4", "decision_5"]
+
+class TestUnitOfWork:
+    def test_mutations_commit_once(self, app):
+        with app.app_context():
+            state = GameState(
+                player_progress="beginning",
+                current_location="starting_room"
+            )
+            state.save()
+            state_id = state.id
+            
+            commits = []
+            event.listen(db.session(), "after_commit", lambda session: commits.append(session))
+            
+            with unit_of_work():
+                state.update_location("forest_clearing")
+                state.add_item("sword")
+                state.add_decision("entered_forest")
+                state.save()
+                assert commits == []
+            
+            assert len(commits) == 1
+            loaded_state = GameState.load(state_id)
+            assert loaded_state.current_location == "forest_clearing"
+            assert loaded_state.inventory == ["sword"]
+    
+    def test_nested_blocks_join_outer_transaction(self, app):
+        with app.app_context():
+            with unit_of_work():
+                state = GameState("beginning", "starting_room")
+                state.save()
+                with unit_of_work():
+                    state.update_progress("middle")
+                assert in_unit_of_work()
+            assert not in_unit_of_work()
+            assert GameState.load(state.id).player_progress == "middle"
+    
+    def test_rollback_on_error(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            state_id = state.id
+            
+            with pytest.raises(RuntimeError):
+                with unit_of_work():
+                    state.update_location("forest_clearing")
+                    raise RuntimeError("command failed")
+            
+            assert not in_unit_of_work()
+            assert GameState.load(state_id).current_location == "starting_room"
+
+    def test_deferred_saves_write_once(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            state_id = state.id
+            
+            updates = []
+            event.listen(db.engine, "before_cursor_execute",
+                         lambda conn, cursor, statement, *args: updates.append(statement) if statement.startswith("UPDATE") else None)
+            
+            with unit_of_work():
+                with deferred_saves():
+                    state.update_location("forest_clearing")
+                    state.add_item("sword")
+                    state.add_decision("entered_forest")
+                    assert updates == []
+                state.save()
+            
+            assert len(updates) == 1
+            loaded_state = GameState.load(state_id)
+            assert loaded_state.current_location == "forest_clearing"
+            assert loaded_state.inventory == ["sword"]
+            assert loaded_state.decision_history == ["entered_forest"]
+
+def bump_version_behind_orm(state_id):
+    """Simulate another command committing a change to the same game state."""
+    db.session.execute(text("UPDATE game_state SET version = version + 1 WHERE id = :id"), {"id": state_id})
+
+class TestOptimisticConcurrency:
+    def test_version_increments_on_update(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            assert state.version == 1
+            
+            state.update_location("forest_clearing")
+            assert state.version == 2
+    
+    def test_load_sequence_changes_with_the_game(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            sequence = GameState.load_sequence(state.id)
+            
+            state.add_item("lamp")
+            assert GameState.load_sequence(state.id) > sequence
+            assert GameState.load_sequence(999) is None
+    
+    def test_stale_update_is_rejected(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            
+            bump_version_behind_orm(state.id)
+            state.current_location = "forest_clearing"
+            with pytest.raises(StaleDataError):
+                state.save()
+    
+    def test_run_with_retry_reruns_conflicting_operation(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room", inventory=["map"])
+            state.save()
+            state_id = state.id
+            attempts = []
+            
+            def pick_up_sword(game_state):
+                attempts.append(game_state.version)
+                if len(attempts) == 1:
+                    bump_version_behind_orm(state_id)
+                game_state.add_item("sword")
+                return game_state.inventory
+            
+            result = run_with_retry(state_id, pick_up_sword)
+            
+            assert len(attempts) == 2
+            assert result == ["map", "sword"]
+            assert GameState.load(state_id).inventory == ["map", "sword"]
+    
+    def test_run_with_retry_reruns_operation_whose_events_conflict(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room", inventory=["map"])
+            state.save()
+            state_id = state.id
+            attempts = []
+            
+            def pick_up_sword(game_state):
+                attempts.append(game_state.allocated_sequence)
+                if len(attempts) == 1:
+                    # Another writer claimed the next sequence number without changing the row
+                    db.session.execute(text(
+                        "INSERT INTO game_event (game_state_id, sequence, kind, data) VALUES (:id, :sequence, 'other', '{}')"
+                    ), {"id": state_id, "sequence": game_state.allocated_sequence + 1})
+                game_state.add_item("sword")
+                return game_state.inventory
+            
+            assert run_with_retry(state_id, pick_up_sword) == ["map", "sword"]
+            assert len(attempts) == 2
+    
+    def test_run_with_retry_gives_up(self, app):
+        with app.app_context():
+            state = GameState("beginning", "starting_room")
+            state.save()
+            state_id = state.id
+            
+            def always_conflict(game_state):
+                bump_version_behind_orm(state_id)
+                game_state.update_location("forest_clearing")
+            
+            with pytest.raises(ConcurrentUpdateError):
+                run_with_retry(state_id, always_conflict, max_attempts=2)
+    
+    def test_run_with_retry_missing_state(self, app):
+        with app.app_context():
+            assert run_with_retry(999, lambda game_state: game_state) is None
+
+class TestUpgradeSchema:
+    def test_adds_missing_columns(self, app):
+        with app.app_context():
+            db.drop_all()
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "CREATE TABLE game_state (id INTEGER PRIMARY KEY, player_progress VARCHAR(100) NOT NULL, "
+                    "current_location VARCHAR(100) NOT NULL, inventory TEXT NOT NULL, decision_history TEXT NOT NULL, "
+                    "narrative_graph TEXT, narrative_memory TEXT)"
+                ))
+                connection.execute(text(
+                    "INSERT INTO game_state VALUES (1, 'beginning', 'starting_room', '[]', '[]', '{}', '{}')"
+                ))
+            
+            db.create_all()
+            upgrade_schema()
+            
+            state = GameState.load(1)
+            assert state.version == 1
+            assert state.decision_count == 0
+            assert state.updated_at is not None
+            state.update_location("forest_clearing")
+            assert GameState.load(1).current_location == "forest_clearing"
+    
+    def test_moves_legacy_decision_history_into_rows(self, app):
+        with app.app_context():
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "INSERT INTO game_state (id, player_progress, current_location, inventory, decision_history, narrative_graph, narrative_memory, version, decision_count) "
+                    "VALUES (7, 'beginning', 'starting_room', '[]', '[\"entered_cave\", {\"action\": \"move_north\"}]', '{}', '{}', 1, 0)"
+                ))
+            
+            upgrade_schema()
+            
+            state = GameState.load(7)
+            assert state.decision_history == ["entered_cave", {"action": "move_north"}]
+            assert state.decision_count == 2
+            assert state.legacy_decision_history == []
+            
+            state.add_decision("fought_troll")
+            assert [decision.turn for decision in state.get_decisions()] == [1, 2, 3]
+
+    def test_runs_once_per_schema_version(self, tmp_path):
+        path = tmp_path / 'game_state.db'
+        with mock.patch('narrative_engine.game_state.upgrade_schema', wraps=upgrade_schema) as upgrade:
+            init_app(file_app(path))
+            assert upgrade.call_count == 1
+            
+            # Later starts find the database stamped with the current version
+            init_app(file_app(path))
+            assert upgrade.call_count == 1
+            
+            # A database stamped by an older release is upgraded again
+            legacy = sqlite3.connect(path)
+            legacy.execute(f"PRAGMA user_version = {SCHEMA_VERSION - 1}")
+            legacy.close()
+            init_app(file_app(path))
+            assert upgrade.call_count == 2
+        
+        legacy = sqlite3.connect(path)
+        assert legacy.execute("PRAGMA user_version").fetchone()[0] == SCHEMA_VERSION
+        legacy.close()
+
+def file_app(path):
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{path}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    return app
+
+class TestCreateTables:
+    def test_new_database_uses_incremental_vacuum(self, tmp_path):
+        app = file_app(tmp_path / 'game_state.db')
+        init_app(app)
+        with app.app_context():
+            with db.engine.connect() as connection:
+                assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 2
+    
+    def test_existing_database_keeps_its_vacuum_mode(self, tmp_path):
+        path = tmp_path / 'game_state.db'
+        legacy = sqlite3.connect(path)
+        legacy.execute("CREATE TABLE legacy (id INTEGER PRIMARY KEY)")
+        legacy.close()
+        
+        app = file_app(path)
+        init_app(app)
+        with app.app_context():
+            with db.engine.connect() as connection:
+                assert connection.exec_driver_sql("PRAGMA auto_vacuum").scalar() == 0
+            assert GameState.load_sequence(1) is None
+
+class TestCompressedJSON:
+    def test_round_trip_is_compressed(self, app):
+        with app.app_context():
+            graph = {"nodes": {f"room_{i}": {"description": "A dark room.", "exits": {}, "items": [], "actions": {}} for i in range(50)}}
+            state = GameState("beginning", "room_0", narrative_graph=graph, narrative_memory=["You woke up."])
+            state.save()
+            
+            raw_graph = db.session.execute(text("SELECT narrative_graph FROM game_state WHERE id = :id"), {"id": state.id}).scalar()
+            assert raw_graph.startswith(COMPRESSED_JSON_MARKER)
+            assert len(raw_graph) < len(json.dumps(graph))
+            
+            db.session.expire_all()
+            loaded_state = GameState.load(state.id)
+            assert loaded_state.narrative_graph == graph
+            assert loaded_state.narrative_memory == ["You woke up."]
+    
+    def test_reads_legacy_double_encoded_text(self):
+        column_type = CompressedJSON()
+        legacy_value = json.dumps(json.dumps(["You woke up."]))
+        assert column_type.process_result_value(legacy_value, None) == ["You woke up."]
+        assert column_type.process_result_value('{"nodes": {}}', None) == {"nodes": {}}
+        assert column_type.process_result_value(None, None) is None
+    
+    def test_compress_legacy_rows(self, app):
+        with app.app_context():
+            legacy_graph = json.dumps(json.dumps({"nodes": {}}))
+            with db.engine.begin() as connection:
+                connection.execute(text(
+                    "INSERT INTO game_state (id, player_progress, current_location, inventory, decision_history, narrative_graph, narrative_memory, version, decision_count) "
+                    "VALUES (3, 'beginning', 'starting_room', '[]', '[]', :graph, NULL, 1, 0)"
+                ), {"graph": legacy_graph})
+                compress_legacy_rows(connection)
+            
+            raw_graph, memory_type = db.session.execute(text(
+                "SELECT narrative_graph, typeof(narrative_memory) FROM game_state WHERE id = 3"
+            )).one()
+            assert raw_graph.startswith(COMPRESSED_JSON_MARKER)
+            assert memory_type == 'null'
+            assert GameState.load(3).narrative_graph == {"nodes": {}}
@@ -1,5 +1,5 @@
 import pytest
-from narrative_engine.graph import Node, NarrativeGraph
+from narrative_engine.graph import Node, NarrativeGraph, load_graph_from_dict, load_graph_from_json, graph_to_dict, graph_to_json
 
 @pytest.fixture
 def basic_node():
@@ -92,4 +92,33 @@ class TestNarrativeGraph:
         graph, room1, _ = narrative_graph
         graph.add_node(room1)
         with pytest.raises(ValueError):
-            graph.add_transition("room1", "north", "nonexistent")
\ No newline at end of file
+            graph.add_transition("room1", "north", "nonexistent")
+
+class TestGraphSerialization:
+    def test_dict_round_trip(self, complex_node):
+        graph = NarrativeGraph()
+        graph.add_node(complex_node)
+        
+        config = graph_to_dict(graph)
+        loaded = load_graph_from_dict(config)
+        
+        assert config == {"nodes": {"room2": {
+            "description": "A bright room",
+            "exits": {"north": "room1"},
+            "items": ["key"],
+            "actions": {"examine": "You see a window"}
+        }}}
+        assert loaded.nodes["room2"].exits == {"north": "room1"}
+        assert graph_to_dict(load_graph_from_json(graph_to_json(graph))) == config
+    
+    def test_loaded_graph_does_not_alias_config(self, complex_node):
+        graph = NarrativeGraph()
+        graph.add_node(complex_node)
+        config = graph_to_dict(graph)
+        
+        loaded = load_graph_from_dict(config)
+        loaded.nodes["room2"].exits["door"] = "secret_room"
+        loaded.nodes["room2"].items.append("sword")
+        
+        assert config["nodes"]["room2"]["exits"] == {"north": "room1"}
+        assert config["nodes"]["room2"]["items"] == ["key"]
@@ -0,0 +1,146 @@
+import threading
+import time
+from unittest import mock
+from narrative_engine.jobs import LocalJobQueue, NarrativeJobs, QueuedNarrative, generate_job_narrative
+
+class TestLocalJobQueue:
+    def test_runs_job_and_waits_for_result(self):
+        queue = LocalJobQueue(lambda payload: f"narrative for {payload['place']}", workers=1)
+        assert queue.submit("job", {"place": "cave", "cache_key": "key"})
+
+        job = queue.result("job", timeout=5)
+        assert job == {"status": "done", "narrative": "narrative for cave"}
+        assert queue.result("unknown") is None
+        queue.close()
+
+    def test_pending_job_times_out(self):
+        release = threading.Event()
+        queue = LocalJobQueue(lambda payload: release.wait(5) and "done", workers=1)
+        queue.submit("job", {"cache_key": "key"})
+
+        start = time.monotonic()
+        assert queue.result("job", timeout=0.05) == {"status": "pending"}
+        assert time.monotonic() - start >= 0.05
+
+        release.set()
+        assert queue.result("job", timeout=5)["status"] == "done"
+        queue.close()
+
+    def test_jobs_with_the_same_prompt_share_the_generation(self):
+        generated = []
+        finished = []
+        release = threading.Event()
+
+        def generate(payload):
+            generated.append(payload)
+            release.wait(5)
+            return "narrative"
+
+        queue = LocalJobQueue(generate, lambda payload, narrative: finished.append((payload["game"], narrative)), workers=3)
+        assert queue.submit("first", {"cache_key": "key", "game": 1})
+        # Joins the running generation
+        assert queue.submit("second", {"cache_key": "key", "game": 2})
+        assert not queue.submit("first", {"cache_key": "key", "game": 1})
+        release.set()
+        assert queue.result("first", timeout=5)["narrative"] == "narrative"
+        assert queue.result("second", timeout=5)["narrative"] == "narrative"
+        # Reuses the finished generation
+        assert queue.submit("third", {"cache_key": "key", "game": 3})
+        assert queue.result("third", timeout=5)["narrative"] == "narrative"
+
+        assert len(generated) == 1
+        # Every job is finished with its own payload
+        assert sorted(finished) == [(1, "narrative"), (2, "narrative"), (3, "narrative")]
+        queue.close()
+
+    def test_failed_generation_runs_again(self):
+        outcomes = [RuntimeError("provider down"), "narrative"]
+
+        def generate(payload):
+            outcome = outcomes.pop(0)
+            if isinstance(outcome, Exception):
+                raise outcome
+            return outcome
+
+        queue = LocalJobQueue(generate, workers=1)
+        queue.submit("job", {"cache_key": "key"})
+        assert queue.result("job", timeout=5) == {"status": "failed", "error": "provider down"}
+
+        assert queue.submit("retry", {"cache_key": "key"})
+        assert queue.result("retry", timeout=5) == {"status": "done", "narrative": "narrative"}
+        queue.close()
+
+    def test_keeps_max_jobs_finished_jobs(self):
+        queue = LocalJobQueue(lambda payload: "narrative", workers=1, max_jobs=2)
+        for job_id in ["a", "b", "c"]:
+            queue.submit(job_id, {"cache_key": job_id})
+            queue.result(job_id, timeout=5)
+
+        assert queue.result("a") is None
+        assert queue.result("c")["status"] == "done"
+        queue.close()
+
+class TestNarrativeJobs:
+    def test_submit_replaces_narratives_with_job_ids(self):
+        narrator = NarrativeJobs()
+        with mock.patch('narrative_engine.jobs.prepare_prompt', side_effect=lambda location, *args: (
+            f"describe {location}", {"max_tokens": 10}, f"key-{location}"
+        )):
+            result = {
+                "narrative": narrator("cave", "mysterious", "darkness"),
+                "results": [{"narrative": narrator("hall", "descriptive", "torch"), "command": "go hallway"}],
+                "location": "hall"
+            }
+            # Recorded by an attempt of the operation that was retried, so not in the result
+            narrator("attic", "descriptive", "dust")
+        assert isinstance(result["narrative"], QueuedNarrative)
+
+        queue = mock.MagicMock()
+        submitted = narrator.submit(queue, result, game_id=7, remember=True)
+
+        job_ids = [call.args[0] for call in queue.submit.call_args_list]
+        assert submitted == {
+            "narrative_job": job_ids[0],
+            "results": [{"narrative_job": job_ids[1], "command": "go hallway"}],
+            "location": "hall"
+        }
+        payloads = [call.args[1] for call in queue.submit.call_args_list]
+        assert [payload["cache_key"] for payload in payloads] == ["key-cave", "key-hall"]
+        assert payloads[0]["prompt"] == "describe cave"
+        assert (payloads[0]["game_id"], payloads[0]["remember"]) == (7, True)
+
+    def test_each_request_gets_its_own_job(self):
+        narrator = NarrativeJobs()
+        with mock.patch('narrative_engine.jobs.prepare_prompt', return_value=("describe cave", {}, "key-cave")):
+            result = {"narrative": narrator("cave", "descriptive", "darkness")}
+        finished = []
+        queue = LocalJobQueue(lambda payload: "Deep darkness.", lambda payload, narrative: finished.append((payload["game_id"], payload["remember"])))
+
+        # Two games, and a read-only request, whose prompts are the same
+        first = narrator.submit(queue, result, game_id=1, remember=True)["narrative_job"]
+        second = narrator.submit(queue, result, game_id=2, remember=True)["narrative_job"]
+        read_only = narrator.submit(queue, result, game_id=1, remember=False)["narrative_job"]
+
+        assert len({first, second, read_only}) == 3
+        for job_id in [first, second, read_only]:
+            assert queue.result(job_id, timeout=5)["narrative"] == "Deep darkness."
+        assert sorted(finished) == [(1, False), (1, True), (2, True)]
+        queue.close()
+
+    def test_job_narrative_is_validated_and_cached(self):
+        payload = {
+            "prompt": "describe cave",
+            "prompt_meta": {},
+            "cache_key": "key",
+            "location_type": "cave",
+            "tone": "mysterious",
+            "required_elements": "darkness"
+        }
+        with mock.patch('narrative_engine.jobs.get_cached_narrative', return_value="Cached darkness."), \
+             mock.patch('narrative_engine.jobs.generate_narrative_with_params') as generate:
+            assert generate_job_narrative(payload) == "Cached darkness."
+            generate.assert_not_called()
+
+        with mock.patch('narrative_engine.jobs.get_cached_narrative', return_value=None), \
+             mock.patch('narrative_engine.jobs.generate_narrative_with_params', return_value="Deep darkness."):
+            assert generate_job_narrative(payload) == "Deep darkness."
@@ -0,0 +1,37 @@
+from narrative_engine.response_cache import ResponseCache
+
+class TestResponseCache:
+    def test_get_returns_body_for_current_etag(self):
+        cache = ResponseCache()
+        cache.put(1, "1-4-0", {"turn": 4})
+
+        assert cache.get(1, "1-4-0") == {"turn": 4}
+        # The game changed since the body was cached
+        assert cache.get(1, "1-5-0") is None
+        assert cache.get(2, "1-4-0") is None
+
+    def test_put_replaces_previous_version(self):
+        cache = ResponseCache()
+        cache.put(1, "1-4-0", {"turn": 4})
+        cache.put(1, "1-5-0", {"turn": 5})
+
+        assert cache.get(1, "1-4-0") is None
+        assert cache.get(1, "1-5-0") == {"turn": 5}
+        assert len(cache) == 1
+
+    def test_evicts_least_recently_used(self):
+        cache = ResponseCache(max_size=2)
+        cache.put(1, "a", {})
+        cache.put(2, "b", {})
+        cache.get(1, "a")
+        cache.put(3, "c", {})
+
+        assert cache.get(2, "b") is None
+        assert cache.get(1, "a") == {}
+        assert cache.get(3, "c") == {}
+
+    def test_disabled_with_zero_size(self):
+        cache = ResponseCache(max_size=0)
+        cache.put(1, "a", {})
+
+        assert cache.get(1, "a") is None
@@ -0,0 +1,112 @@
+import pytest
+from flask import Flask
+from narrative_engine.game_state import GameState, db, init_app
+from narrative_engine.events import EventHandler
+from narrative_engine.scheduler import (
+    Scheduler, schedule_event, cancel_event, pending_events,
+    light_torch_event, torch_burns_out, TORCH_BURN_TURNS, TORCH_BURNT_OUT_NARRATIVE
+)
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app for testing."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        yield app
+
+def make_state():
+    state = GameState("start", "entrance", inventory=["map"])
+    state.narrative_memory = []
+    state.save()
+    return state
+
+def advance(state, turns):
+    for _ in range(turns):
+        state.add_decision({"action": "wait"})
+
+class TestScheduler:
+    def test_events_fire_when_due_in_order(self, app):
+        state = make_state()
+        fired = []
+        scheduler = Scheduler()
+        scheduler.register('ring', lambda game_state, data: fired.append(data))
+
+        schedule_event(state, 'ring', delay=3, data="third")
+        schedule_event(state, 'ring', delay=1, data="first")
+        schedule_event(state, 'ring', at=1, data="second")
+
+        assert scheduler.run_due(state) == []
+        advance(state, 1)
+        assert scheduler.run_due(state) == ['ring', 'ring']
+        assert fired == ["first", "second"]
+        advance(state, 2)
+        assert scheduler.run_due(state) == ['ring']
+        assert fired == ["first", "second", "third"]
+        assert pending_events(state) == []
+
+    def test_schedule_requires_delay_or_turn(self, app):
+        state = make_state()
+        with pytest.raises(ValueError):
+            schedule_event(state, 'ring')
+        with pytest.raises(ValueError):
+            schedule_event(state, 'ring', delay=1, at=2)
+
+    def test_cancel_event(self, app):
+        state = make_state()
+        first = schedule_event(state, 'ring', delay=1)
+        schedule_event(state, 'chime', delay=2)
+
+        assert cancel_event(state, first) is True
+        assert cancel_event(state, first) is False
+        assert pending_events(state) == [(2, 'chime')]
+
+    def test_unknown_events_are_dropped(self, app):
+        state = make_state()
+        schedule_event(state, 'missing', delay=0)
+        assert Scheduler().run_due(state) == []
+        assert pending_events(state) == []
+
+    def test_queue_is_saved_with_the_game(self, app):
+        state = make_state()
+        schedule_event(state, 'ring', delay=5)
+        state.save()
+        state_id = state.id
+        db.session.expire_all()
+
+        assert pending_events(GameState.load(state_id)) == [(5, 'ring')]
+
+    def test_actions_can_reschedule(self, app):
+        state = make_state()
+        scheduler = Scheduler()
+        scheduler.register('tick', lambda game_state, data: schedule_event(game_state, 'tick', delay=2))
+        schedule_event(state, 'tick', delay=0)
+
+        assert scheduler.run_due(state) == ['tick']
+        assert pending_events(state) == [(2, 'tick')]
+
+class TestTorchExample:
+    def test_torch_burns_out_after_lighting(self, app):
+        state = make_state()
+        handler = EventHandler()
+        handler.register_event(light_torch_event)
+        scheduler = Scheduler()
+        scheduler.register('torch_burns_out', torch_burns_out)
+
+        state.add_item("torch")
+        assert handler.process_events(state) == ["Light Torch"]
+        assert pending_events(state) == [(TORCH_BURN_TURNS, 'torch_burns_out')]
+
+        advance(state, TORCH_BURN_TURNS - 1)
+        assert scheduler.run_due(state) == []
+        advance(state, 1)
+        assert scheduler.run_due(state) == ['torch_burns_out']
+
+        assert state.inventory == ["map", "burnt torch"]
+        assert state.narrative_memory[-1] == TORCH_BURNT_OUT_NARRATIVE
+        # The torch stays lit-and-spent, so it is not lit again
+        assert handler.process_events(state) == []
@@ -0,0 +1,186 @@
+import threading
+from unittest import mock
+import pytest
+from flask import Flask
+from narrative_engine.game_state import GameState, GameEvent, db, init_app, run_with_retry, ConcurrentUpdateError
+from narrative_engine.session_store import HotSessionStore, HotSession
+
+@pytest.fixture
+def app(tmp_path):
+    """Create a Flask app backed by a file database, since the store opens its own sessions."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{tmp_path / 'game_state.db'}"
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        yield app
+
+@pytest.fixture
+def state_id(app):
+    state = GameState("beginning", "starting_room", inventory=["map"])
+    state.save()
+    return state.id
+
+@pytest.fixture
+def store(app):
+    store = HotSessionStore(db.engine, flush_turns=3, flush_interval=3600)
+    yield store
+    store.flush_all()
+
+def stored_state(state_id):
+    """Load the game state as it is in the database, bypassing any cached copy."""
+    db.session.expire_all()
+    return GameState.load(state_id)
+
+def move_to(location):
+    def operation(game_state):
+        game_state.update_location(location)
+        game_state.add_decision(f"move_{location}")
+        return game_state.current_location
+    return operation
+
+class TestHotSessionStore:
+    def test_changes_stay_in_memory_until_flush_turns(self, store, state_id):
+        assert store.run(state_id, move_to("forest")) == "forest"
+        assert store.run(state_id, move_to("river")) == "river"
+        assert stored_state(state_id).current_location == "starting_room"
+
+        store.run(state_id, move_to("bridge"))
+
+        state = stored_state(state_id)
+        assert state.current_location == "bridge"
+        assert state.decision_history == ["move_forest", "move_river", "move_bridge"]
+
+    def test_reads_see_unflushed_changes(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+        assert store.run(state_id, lambda game_state: game_state.current_location) == "forest"
+
+    def test_missing_state(self, store):
+        assert store.run(999, lambda game_state: game_state) is None
+
+    def test_flush(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+        store.flush(state_id)
+        assert stored_state(state_id).current_location == "forest"
+
+    def test_evict_idle_flushes_and_drops(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+        store.idle_timeout = 0
+
+        assert store.evict_idle() == 1
+        assert stored_state(state_id).current_location == "forest"
+        assert store.run(state_id, lambda game_state: game_state.current_location) == "forest"
+
+    def test_recover_replays_event_log(self, app, state_id):
+        crashed_store = HotSessionStore(db.engine, flush_turns=10)
+        crashed_store.run(state_id, move_to("forest"))
+        crashed_store.run(state_id, move_to("river"))
+        assert stored_state(state_id).current_location == "starting_room"
+
+        # A new process starts without ever flushing the crashed store
+        recovered = HotSessionStore(db.engine).recover()
+
+        assert recovered == 1
+        state = stored_state(state_id)
+        assert state.current_location == "river"
+        assert state.decision_history == ["move_forest", "move_river"]
+        assert state.decision_count == 2
+
+    def test_failed_operation_keeps_previous_turns(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+
+        def fail(game_state):
+            game_state.update_location("nowhere")
+            raise RuntimeError("command failed")
+
+        with pytest.raises(RuntimeError):
+            store.run(state_id, fail)
+
+        assert stored_state(state_id).current_location == "forest"
+        assert store.run(state_id, lambda game_state: game_state.current_location) == "forest"
+
+    def test_history_includes_unflushed_decisions(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+        store.run(state_id, move_to("river"))
+
+        history = store.run(state_id, lambda game_state: [decision.details for decision in game_state.get_recent_decisions()])
+
+        assert history == ["move_forest", "move_river"]
+        assert stored_state(state_id).current_location == "starting_room"
+
+    def test_resident_sequence_includes_unflushed_turns(self, store, state_id):
+        assert store.resident_sequence(state_id) is None
+
+        store.run(state_id, move_to("forest"))
+
+        assert store.resident_sequence(state_id) > GameState.load_sequence(state_id)
+
+    def test_direct_writer_numbers_events_after_unflushed_turns(self, store, state_id):
+        store.run(state_id, move_to("forest"))
+        resident_sequence = store.resident_sequence(state_id)
+
+        # A command run outside the store after the store appended its events
+        db.session.expire_all()
+        run_with_retry(state_id, move_to("river"))
+
+        sequences = [event.sequence for event in GameEvent.query.filter_by(game_state_id=state_id).order_by(GameEvent.sequence)]
+        assert len(sequences) == len(set(sequences))
+        assert min(sequences) > 0 and stored_state(state_id).event_sequence > resident_sequence
+        # The resident copy is now stale, so its next turn conflicts instead of overwriting the row
+        with pytest.raises(ConcurrentUpdateError):
+            store.run(state_id, move_to("bridge"))
+        assert stored_state(state_id).current_location == "river"
+
+class TestCheckout:
+    def test_loading_a_game_does_not_block_other_games(self, store, state_id):
+        other = GameState("beginning", "cellar")
+        other.save()
+        other_id = other.id
+        loading, release = threading.Event(), threading.Event()
+
+        class SlowSession(HotSession):
+            def __init__(self, engine, loaded_id):
+                if loaded_id == state_id:
+                    loading.set()
+                    release.wait(5)
+                super().__init__(engine, loaded_id)
+
+        with mock.patch('narrative_engine.session_store.HotSession', SlowSession):
+            slow = threading.Thread(target=store.run, args=(state_id, move_to("forest")))
+            slow.start()
+            assert loading.wait(5)
+            # Runs while the first game is still loading
+            other = threading.Thread(target=store.run, args=(other_id, move_to("attic")))
+            other.start()
+            other.join(2)
+            finished_while_loading = not other.is_alive()
+            release.set()
+            other.join(5)
+            slow.join(5)
+
+        assert finished_while_loading
+        assert store.run(other_id, lambda game_state: game_state.current_location) == "attic"
+        assert store.run(state_id, lambda game_state: game_state.current_location) == "forest"
+
+    def test_concurrent_loads_share_one_session(self, store, state_id):
+        barrier = threading.Barrier(2)
+        sessions = []
+
+        class RacingSession(HotSession):
+            def __init__(self, engine, loaded_id):
+                barrier.wait(5)
+                super().__init__(engine, loaded_id)
+                sessions.append(self)
+
+        with mock.patch('narrative_engine.session_store.HotSession', RacingSession):
+            threads = [threading.Thread(target=store.run, args=(state_id, move_to("forest"))) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(5)
+
+        assert len(sessions) == 2
+        assert sum(session.closed for session in sessions) == 1
+        assert store.run(state_id, lambda game_state: game_state.decision_count) == 2
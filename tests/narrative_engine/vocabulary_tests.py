@@ -0,0 +1,112 @@
+import random
+import string
+from difflib import get_close_matches
+from narrative_engine.vocabulary import (
+    edit_distance, similarity, deletions, PrefixTrie, DeletionIndex, VocabularyIndex, Vocabulary,
+    DEFAULT_MAX_DISTANCE
+)
+
+class TestEditDistance:
+    def test_edit_distance(self):
+        assert edit_distance("north", "north") == 0
+        assert edit_distance("noth", "north") == 1
+        assert edit_distance("", "west") == 4
+        assert edit_distance("kitten", "sitting") == 3
+
+    def test_similarity(self):
+        assert similarity("noth", "north") == 8 / 9
+        assert similarity("bakc", "back") == 0.75
+        assert similarity("x", "n") == 0.0
+
+    def test_deletions(self):
+        assert deletions("abc", 1) == {"abc", "bc", "ac", "ab"}
+        assert "" in deletions("ab", 2)
+
+class TestPrefixTrie:
+    def test_unique_completion(self):
+        trie = PrefixTrie()
+        for term in ("take", "talk", "north"):
+            trie.insert(term)
+        assert trie.unique_completion("nor") == "north"
+        assert trie.unique_completion("tak") == "take"
+        # Ambiguous and unknown prefixes have no completion
+        assert trie.unique_completion("ta") is None
+        assert trie.unique_completion("z") is None
+
+class TestDeletionIndex:
+    def test_search_within_radius(self):
+        index = DeletionIndex()
+        for term in ("book", "books", "cake", "boo", "cape", "cart"):
+            index.add(term)
+        assert index.search("bool", 1) == [(1, "boo"), (1, "book")]
+        assert index.search("cake", 0) == [(0, "cake")]
+        assert index.search("cake", 2) == [(0, "cake"), (1, "cape"), (2, "cart")]
+
+    def test_matches_brute_force(self):
+        rng = random.Random(7)
+        terms = {"".join(rng.choice("abcde") for _ in range(rng.randint(1, 6))) for _ in range(300)}
+        index = DeletionIndex(max_distance=2)
+        for term in terms:
+            index.add(term)
+        for query in ("abc", "eed", "a", "bbbbbb"):
+            expected = sorted((edit_distance(query, term), term) for term in terms if edit_distance(query, term) <= 2)
+            assert index.search(query, 2) == expected
+
+class TestVocabularyIndex:
+    def test_match_order(self):
+        index = VocabularyIndex(["north", "n", "take", "talk", "lantern"])
+        assert index.match("n") == "n"
+        assert index.match("lan") == "lantern"
+        assert index.match("noth") == "north"
+        assert index.match("tale") in ("take", "talk")
+        assert index.match("jump") is None
+        assert index.match("x") is None
+
+    def test_finds_misspellings_in_large_vocabulary(self):
+        rng = random.Random(11)
+        terms = sorted({"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(4, 10))) for _ in range(10000)})
+        index = VocabularyIndex(terms)
+        for term in rng.sample(terms, 50):
+            # Misspell a letter in the middle
+            typo = term[:2] + ('z' if term[2] != 'z' else 'y') + term[3:]
+            match = index.match(typo)
+            assert match is not None
+            assert similarity(typo, match) >= similarity(typo, term)
+
+    def test_matches_what_difflib_matched_within_max_distance(self):
+        rng = random.Random(5)
+        terms = sorted({"".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(3, 12))) for _ in range(500)})
+        index = VocabularyIndex(terms)
+        for term in rng.sample(terms, 200):
+            # One or two letters wrong, missing or extra
+            typo = term
+            for _ in range(rng.randint(1, 2)):
+                i = rng.randrange(len(typo))
+                typo = rng.choice((typo[:i] + 'q' + typo[i + 1:], typo[:i] + typo[i + 1:] or 'q', typo[:i] + 'q' + typo[i:]))
+            if typo in terms or index.trie.unique_completion(typo):
+                # Exact terms and abbreviations are not fuzzy matches
+                continue
+            expected = get_close_matches(typo, terms, n=1, cutoff=0.7)
+            if expected and edit_distance(typo, expected[0]) <= DEFAULT_MAX_DISTANCE:
+                match = index.match(typo)
+                assert match is not None, typo
+                assert similarity(typo, match) >= similarity(typo, expected[0])
+
+    def test_typos_beyond_max_distance_do_not_match(self):
+        terms = ["examine walls", "light torch"]
+        assert get_close_matches("lihgt torhc", terms, n=1, cutoff=0.7) == ["light torch"]
+        assert VocabularyIndex(terms).match("lihgt torhc") is None
+        assert VocabularyIndex(terms, max_distance=4).match("lihgt torhc") == "light torch"
+
+class TestVocabulary:
+    def test_index_follows_changes(self):
+        vocabulary = Vocabulary({"north": 1})
+        assert vocabulary.match("noth") == 1
+        vocabulary["lantern"] = 2
+        assert vocabulary.match("lantrn") == 2
+        vocabulary.pop("lantern")
+        assert vocabulary.match("lantrn") is None
+        vocabulary.update(lantern=3)
+        assert vocabulary.match("lantrn") == 3
+        vocabulary.clear()
+        assert vocabulary.match("noth") is None
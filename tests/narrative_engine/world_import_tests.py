@@ -0,0 +1,95 @@
+import io
+import json
+import pytest
+from flask import Flask
+from narrative_engine.game_state import db, init_app
+from narrative_engine import world
+from narrative_engine.world_import import read_world_nodes, import_world
+from models.location import Location
+
+WORLD = {
+    "nodes": {
+        "cave_entrance": {"description": "A dark cave entrance.", "exits": {"forward": "hallway"}, "items": ["torch"], "actions": {}},
+        "hallway": {"description": "A long hallway.", "exits": {"back": "cave_entrance", "door": "vault"}, "items": [], "actions": {"examine walls": "Carvings."}},
+        "vault": {"description": "A sealed vault.", "exits": {"up": "nowhere"}, "items": ["gold", "gem"], "actions": {}}
+    }
+}
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app with empty world tables."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        world.init_app(app)
+        yield app
+
+def as_json_lines(config):
+    return "\n".join(json.dumps(dict(node, node_id=node_id)) for node_id, node in config["nodes"].items()) + "\n"
+
+class TestReadWorldNodes:
+    def test_graph_json(self):
+        nodes = list(read_world_nodes(io.StringIO(json.dumps(WORLD))))
+        assert [node_id for node_id, _ in nodes] == ["cave_entrance", "hallway", "vault"]
+
+    def test_pretty_printed_graph_json(self):
+        nodes = list(read_world_nodes(io.StringIO(json.dumps(WORLD, indent=2))))
+        assert len(nodes) == 3
+
+    def test_json_lines(self):
+        nodes = list(read_world_nodes(io.StringIO(as_json_lines(WORLD))))
+        assert nodes[1][0] == "hallway"
+        assert nodes[1][1]["exits"] == {"back": "cave_entrance", "door": "vault"}
+
+class TestImportWorld:
+    def test_import_resolves_exits_across_batches(self, app):
+        reports = []
+        stats = import_world(WORLD["nodes"].items(), batch_size=2, progress=lambda count, elapsed: reports.append(count))
+
+        assert reports == [2, 3]
+        assert stats['locations'] == 3
+        assert stats['items'] == 3
+        assert stats['actions'] == 1
+        assert stats['exits'] == 3
+        assert stats['unresolved_exits'] == 1
+
+        graph = world.load_world_graph()
+        assert graph.nodes["cave_entrance"].exits == {"forward": "hallway"}
+        assert graph.nodes["hallway"].exits == {"back": "cave_entrance", "door": "vault"}
+        assert graph.nodes["vault"].items == ["gold", "gem"]
+        assert graph.nodes["hallway"].actions == {"examine walls": "Carvings."}
+
+    def test_existing_locations_are_skipped(self, app):
+        import_world(WORLD["nodes"].items())
+        stats = import_world(WORLD["nodes"].items())
+
+        assert stats['locations'] == 0
+        assert stats['skipped_locations'] == 3
+        assert Location.query.count() == 3
+
+    def test_failed_import_does_not_break_the_next(self, app):
+        def failing_nodes():
+            yield "cave_entrance", WORLD["nodes"]["cave_entrance"]
+            raise ValueError("Truncated world file")
+
+        with pytest.raises(ValueError):
+            import_world(failing_nodes(), batch_size=1)
+
+        # The staging table was dropped from the pooled connection
+        stats = import_world(list(WORLD["nodes"].items())[1:])
+        assert stats['locations'] == 2
+        assert world.exits_from("hallway") == {"back": "cave_entrance", "door": "vault"}
+
+    def test_cli_command(self, app, tmp_path):
+        world_file = tmp_path / "world.jsonl"
+        world_file.write_text(as_json_lines(WORLD), encoding='utf-8')
+
+        result = app.test_cli_runner().invoke(args=['import-world', str(world_file), '--batch-size', '2'])
+
+        assert result.exit_code == 0, result.output
+        assert "3 locations, 3 items, 1 actions, 3 exits" in result.output
+        assert world.exits_from("hallway") == {"back": "cave_entrance", "door": "vault"}
@@ -0,0 +1,128 @@
+import json
+import pytest
+from flask import Flask
+from sqlalchemy import event, inspect
+from narrative_engine.game_state import db, init_app
+from narrative_engine import world
+from models.location import Location
+from models.item import Item
+from models.action import Action
+
+@pytest.fixture
+def app():
+    """Create and configure a Flask app with a small world."""
+    app = Flask(__name__)
+    app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///:memory:'
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['TESTING'] = True
+
+    with app.app_context():
+        init_app(app)
+        world.init_app(app)
+
+        cave = Location(name="cave_entrance", description="A dark cave entrance.")
+        hall = Location(name="hallway", description="A long hallway.")
+        vault = Location(name="vault", description="A sealed vault.")
+        db.session.add_all([cave, hall, vault])
+        db.session.flush()
+
+        cave.set_exit("forward", hall.id)
+        hall.set_exit("back", cave.id)
+        hall.set_exit("door", vault.id)
+        db.session.add_all([
+            Item(name="torch", description="A torch.", location_id=cave.id),
+            Item(name="hidden_gem", description="A gem.", location_id=cave.id, visible=False),
+            Item(name="key", description="A key.", location_id=hall.id),
+            Action(name="examine walls", description="Carvings.", location_id=hall.id),
+            Action(name="open door", description="The door opens.", location_id=hall.id,
+                   next_location_id=vault.id, requires_items=json.dumps(["key"])),
+            Action(name="pull lever", description="Click.", location_id=hall.id,
+                   requires_flags=json.dumps({"power_on": True}))
+        ])
+        db.session.commit()
+        yield app
+
+def count_queries():
+    statements = []
+    event.listen(db.engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+class TestWorldQueries:
+    def test_items_at(self, app):
+        assert [item.name for item in world.items_at("cave_entrance")] == ["torch"]
+        assert [item.name for item in world.items_at("cave_entrance", visible_only=False)] == ["torch", "hidden_gem"]
+        assert world.items_at("nowhere") == []
+
+    def test_exits_from(self, app):
+        assert world.exits_from("hallway") == {"back": "cave_entrance", "door": "vault"}
+        assert world.exits_from("vault") == {}
+
+    def test_available_actions(self, app):
+        names = lambda actions: [action.name for action in actions]
+        assert names(world.available_actions("hallway")) == ["examine walls"]
+        assert names(world.available_actions("hallway", inventory=["key"])) == ["examine walls", "open door"]
+        assert names(world.available_actions("hallway", flags={"power_on": True})) == ["examine walls", "pull lever"]
+
+    def test_set_exit_replaces_direction(self, app):
+        hall = world.get_location("hallway")
+        vault = world.get_location("vault")
+        hall.set_exit("back", vault.id)
+        db.session.commit()
+        assert world.exits_from("hallway") == {"back": "vault", "door": "vault"}
+
+    def test_set_exit_keeps_legacy_exits_of_a_partly_migrated_location(self, app):
+        hall = world.get_location("hallway")
+        cave = world.get_location("cave_entrance")
+        vault = world.get_location("vault")
+        # Written before exits became rows; "back" has a row already
+        hall.exits = json.dumps({"back": vault.id, "window": cave.id})
+        db.session.commit()
+        assert hall.get_exits() == {"back": cave.id, "door": vault.id, "window": cave.id}
+
+        hall.set_exit("trapdoor", vault.id)
+        db.session.commit()
+
+        assert world.exits_from("hallway") == {
+            "back": "cave_entrance", "door": "vault", "window": "cave_entrance", "trapdoor": "vault"
+        }
+        assert hall.exits == '{}'
+
+    def test_init_app_migrates_legacy_exits(self, app):
+        vault = world.get_location("vault")
+        vault.exits = json.dumps({"out": world.get_location("hallway").id})
+        db.session.commit()
+
+        world.init_app(app)
+
+        assert world.exits_from("vault") == {"out": "hallway"}
+
+    def test_load_locations_avoids_n_plus_one(self, app):
+        db.session.expire_all()
+        statements = count_queries()
+
+        locations = world.load_locations()
+        dicts = [location.to_dict() for location in locations]
+
+        # One query for the locations and one per relationship, however many locations there are
+        assert len(statements) == 5
+        assert dicts[1]['exits'] == {"back": locations[0].id, "door": locations[2].id}
+        assert [item['name'] for item in dicts[0]['items']] == ["torch", "hidden_gem"]
+
+    def test_load_world_graph(self, app):
+        graph = world.load_world_graph(["cave_entrance", "hallway"])
+
+        assert set(graph.nodes) == {"cave_entrance", "hallway"}
+        hallway = graph.nodes["hallway"]
+        assert hallway.exits == {"back": "cave_entrance", "door": "vault"}
+        assert hallway.items == ["key"]
+        assert hallway.actions["open door"] == "The door opens."
+
+    def test_indexes(self, app):
+        indexed = {
+            table: {tuple(index['column_names']) for index in inspect(db.engine).get_indexes(table)}
+            for table in ("locations", "items", "actions", "exits")
+        }
+        assert ("name",) in indexed["locations"]
+        assert ("location_id",) in indexed["items"]
+        assert ("location_id",) in indexed["actions"]
+        assert ("location_id", "direction") in indexed["exits"]